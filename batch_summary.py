@@ -0,0 +1,119 @@
+from loguru import logger
+from concurrent.futures import ThreadPoolExecutor
+from wechat_summary import (fetch_group_messages, chat_statistics, prepare_records, summarize_messages, save_summary,
+                            send_summary, JobControl)
+from job_metrics import new_timer
+from config_store import load_service_config
+import time
+import json
+import sys
+
+def run_batch(jobs, ai_config, prompt=None, send=False, max_llm_workers=4):
+    """批量总结多个群聊
+
+    微信界面只能串行滚动加载，因此消息获取在当前线程依次进行；
+    前面群聊的AI总结、保存和发送在线程池中并发执行，不阻塞后续群聊的加载。
+    jobs 为 [{'group': 群名, 'hours': 小时数, 'send': 是否发送}, ...]
+    """
+    batch_start = time.perf_counter()
+    results = []
+    futures = []
+
+    def summarize_job(result, records, job_start, control):
+        try:
+            header = chat_statistics(records, ai_config, control)
+            records = prepare_records(records, ai_config, control, prompt, header)
+            llm_start = time.perf_counter()
+            summary = summarize_messages(records, ai_config, prompt, control=control, header=header)
+            result['llm_seconds'] = time.perf_counter() - llm_start
+            if not summary:
+                result['status'] = 'empty'
+                return
+            result['file'], result['summary_id'] = save_summary(result['group'], summary, control=control)
+            if result['send']:
+                result['sent'] = send_summary(result['group'], summary, control=control)
+            result['summary'] = summary
+            result['status'] = 'ok'
+        except Exception as e:
+            logger.error(f"群聊 {result['group']} 总结失败：{e}")
+            result['status'] = 'error'
+            result['error'] = str(e)
+        finally:
+            result['total_seconds'] = time.perf_counter() - job_start
+            control.finish(result['status'])
+
+    with ThreadPoolExecutor(max_workers=max_llm_workers, thread_name_prefix="batch-llm") as executor:
+        for job in jobs:
+            result = {
+                'group': job['group'],
+                'hours': job.get('hours', 1),
+                'send': job.get('send', send),
+                'status': 'pending',
+            }
+            results.append(result)
+            job_start = time.perf_counter()
+            control = JobControl(timer=new_timer(result['group'], "batch"))
+            try:
+                records = fetch_group_messages(result['group'], result['hours'], control=control)
+            except Exception as e:
+                logger.error(f"群聊 {result['group']} 获取消息失败：{e}")
+                result['status'] = 'error'
+                result['error'] = str(e)
+                result['total_seconds'] = time.perf_counter() - job_start
+                control.finish(result['status'])
+                continue
+            result['fetch_seconds'] = time.perf_counter() - job_start
+            result['messages'] = len(records)
+            if not records:
+                result['status'] = 'empty'
+                result['total_seconds'] = result['fetch_seconds']
+                control.finish(result['status'])
+                continue
+            futures.append(executor.submit(summarize_job, result, records, job_start, control))
+
+        for future in futures:
+            future.result()
+
+    total_seconds = time.perf_counter() - batch_start
+    report = {
+        'groups': results,
+        'total_seconds': total_seconds,
+        'succeeded': sum(1 for r in results if r['status'] == 'ok'),
+        'groups_per_minute': len(results) / (total_seconds / 60) if total_seconds > 0 else 0.0,
+    }
+    logger.info(format_batch_report(report))
+    return report
+
+def format_batch_report(report):
+    """生成批量任务的耗时报告"""
+    lines = ["=== 批量总结报告 ==="]
+    for r in report['groups']:
+        lines.append(
+            f"{r['group']}: {r['status']}，消息 {r.get('messages', 0)} 条，"
+            f"加载 {r.get('fetch_seconds', 0):.1f}s，总结 {r.get('llm_seconds', 0):.1f}s，"
+            f"合计 {r.get('total_seconds', 0):.1f}s"
+        )
+    lines.append(
+        f"共 {len(report['groups'])} 个群聊，成功 {report['succeeded']} 个，"
+        f"总耗时 {report['total_seconds']:.1f}s，吞吐量 {report['groups_per_minute']:.2f} 群/分钟"
+    )
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    # 用法：python batch_summary.py jobs.json
+    # jobs.json 示例：{"service": "DeepSeek", "send": false, "groups": [{"group": "群名", "hours": 2}]}
+    if len(sys.argv) != 2:
+        print("用法：python batch_summary.py jobs.json")
+        sys.exit(1)
+
+    with open(sys.argv[1], 'r', encoding='utf-8') as f:
+        batch = json.load(f)
+
+    report = run_batch(
+        batch['groups'],
+        load_service_config(batch.get('service')),
+        prompt=batch.get('prompt'),
+        send=batch.get('send', False),
+        max_llm_workers=batch.get('max_llm_workers', 4),
+    )
+    print(format_batch_report(report))
@@ -0,0 +1,86 @@
+"""入口模块的导入耗时预算检查
+
+用法：
+    python benchmarks/bench_imports.py                               检查 wechat_summary_gui 和 wechat_summary_cli
+    python benchmarks/bench_imports.py wechat_summary --budget-ms 150
+    python benchmarks/bench_imports.py --top 20                      列出自身耗时最多的 20 个模块
+
+在新的解释器中以 -X importtime 导入模块，取多次运行中累计耗时最短的一次。
+超过预算，或者启动时就导入了应当延迟导入的模块（openai、wxauto、numpy）时退出码为 1。
+PyInstaller 打包后的程序同样在导入这些入口模块后才显示窗口，源码下的导入耗时可以作为冷启动耗时的下限参考。
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+DEFAULT_MODULES = ["wechat_summary_gui", "wechat_summary_cli"]
+# 只在开始总结、发送时才需要的模块
+DEFERRED_MODULES = ["openai", "wxauto", "numpy"]
+
+LINE_PATTERN = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+def measure_imports(module):
+    """在新的解释器中导入 module，返回 [(模块, 自身微秒, 累计微秒, 层级)]"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=REPO_DIR, capture_output=True, text=True, encoding='utf-8', errors='replace'
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"导入 {module} 失败:\n{result.stderr.strip().splitlines()[-1]}")
+    entries = []
+    for line in result.stderr.splitlines():
+        match = LINE_PATTERN.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+    return entries
+
+def check_module(module, budget_ms, repeat, top):
+    """检查一个模块，返回是否通过"""
+    best = None
+    for _ in range(repeat):
+        entries = measure_imports(module)
+        total = next(cumulative for name, _, cumulative, _ in entries if name == module)
+        if best is None or total < best[0]:
+            best = (total, entries)
+    total, entries = best
+
+    ok = True
+    print(f"{module}: {total / 1000:.1f} ms（预算 {budget_ms:.0f} ms）")
+    if total / 1000 > budget_ms:
+        print("  超过导入耗时预算")
+        ok = False
+    imported = {name.split('.')[0] for name, _, _, _ in entries}
+    for name in DEFERRED_MODULES:
+        if name in imported:
+            print(f"  启动时导入了应当延迟导入的模块 {name}")
+            ok = False
+    if top:
+        for name, self_us, cumulative_us, _ in sorted(entries, key=lambda e: e[1], reverse=True)[:top]:
+            print(f"  {self_us / 1000:>8.1f} ms  {cumulative_us / 1000:>8.1f} ms  {name}")
+    return ok
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="入口模块的导入耗时预算检查")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES, help="要检查的模块")
+    parser.add_argument("--budget-ms", type=float, default=400, help="单个模块导入耗时的上限（毫秒）")
+    parser.add_argument("--repeat", type=int, default=3, help="测量次数，取最短的一次")
+    parser.add_argument("--top", type=int, default=10, help="列出自身耗时最多的模块数量")
+    args = parser.parse_args(argv)
+
+    ok = True
+    for module in args.modules:
+        try:
+            ok = check_module(module, args.budget_ms, args.repeat, args.top) and ok
+        except RuntimeError as e:
+            print(e)
+            ok = False
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,164 @@
+"""总结请求的并发压测，使用本地模拟服务，不需要网络
+
+用法：
+    python benchmarks/bench_llm_load.py                                    默认 20 个请求、并发 4
+    python benchmarks/bench_llm_load.py --requests 50 --concurrency 8 \
+        --latency 1 --tokens-per-second 50 --error-rate 0.1 --burst-every 10 --burst-length 2
+    python benchmarks/bench_llm_load.py --path server                      经由 HTTP 接口（summary_server）提交任务
+
+统计每个请求的首字耗时、总耗时、成功率，以及模拟服务收到的请求数（含 SDK 自动重试）和 429/500 次数。
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+def run_direct(index, records, ai_config, deadline):
+    """直接调用 summarize_messages，与 GUI 和命令行的流式路径一致"""
+    from wechat_summary import summarize_messages, JobControl
+    first_token = []
+    started = time.perf_counter()
+
+    def on_delta(text):
+        if not first_token:
+            first_token.append(time.perf_counter() - started)
+
+    summary = summarize_messages(records, ai_config, on_delta=on_delta, control=JobControl(deadline=deadline))
+    return first_token[0] if first_token else None, time.perf_counter() - started, len(summary)
+
+def make_server_runner(ai_config, messages):
+    """经由 summary_server 的 JobManager 提交任务，每个请求使用不同的群聊避免被合并
+
+    每个群聊都提供与直接调用相同的 messages，并记录各群聊实际加载到的消息条数，
+    任务结束后核对是否加载了全部消息；不做采样，提交给模拟服务的记录数与直接调用一致
+    """
+    from fake_wechat import FakeWeChat
+    from summary_server import JobManager
+
+    groups = {f"压测群{i}": messages for i in range(1000)}
+    loaded = {}
+
+    class CountingWeChat(FakeWeChat):
+        def GetAllMessage(self):
+            result = super().GetAllMessage()
+            loaded[self.current_chat] = len(result)
+            return result
+
+    ai_config = dict(ai_config, sample_overflow=False)
+    page_size = max(20, len(messages) // 40 + 1)
+    manager = JobManager(
+        service_loader=lambda name: ai_config, prompt_loader=lambda name: None,
+        wechat_factory=lambda: CountingWeChat(groups=groups, page_size=page_size), load_interval=0, max_workers=64
+    )
+
+    def run(index, records, ai_config_, deadline):
+        started = time.perf_counter()
+        group = f"压测群{index % 1000}"
+        job, _ = manager.submit(group, 24, deadline=deadline)
+        first_token = None
+        offset = 0
+        while True:
+            chunks, done = job.wait_events(offset, timeout=1)
+            if chunks and first_token is None:
+                first_token = time.perf_counter() - started
+            offset += len(chunks)
+            if done:
+                break
+        if job.status != 'done':
+            raise RuntimeError(job.error or job.status)
+        if loaded.get(group) != len(messages):
+            raise RuntimeError(f"{group} 加载了 {loaded.get(group)} 条消息，应为 {len(messages)} 条")
+        return first_token, time.perf_counter() - started, len(job.summary)
+
+    return run, manager
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="总结请求并发压测")
+    parser.add_argument("--requests", type=int, default=20, help="请求总数")
+    parser.add_argument("--concurrency", type=int, default=4, help="同时发出的请求数")
+    parser.add_argument("--path", choices=["direct", "server"], default="direct",
+                        help="direct 直接调用总结函数，server 经由 HTTP 接口的任务管理器")
+    parser.add_argument("--messages", type=int, default=200, help="每次总结的消息条数")
+    parser.add_argument("--deadline", type=float, help="每个任务的截止时间（秒）")
+    parser.add_argument("--max-retries", type=int, default=2, help="SDK 自动重试次数")
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--latency-jitter", type=float, default=0.0)
+    parser.add_argument("--tokens-per-second", type=float, default=200)
+    parser.add_argument("--reply-tokens", type=int, default=300)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--burst-every", type=int, default=0)
+    parser.add_argument("--burst-length", type=int, default=0)
+    parser.add_argument("--max-concurrent", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    from fake_openai_server import FakeOpenAIServer
+    from synthetic_chat import generate_messages
+    import wechat_summary
+
+    # 日志和总结文件写入临时目录，不影响工作目录
+    os.chdir(tempfile.mkdtemp(prefix="wechat_summary_load_"))
+    server = FakeOpenAIServer(
+        latency=args.latency, latency_jitter=args.latency_jitter, tokens_per_second=args.tokens_per_second,
+        reply_tokens=args.reply_tokens, error_rate=args.error_rate, burst_every=args.burst_every,
+        burst_length=args.burst_length, max_concurrent=args.max_concurrent, retry_after=0, seed=args.seed
+    )
+    ai_config = {'api_key': 'fake', 'base_url': server.start(), 'model': 'fake-model',
+                 'max_retries': args.max_retries}
+
+    messages = generate_messages(args.messages, seed=args.seed)
+    records = []
+    for msg in messages:
+        wechat_summary._append_record(msg, records)
+
+    manager = None
+    if args.path == 'server':
+        run, manager = make_server_runner(ai_config, messages)
+    else:
+        run = run_direct
+
+    first_tokens, durations, errors = [], [], []
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        futures = [executor.submit(run, i, records, ai_config, args.deadline) for i in range(args.requests)]
+        for future in futures:
+            try:
+                first_token, duration, _ = future.result()
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+                continue
+            if first_token is not None:
+                first_tokens.append(first_token)
+            durations.append(duration)
+    elapsed = time.perf_counter() - started
+    if manager:
+        manager.shutdown()
+    stats = server.stats()
+    server.shutdown()
+
+    print(f"请求 {args.requests} 个，并发 {args.concurrency}，路径 {args.path}，总耗时 {elapsed:.2f} 秒")
+    print(f"成功 {len(durations)}，失败 {len(errors)}，吞吐 {len(durations) / elapsed * 60:.1f} 次/分钟")
+    if durations:
+        print(f"首字耗时 p50 {percentile(first_tokens, 50):.2f}s  p95 {percentile(first_tokens, 95):.2f}s")
+        print(f"总耗时   p50 {percentile(durations, 50):.2f}s  p95 {percentile(durations, 95):.2f}s  "
+              f"平均 {statistics.mean(durations):.2f}s")
+    print(f"模拟服务收到 {stats['requests']} 个请求（重试 {stats['requests'] - args.requests} 次），"
+          f"状态码 {stats['status']}，最大并发 {stats['max_concurrent']}")
+    for error in sorted(set(errors)):
+        print(f"失败原因：{error}")
+    return 0 if not errors else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
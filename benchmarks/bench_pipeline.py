@@ -0,0 +1,167 @@
+"""消息处理流程的基准测试
+
+用法：
+    python benchmarks/bench_pipeline.py                    运行 1k/10k/100k 三档并与基线比较
+    python benchmarks/bench_pipeline.py --full             额外运行 1M 档
+    python benchmarks/bench_pipeline.py --save-baseline    将本次结果保存为基线
+
+各阶段取多次运行的最短耗时；与 benchmarks/baselines.json 相比变慢超过阈值（默认 20%）时退出码为 1，
+找不到基线文件时退出码为 2。
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+FULL_SIZES = DEFAULT_SIZES + [1_000_000]
+BASELINE_PATH = os.path.join(BENCH_DIR, "baselines.json")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+# 低于该耗时的结果受噪声影响大，不参与回归判断
+NOISE_FLOOR = 0.002
+
+def best_of(repeat, fn):
+    """运行 repeat 次，返回 (最短耗时, 最后一次的返回值)"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def bench_size(size, repeat):
+    import wechat_summary
+    from synthetic_chat import generate_messages, make_wechat
+    from fake_wechat import FakeWeChat
+    from transcript_store import TranscriptWriter
+
+    messages = generate_messages(size)
+    results = {}
+
+    def ingest():
+        return wechat_summary.fetch_group_messages("基准测试群", 24, wx=make_wechat(size), load_interval=0)
+    results['ingest'], records = best_of(repeat, ingest)
+
+    def dedup():
+        # 按 40 页逐步加载，与滚动加载时的调用方式一致
+        wx = FakeWeChat(messages, page_size=len(messages) // 40 + 1)
+        deduper = wechat_summary.ScrollDeduper()
+        unique = len(deduper.new_messages(wx.GetAllMessage()))
+        while wx.LoadMoreMessage():
+            unique += len(deduper.new_messages(wx.GetAllMessage()))
+        return unique
+    results['dedup'], _ = best_of(repeat, dedup)
+
+    def parse():
+        parsed = []
+        for msg in messages:
+            if msg.type in ('sys', 'time'):
+                wechat_summary.parse_message_time(msg.content)
+            wechat_summary._append_record(msg, parsed)
+        return parsed
+    results['parse'], _ = best_of(repeat, parse)
+
+    results['transcript'], transcript = best_of(repeat, lambda: wechat_summary.build_transcript(records))
+    results['save'], _ = best_of(repeat, lambda: wechat_summary.save_summary("基准测试群", transcript))
+
+    import extractive_summary
+    if extractive_summary.available():
+        results['extract'], _ = best_of(repeat, lambda: extractive_summary.select_records(records, 8000))
+        import chat_stats
+        results['stats'], _ = best_of(
+            repeat, lambda: chat_stats.compute_stats(records, wechat_summary.parse_message_time)
+        )
+
+    rounds = iter(range(repeat))
+    def archive():
+        # 每轮使用新的群聊名称，确保全部记录都需要写入
+        writer = TranscriptWriter(wechat_summary.parse_message_time)
+        writer.submit(f"基准测试群{next(rounds)}", records)
+        writer.flush()
+    results['archive'], _ = best_of(repeat, archive)
+
+    for stage, seconds in list(results.items()):
+        print(f"{size:>9} 条  {stage:<10} {seconds * 1000:10.2f} ms  {size / seconds if seconds else 0:14,.0f} 条/秒")
+    return {f"{stage}/{size}": seconds for stage, seconds in results.items()}
+
+def compare(results, baseline, threshold):
+    """返回超过阈值的回归列表 [(名称, 基线耗时, 本次耗时)]"""
+    regressions = []
+    for name, seconds in sorted(results.items()):
+        base = baseline.get(name)
+        if base is None or base < NOISE_FLOOR:
+            continue
+        if seconds > base * (1 + threshold):
+            regressions.append((name, base, seconds))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="消息处理流程基准测试")
+    parser.add_argument("--sizes", help="逗号分隔的消息条数，默认 1000,10000,100000")
+    parser.add_argument("--full", action="store_true", help="包含 1,000,000 条消息的档位")
+    parser.add_argument("--repeat", type=int, default=3, help="每个阶段运行次数，取最短耗时")
+    parser.add_argument("--threshold", type=float, default=0.2, help="判定为回归的变慢比例")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="基线文件")
+    parser.add_argument("--save-baseline", action="store_true", help="将本次结果保存为基线")
+    args = parser.parse_args(argv)
+
+    if args.sizes:
+        sizes = [int(size) for size in args.sizes.split(',')]
+    else:
+        sizes = FULL_SIZES if args.full else DEFAULT_SIZES
+
+    baseline_path = os.path.abspath(args.baseline)
+    # 日志和总结文件写入临时目录，不影响工作目录
+    os.chdir(tempfile.mkdtemp(prefix="wechat_summary_bench_"))
+
+    results = {}
+    for size in sizes:
+        results.update(bench_size(size, args.repeat))
+
+    report = {
+        'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    result_path = os.path.join(RESULTS_DIR, f"bench_{datetime.datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(result_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存到 {result_path}")
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(baseline_path):
+            with open(baseline_path, 'r', encoding='utf-8') as f:
+                baseline = json.load(f).get('results', {})
+        baseline.update(results)
+        with open(baseline_path, 'w', encoding='utf-8') as f:
+            json.dump(dict(report, results=baseline), f, ensure_ascii=False, indent=2)
+        print(f"基线已更新：{baseline_path}")
+        return 0
+
+    if not os.path.exists(baseline_path):
+        print(f"未找到基线文件 {baseline_path}，使用 --save-baseline 生成")
+        return 2
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f).get('results', {})
+    regressions = compare(results, baseline, args.threshold)
+    for name, base, seconds in regressions:
+        print(f"性能回归：{name} {base * 1000:.2f} ms -> {seconds * 1000:.2f} ms (+{(seconds / base - 1) * 100:.0f}%)")
+    if regressions:
+        return 1
+    print(f"未发现超过 {args.threshold:.0%} 的性能回归")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+"""图形界面启动耗时（从启动进程到主窗口显示）的基准测试
+
+用法：
+    python benchmarks/bench_startup.py                                      测试源码运行的启动耗时
+    python benchmarks/bench_startup.py --exe dist/wechat_summary_gui/wechat_summary_gui.exe
+                                                                            测试 PyInstaller 打包后的程序
+    python benchmarks/bench_startup.py --budget 1.5                         中位数超过 1.5 秒时退出码为 1
+
+程序通过环境变量 WECHAT_SUMMARY_STARTUP_PROBE 得知处于测试模式，窗口显示后写入时间戳并立即退出。
+第一次运行包含磁盘缓存预热，单独列出，不计入统计。
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+def measure_once(command, timeout):
+    """启动一次程序，返回到窗口显示的秒数"""
+    probe_fd, probe_path = tempfile.mkstemp(prefix="wechat_summary_startup_")
+    os.close(probe_fd)
+    os.remove(probe_path)
+    env = dict(os.environ, WECHAT_SUMMARY_STARTUP_PROBE=probe_path)
+    started = time.time()
+    try:
+        subprocess.run(command, env=env, cwd=REPO_DIR, timeout=timeout,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if not os.path.exists(probe_path):
+            raise RuntimeError("程序退出前没有显示窗口")
+        with open(probe_path, 'r', encoding='utf-8') as f:
+            shown = float(f.read())
+    finally:
+        if os.path.exists(probe_path):
+            os.remove(probe_path)
+    return shown - started
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="图形界面启动耗时基准测试")
+    parser.add_argument("--exe", help="打包后的可执行文件，默认使用当前 Python 运行 wechat_summary_gui.py")
+    parser.add_argument("--repeat", type=int, default=5, help="测量次数（不含第一次预热）")
+    parser.add_argument("--timeout", type=float, default=60, help="单次启动的超时时间（秒）")
+    parser.add_argument("--budget", type=float, help="启动耗时中位数的上限（秒）")
+    args = parser.parse_args(argv)
+
+    command = [args.exe] if args.exe else [sys.executable, os.path.join(REPO_DIR, "wechat_summary_gui.py")]
+    warmup = measure_once(command, args.timeout)
+    print(f"预热：{warmup:.3f} 秒")
+    results = [measure_once(command, args.timeout) for _ in range(args.repeat)]
+    median = statistics.median(results)
+    print(f"启动到窗口显示：中位数 {median:.3f} 秒，最短 {min(results):.3f} 秒，最长 {max(results):.3f} 秒")
+
+    if args.budget is not None and median > args.budget:
+        print(f"超过启动耗时预算 {args.budget:.3f} 秒")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
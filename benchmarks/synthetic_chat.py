@@ -0,0 +1,82 @@
+"""生成逼真的合成群聊记录，用于基准测试
+
+消息包含时间分隔、撤回、系统消息、自己发送的消息、中文文本、@提及、链接、表情和图片，
+以 fake_wechat.FakeWeChat 的形式提供，与 wxauto 的 GetAllMessage / LoadMoreMessage 行为一致。
+"""
+import datetime
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_wechat import FakeMessage, FakeWeChat
+
+SURNAMES = "王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗"
+GIVEN_NAMES = ["伟", "芳", "娜", "敏", "静", "磊", "洋", "勇", "艳", "杰", "涛", "明", "超", "霞", "平", "刚"]
+SUBJECTS = ["这个需求", "线上环境", "今天的发版", "数据同步任务", "新的接口", "周报", "测试用例", "监控告警", "集群扩容", "代码评审"]
+PREDICATES = ["需要再确认一下", "已经处理好了", "下午三点前要完成", "有点问题", "我来跟进", "还在排查", "可以先上线", "要补充文档", "延迟到明天", "建议回滚"]
+DETAILS = ["影响范围不大", "日志里有报错", "大家注意一下", "昨天也出现过", "和上周的问题类似", "具体看文档", "负责人是我", "请尽快回复"]
+SHORT_REPLIES = ["收到", "好的", "+1", "👍", "明白", "OK", "谢谢", "哈哈哈"]
+MEDIA = ["[动画表情]", "[图片]", "[文件]", "[视频]", "[语音]"]
+
+def make_senders(rng, count=50):
+    senders = []
+    while len(senders) < count:
+        name = rng.choice(SURNAMES) + "".join(rng.choice(GIVEN_NAMES) for _ in range(rng.randint(1, 2)))
+        if name not in senders:
+            senders.append(name)
+    return senders
+
+def make_text(rng, senders):
+    roll = rng.random()
+    if roll < 0.1:
+        return rng.choice(SHORT_REPLIES)
+    if roll < 0.17:
+        return rng.choice(MEDIA)
+    text = f"{rng.choice(SUBJECTS)}{rng.choice(PREDICATES)}，{rng.choice(DETAILS)}"
+    if roll > 0.9:
+        text = f"@{rng.choice(senders)} {text}"
+    elif roll > 0.85:
+        text += f" https://example.com/issue/{rng.randint(1000, 99999)}"
+    elif roll > 0.6:
+        text += f"，编号 {rng.randint(1, 100000)}"
+    return text
+
+def generate_messages(count, seed=42, start=None, end=None, separator_minutes=5):
+    """生成 count 条消息（不含时间分隔），按时间正序分布在当天 start 到 end 之间"""
+    rng = random.Random(seed)
+    now = datetime.datetime.now().replace(second=0, microsecond=0)
+    start = start or now.replace(hour=0, minute=1)
+    end = end or max(now, start + datetime.timedelta(minutes=1))
+    span_minutes = max(1, int((end - start).total_seconds() // 60))
+    senders = make_senders(rng)
+
+    messages = []
+    last_separator = None
+    for i in range(count):
+        msg_time = start + datetime.timedelta(minutes=span_minutes * i // count)
+        if last_separator is None or msg_time - last_separator >= datetime.timedelta(minutes=separator_minutes):
+            messages.append(FakeMessage('time', 'SYS', msg_time.strftime('%H:%M')))
+            last_separator = msg_time
+
+        roll = rng.random()
+        sender = rng.choice(senders)
+        if roll < 0.02:
+            messages.append(FakeMessage('recall', 'SYS', f'"{sender}" 撤回了一条消息'))
+        elif roll < 0.03:
+            messages.append(FakeMessage('sys', 'SYS', f'"{sender}"邀请"{rng.choice(senders)}"加入了群聊'))
+        elif roll < 0.08:
+            messages.append(FakeMessage('self', 'Self', make_text(rng, senders)))
+        else:
+            messages.append(FakeMessage('friend', sender, make_text(rng, senders)))
+    return messages
+
+def make_wechat(count, seed=42, pages=40):
+    """返回加载约 pages 轮即可读完全部消息的假客户端"""
+    messages = generate_messages(count, seed)
+    return FakeWeChat(messages, page_size=max(1, len(messages) // pages + 1))
+
+if __name__ == "__main__":
+    for msg in generate_messages(int(sys.argv[1]) if len(sys.argv) > 1 else 20):
+        print(msg.type, msg.sender, msg.content, sep="\t")
@@ -0,0 +1,210 @@
+"""聊天统计：调用AI服务前用 numpy 统计发言、活跃时段和高频短语
+
+默认提示词要求模型列出参与者、讨论时间和热门话题，原本模型需要通读聊天记录自行统计。
+这里预先算好一小段统计文字附在聊天记录之前，模型可以直接引用；界面在等待总结时也能立即显示。
+
+    发言数、人数和发言最多的成员
+    按小时汇总的消息数；每分钟消息数（时间取自最近的时间消息）在 10 分钟窗口内明显高于平均的时段为活跃时段
+    出现在最多消息中的中文短语（2、3 字 n-gram，相邻且次数接近的合并为更长的短语）
+
+需要安装 numpy；没有安装时 available() 返回 False。
+"""
+import datetime
+import re
+
+from extractive_summary import available, hashed_ngrams, is_cjk, np, text_codepoints
+
+TOP_SENDERS = 8
+TOP_PHRASES = 12
+MAX_BURSTS = 3
+# 活跃时段的滑动窗口（分钟）和最少消息数
+BURST_WINDOW = 10
+BURST_MIN_MESSAGES = 10
+# 短语至少出现在几条消息中
+MIN_PHRASE_MESSAGES = 3
+# 每种长度参与合并的候选短语数
+PHRASE_CANDIDATES = 60
+# 常见但没有话题意义的短语
+STOP_PHRASES = {
+    "哈哈", "哈哈哈", "好的", "收到", "谢谢", "明白", "可以", "没有", "就是", "还是", "不是", "是不是", "一下",
+    "这个", "那个", "什么", "怎么", "我们", "你们", "他们", "大家", "已经", "一个", "现在", "今天", "知道",
+}
+# 只有 [图片]、[动画表情] 等占位文字的消息不参与短语统计
+MEDIA_PATTERN = re.compile(r'^\[[^\]]{1,6}\]$')
+
+def _sender_counts(records):
+    senders = [record[1] for record in records if record[0] in ('friend', 'self')]
+    if not senders:
+        return 0, []
+    names, counts = np.unique(np.array(senders), return_counts=True)
+    order = np.argsort(-counts, kind='stable')[:TOP_SENDERS]
+    return len(names), [(str(names[i]), int(counts[i])) for i in order]
+
+def _message_times(records, parse_time):
+    """返回 (每条发言距最早时间的分钟数，没有时间时为 -1, 最早时间, 最晚时间)"""
+    time_positions = []
+    times = []
+    for index, record in enumerate(records):
+        if record[0] == 'time':
+            parsed = parse_time(record[1])
+            if parsed:
+                time_positions.append(index)
+                times.append(parsed)
+    message_positions = np.array([i for i, record in enumerate(records) if record[0] in ('friend', 'self')],
+                                 dtype=np.int64)
+    if not times or not len(message_positions):
+        return np.full(len(message_positions), -1), None, None
+    first = min(times)
+    offsets = np.array([int((t - first).total_seconds() // 60) for t in times])
+    slot = np.searchsorted(np.array(time_positions), message_positions, side='right') - 1
+    minutes = np.where(slot >= 0, offsets[np.maximum(slot, 0)], -1)
+    return minutes, first, max(times)
+
+def _bursts(histogram, first):
+    """返回消息数明显高于平均的时段 [(开始, 结束, 消息数)]"""
+    if len(histogram) < BURST_WINDOW:
+        return []
+    totals = np.concatenate(([0], np.cumsum(histogram)))
+    windows = totals[BURST_WINDOW:] - totals[:-BURST_WINDOW]
+    threshold = max(BURST_MIN_MESSAGES, windows.mean() + 2 * windows.std())
+    hot = windows >= threshold
+    if not hot.any():
+        return []
+    # 连续超过阈值的窗口合并为一个时段
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], hot.astype(np.int8), [0]))))
+    bursts = []
+    for start, stop in zip(edges[::2], edges[1::2]):
+        end = stop - 1 + BURST_WINDOW
+        bursts.append((int(start), int(end), int(histogram[start:end].sum())))
+    bursts = sorted(bursts, key=lambda burst: -burst[2])[:MAX_BURSTS]
+    return [
+        (first + datetime.timedelta(minutes=start), first + datetime.timedelta(minutes=end), count)
+        for start, end, count in sorted(bursts)
+    ]
+
+def _phrase_counts(records):
+    """返回 [(短语, 出现的消息数)]，按次数从多到少"""
+    texts = [record[2] for record in records
+             if record[0] in ('friend', 'self') and not MEDIA_PATTERN.match(record[2])]
+    if not texts:
+        return []
+    codepoints, owner, _, _ = text_codepoints(texts)
+    is_word = is_cjk(codepoints)
+    candidates = []
+    for size in (3, 2):
+        rows, keys, starts = hashed_ngrams(codepoints, owner, is_word, sizes=(size,))
+        if not len(rows):
+            continue
+        vocab, first_index, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        # 同一条消息中重复出现只计一次（排序后去重比 np.unique 的哈希去重快）
+        cells = np.sort(rows.astype(np.int64) * len(vocab) + inverse)
+        cells = cells[np.concatenate(([True], cells[1:] != cells[:-1]))]
+        document_counts = np.bincount(cells % len(vocab), minlength=len(vocab))
+        for column in np.argsort(-document_counts, kind='stable')[:PHRASE_CANDIDATES]:
+            count = int(document_counts[column])
+            if count < MIN_PHRASE_MESSAGES:
+                break
+            start = starts[first_index[column]]
+            phrase = "".join(map(chr, codepoints[start:start + size]))
+            candidates.append((phrase, count))
+    return _merge_phrases(sorted(candidates, key=lambda item: (-item[1], -len(item[0]))))
+
+def _join_phrases(first, second):
+    """两个短语互相包含或首尾重叠至少两个字时返回合并后的短语，否则返回 None"""
+    if first in second:
+        return second
+    if second in first:
+        return first
+    for left, right in ((first, second), (second, first)):
+        for overlap in range(min(len(left), len(right)) - 1, 1, -1):
+            if left.endswith(right[:overlap]):
+                return left + right[overlap:]
+    return None
+
+def _merge_phrases(candidates):
+    """合并互相包含或首尾相接、次数接近的短语，例如"数据同"和"据同步"合并为"数据同步"
+
+    合并后的短语可能又能与之前的短语合并，所以反复合并直到没有变化
+    """
+    phrases = []
+    for phrase, count in candidates:
+        if phrase in STOP_PHRASES:
+            continue
+        phrases.append((phrase, count))
+        merged = True
+        while merged:
+            merged = False
+            for i in range(len(phrases) - 1):
+                for j in range(i + 1, len(phrases)):
+                    (first, first_count), (second, second_count) = phrases[i], phrases[j]
+                    if min(first_count, second_count) < 0.8 * max(first_count, second_count):
+                        continue
+                    joined = _join_phrases(first, second)
+                    if joined:
+                        phrases[i] = (joined, max(first_count, second_count))
+                        del phrases[j]
+                        merged = True
+                        break
+                if merged:
+                    break
+        if len(phrases) > TOP_PHRASES + 5:
+            break
+    return sorted(phrases, key=lambda item: -item[1])[:TOP_PHRASES]
+
+def compute_stats(records, parse_time):
+    """统计消息记录；parse_time 解析时间消息的内容，返回 datetime 或 None
+
+    返回的字典可直接序列化为 JSON：messages、senders、top_senders、start、end、hourly、bursts、phrases
+    """
+    senders, top_senders = _sender_counts(records)
+    minutes, first, last = _message_times(records, parse_time)
+    stats = {
+        'messages': len(minutes),
+        'senders': senders,
+        'top_senders': top_senders,
+        'start': None,
+        'end': None,
+        'hourly': [],
+        'bursts': [],
+        'phrases': _phrase_counts(records),
+    }
+    if first is None:
+        return stats
+
+    # 跨天时显示日期
+    time_format = '%H:%M' if first.date() == last.date() else '%m-%d %H:%M'
+    stats['start'] = first.strftime(time_format)
+    stats['end'] = last.strftime(time_format)
+    timed = minutes[minutes >= 0]
+    histogram = np.bincount(timed, minlength=int(timed.max()) + 1 if len(timed) else 1)
+    # 按整点汇总
+    hour_offset = first.minute
+    hourly = np.bincount((np.arange(len(histogram)) + hour_offset) // 60, weights=histogram)
+    stats['hourly'] = [
+        ((first.replace(minute=0) + datetime.timedelta(hours=hour)).strftime(time_format), int(count))
+        for hour, count in enumerate(hourly) if count
+    ]
+    stats['bursts'] = [
+        {'start': start.strftime(time_format), 'end': end.strftime(time_format), 'messages': count}
+        for start, end, count in _bursts(histogram, first)
+    ]
+    return stats
+
+def format_stats(stats):
+    """渲染为附在聊天记录之前的统计文字"""
+    lines = ["【聊天统计】以下数据由程序统计，可直接引用，无需逐条计数"]
+    summary = f"共 {stats['messages']} 条发言，{stats['senders']} 人参与"
+    if stats['start']:
+        summary = f"时间 {stats['start']} - {stats['end']}，" + summary
+    lines.append(summary)
+    if stats['top_senders']:
+        lines.append("发言最多：" + "，".join(f"{name} {count}" for name, count in stats['top_senders']))
+    if stats['hourly']:
+        lines.append("各时段发言：" + "，".join(f"{hour} {count}" for hour, count in stats['hourly']))
+    if stats['bursts']:
+        lines.append("讨论最集中：" + "，".join(
+            f"{burst['start']}-{burst['end']}（{burst['messages']} 条）" for burst in stats['bursts']
+        ))
+    if stats['phrases']:
+        lines.append("高频词：" + "，".join(f"{phrase}({count})" for phrase, count in stats['phrases']))
+    return "\n".join(lines)
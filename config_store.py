@@ -0,0 +1,129 @@
+from loguru import logger
+import atexit
+import json
+import os
+import threading
+
+CONFIG_DIR = "config"
+AI_CONFIG_PATH = os.path.join(CONFIG_DIR, "ai_config.json")
+PROMPTS_PATH = os.path.join(CONFIG_DIR, "prompts.json")
+
+class JsonConfigStore:
+    """JSON 配置文件的读写
+
+    save 只记录待写入的内容，最后一次调用后 debounce 秒才写入文件，连续的多次保存合并为一次；
+    写入时先写临时文件再替换，中途崩溃不会损坏原文件。
+    load 只在文件的修改时间或大小变化时重新读取，否则返回缓存的内容。
+    """
+
+    def __init__(self, path, debounce=0.5):
+        self.path = path
+        self.debounce = debounce
+        self.lock = threading.Lock()
+        self.pending = None
+        self.timer = None
+        self.signature = None
+        self.cached = None
+        atexit.register(self.flush)
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def exists(self):
+        with self.lock:
+            return self.pending is not None or self._stat() is not None
+
+    def changed(self):
+        """文件在上次读取或写入之后是否被其他程序修改过"""
+        with self.lock:
+            return self.pending is None and self._stat() != self.signature
+
+    def load(self, default=None):
+        """返回文件内容的副本，文件不存在时返回 default；有尚未写入的内容时返回该内容"""
+        with self.lock:
+            if self.pending is not None:
+                return json.loads(self.pending)
+            signature = self._stat()
+            if signature is None:
+                return default
+            if signature != self.signature:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.cached = f.read()
+                self.signature = signature
+            return json.loads(self.cached)
+
+    def save(self, data):
+        """计划保存 data，立即返回"""
+        text = json.dumps(data, ensure_ascii=False, indent=4)
+        with self.lock:
+            self.pending = text
+            if self.timer is not None:
+                self.timer.cancel()
+            self.timer = threading.Timer(self.debounce, self.flush)
+            self.timer.daemon = True
+            self.timer.start()
+
+    def flush(self):
+        """立即写入尚未保存的内容"""
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            text = self.pending
+            if text is None:
+                return
+            try:
+                directory = os.path.dirname(self.path)
+                if directory and not os.path.exists(directory):
+                    os.makedirs(directory)
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(text)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                logger.error(f"保存配置文件 {self.path} 失败: {e}")
+                return
+            self.pending = None
+            self.cached = text
+            self.signature = self._stat()
+        logger.info(f"配置已保存到: {self.path}")
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_store(path):
+    """返回进程内共用的配置文件存储，同一文件只有一个实例"""
+    path = os.path.abspath(path)
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = JsonConfigStore(path)
+        return _stores[path]
+
+def load_service_config(service_name=None, config_path=AI_CONFIG_PATH):
+    """从GUI保存的配置文件中读取AI服务配置，未指定服务时使用上次使用的服务"""
+    data = get_store(config_path).load()
+    if data is None:
+        raise FileNotFoundError(f"未找到配置文件：{config_path}")
+    services = data.get('services', {})
+    if not service_name:
+        service_name = data.get('last_service', '')
+    if service_name not in services:
+        raise ValueError(f"未找到AI服务配置：{service_name}")
+    return services[service_name]
+
+def load_prompt(prompt_name=None, prompts_path=PROMPTS_PATH, config_path=AI_CONFIG_PATH):
+    """按名称读取提示词内容，未指定名称时使用上次使用的提示词"""
+    if not prompt_name:
+        prompt_name = (get_store(config_path).load() or {}).get('last_prompt')
+    prompts = get_store(prompts_path).load()
+    if not prompt_name or prompts is None:
+        return None
+    if prompt_name not in prompts:
+        raise ValueError(f"未找到提示词：{prompt_name}")
+    return prompts[prompt_name].get('content') or None
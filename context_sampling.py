@@ -0,0 +1,157 @@
+"""聊天记录超出模型上下文时的分层采样
+
+聊天记录（抽取式预总结之后）仍然放不进所选模型的上下文时，按时间段和发言人分层采样，
+一次请求完成总结，不必分多轮总结再合并：
+
+    含 @、链接或关键词的消息优先全部保留（放不下时同样分层采样）
+    其余消息按 (时间段, 发言人) 分组，每组按黄金分割序列排序：每组先取第一条，
+    再在组内均匀取样，各组的采样比例接近，发言少的人和冷清的时段也有代表
+    按顺序加入消息及其所在时间段的时间消息，直到正好用完 token 预算
+
+不依赖 numpy，10 万条消息约 1 秒。
+"""
+import re
+import time
+
+from wechat_summary import estimate_tokens, parse_message_time, render_record
+
+# 常用模型的上下文长度（tokens）；服务配置中的 context_window 优先
+CONTEXT_WINDOWS = {
+    'deepseek-chat': 65536,
+    'deepseek-reasoner': 65536,
+    'moonshot-v1-8k': 8192,
+    'moonshot-v1-32k': 32768,
+    'moonshot-v1-128k': 131072,
+    'qwen-max': 32768,
+    'qwen-plus': 131072,
+    'qwen-turbo': 131072,
+    'qwen-long': 1000000,
+    'gpt-4o': 128000,
+    'gpt-4o-mini': 128000,
+    'gpt-4.1': 1047576,
+    'glm-4': 128000,
+}
+# 表中没有的模型按此长度处理
+DEFAULT_CONTEXT_WINDOW = 32768
+# 为模型输出预留的 tokens，不超过上下文长度的四分之一
+OUTPUT_RESERVE = 4096
+# 系统提示词、消息格式等额外开销
+REQUEST_OVERHEAD = 64
+
+# 时间段数量和最短时间段（分钟）
+TIME_BUCKETS = 24
+MIN_BUCKET_MINUTES = 10
+# 优先保留的消息
+DEFAULT_KEYWORDS = ("通知", "公告", "重要", "紧急", "截止", "务必")
+MENTION_PATTERN = re.compile(r'@[^\s@ ]+')
+LINK_PATTERN = re.compile(r'https?://|www\.', re.IGNORECASE)
+
+_GOLDEN_RATIO = 0.6180339887498949
+
+def context_window(ai_config):
+    """返回服务配置所用模型的上下文长度：先看配置中的 context_window，再按模型名称（含前缀）查表"""
+    if ai_config.get('context_window'):
+        return int(ai_config['context_window'])
+    model = ai_config.get('model', 'qwen-plus')
+    if model in CONTEXT_WINDOWS:
+        return CONTEXT_WINDOWS[model]
+    # 带日期或版本后缀的模型名称，如 qwen-plus-2025-01-25
+    prefixes = [name for name in CONTEXT_WINDOWS if model.startswith(name)]
+    if prefixes:
+        return CONTEXT_WINDOWS[max(prefixes, key=len)]
+    return DEFAULT_CONTEXT_WINDOW
+
+def input_budget(ai_config, prompt, header=None):
+    """聊天记录可用的 token 数：上下文长度减去输出预留、提示词和统计文字"""
+    window = context_window(ai_config)
+    budget = window - min(OUTPUT_RESERVE, window // 4) - REQUEST_OVERHEAD - estimate_tokens(prompt)
+    if header:
+        budget -= estimate_tokens(header) + 1
+    return max(budget, 0)
+
+def _is_priority(record, keywords):
+    text = record[-1]
+    return bool(MENTION_PATTERN.search(text) or LINK_PATTERN.search(text)
+                or any(keyword in text for keyword in keywords))
+
+def _time_buckets(records):
+    """返回 (每条记录所在的时间段编号, 每条记录之前最近的时间消息下标，没有时为 -1)"""
+    minutes = []
+    previous_time = []
+    current = None
+    latest = -1
+    for index, record in enumerate(records):
+        if record[0] == 'time':
+            latest = index
+            parsed = parse_message_time(record[1])
+            if parsed:
+                current = parsed
+        minutes.append(current)
+        previous_time.append(latest)
+    known = [minute for minute in minutes if minute is not None]
+    if not known:
+        return [0] * len(records), previous_time
+    first = min(known)
+    span = (max(known) - first).total_seconds() / 60
+    width = max(MIN_BUCKET_MINUTES, span / TIME_BUCKETS)
+    buckets = [int((minute - first).total_seconds() / 60 // width) if minute else 0 for minute in minutes]
+    return buckets, previous_time
+
+def _stratified_order(indexes, strata):
+    """按分层采样的顺序返回 indexes：各组第 i 条的排序键为 i·φ 的小数部分"""
+    position = {}
+    keyed = []
+    for index in indexes:
+        stratum = strata[index]
+        i = position.get(stratum, 0)
+        position[stratum] = i + 1
+        keyed.append(((i * _GOLDEN_RATIO) % 1.0, index))
+    keyed.sort()
+    return [index for _, index in keyed]
+
+def sample_records(records, budget, keywords=DEFAULT_KEYWORDS):
+    """分层采样不超过 budget tokens 的记录，保持原有顺序，返回 (记录列表, 统计)
+
+    统计包含 messages、kept、tokens、kept_tokens、rate（保留的消息比例）、priority（保留的优先消息数）和 seconds
+    """
+    started = time.perf_counter()
+    # 每行额外计一个换行
+    tokens = [estimate_tokens(render_record(record)) + 1 for record in records]
+    total = sum(tokens)
+    messages = sum(1 for record in records if record[0] != 'time')
+    stats = {'messages': messages, 'kept': messages, 'tokens': total, 'kept_tokens': total, 'rate': 1.0,
+             'priority': 0}
+    if total <= budget:
+        stats['seconds'] = time.perf_counter() - started
+        return list(records), stats
+
+    buckets, previous_time = _time_buckets(records)
+    strata = [(buckets[i], record[1] if record[0] in ('friend', 'self') else record[0])
+              for i, record in enumerate(records)]
+    candidates = [i for i, record in enumerate(records) if record[0] != 'time']
+    priority = [i for i in candidates if _is_priority(records[i], keywords)]
+    priority_set = set(priority)
+    rest = [i for i in candidates if i not in priority_set]
+
+    kept = [False] * len(records)
+    used = 0
+    priority_kept = 0
+    smallest = min(tokens[i] for i in candidates) if candidates else 0
+    for index in _stratified_order(priority, strata) + _stratified_order(rest, strata):
+        if budget - used < smallest:
+            break
+        related = [j for j in (index, previous_time[index]) if j >= 0 and not kept[j]]
+        cost = sum(tokens[j] for j in related)
+        if used + cost > budget:
+            continue
+        for j in related:
+            kept[j] = True
+        used += cost
+        if index in priority_set:
+            priority_kept += 1
+
+    selected = [record for record, keep in zip(records, kept) if keep]
+    kept_messages = sum(1 for record in selected if record[0] != 'time')
+    stats.update(kept=kept_messages, kept_tokens=used, rate=kept_messages / messages if messages else 1.0,
+                 priority=priority_kept, seconds=time.perf_counter() - started)
+    return selected, stats
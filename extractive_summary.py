@@ -0,0 +1,213 @@
+"""本地抽取式预总结：调用AI服务前挑选信息量最高的消息，缩小输入
+
+按 TextRank 的思路给消息打分：每条消息表示为中文字符 2-gram、3-gram 哈希后的 TF-IDF 向量，
+消息之间的相似度图不显式构造，幂迭代中的相似度矩阵乘法拆成两次稀疏乘法
+（先按 n-gram 汇总、再按消息汇总），都用 numpy.bincount 完成，10 万条消息几秒内即可完成。
+按得分从高到低选取消息直到用完 token 预算，同时保留回复上下文：
+前一条消息、消息中 @ 到的人最近的一次发言，以及所在时间段的时间消息。
+
+需要安装 numpy；没有安装时 available() 返回 False，调用方应跳过这一步。
+"""
+import re
+import time
+
+from wechat_summary import render_record
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+NGRAM_SIZES = (2, 3)
+DAMPING = 0.85
+MAX_ITERATIONS = 50
+TOLERANCE = 1e-6
+# 每条被选中的消息额外保留的前文条数
+CONTEXT_MESSAGES = 1
+# 向前查找被 @ 的人最近一次发言的范围
+MENTION_LOOKBACK = 200
+
+MENTION_PATTERN = re.compile(r'@([^\s@ ]+)')
+_HASH_MULTIPLIER = 1000003
+
+def available():
+    return np is not None
+
+def _codepoints(texts):
+    """将文本列表拼接为码位数组，返回 (码位, 每条文本的起始位置, 长度)；文本之间以换行分隔"""
+    joined = "\n".join(texts)
+    codepoints = np.frombuffer(joined.encode('utf-32-le'), dtype=np.uint32)
+    lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+    starts = np.zeros(len(texts), dtype=np.int64)
+    np.cumsum(lengths[:-1] + 1, out=starts[1:])
+    return codepoints, starts, lengths
+
+def _count_per_text(mask, starts, lengths):
+    counts = np.concatenate(([0], np.cumsum(mask, dtype=np.int64)))
+    return counts[starts + lengths] - counts[starts]
+
+def is_cjk(codepoints):
+    return (codepoints >= 0x4e00) & (codepoints <= 0x9fff)
+
+def estimate_line_tokens(records):
+    """按 wechat_summary.estimate_tokens 的方式估算每条记录渲染后的 token 数（含换行）"""
+    lines = [render_record(record) for record in records]
+    codepoints, starts, lengths = _codepoints(lines)
+    cjk = _count_per_text(is_cjk(codepoints), starts, lengths)
+    return cjk + (lengths - cjk + 3) // 4 + 1
+
+def hashed_ngrams(codepoints, owner, is_word, sizes=NGRAM_SIZES):
+    """返回全部由文字组成的 n-gram 的 (所属文本, 哈希, 起始位置)，n 取 sizes 中的各个值"""
+    non_word = np.concatenate(([0], np.cumsum(~is_word, dtype=np.int64)))
+    values = codepoints.astype(np.uint64)
+    rows = []
+    keys = []
+    starts = []
+    for size in sizes:
+        count = len(codepoints) - size + 1
+        if count <= 0:
+            continue
+        positions = np.flatnonzero(non_word[size:size + count] == non_word[:count])
+        key = np.full(len(positions), size, dtype=np.uint64)
+        for offset in range(size):
+            key = key * np.uint64(_HASH_MULTIPLIER) ^ values[positions + offset]
+        rows.append(owner[positions])
+        keys.append(key)
+        starts.append(positions)
+    if not rows:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, np.zeros(0, dtype=np.uint64), empty
+    return np.concatenate(rows), np.concatenate(keys), np.concatenate(starts)
+
+def text_codepoints(texts):
+    """返回 (码位, 每个位置所属的文本, 每条文本的起始位置, 长度)"""
+    codepoints, starts, lengths = _codepoints(texts)
+    # 分隔用的换行归入前一条文本，它不是文字，不会出现在 n-gram 中
+    owner = np.repeat(np.arange(len(texts)), lengths + 1)[:len(codepoints)]
+    return codepoints, owner, starts, lengths
+
+def _ngram_matrix(texts):
+    """返回稀疏矩阵的 (行, 列, 权重)：行为消息，列为 n-gram，权重为按行归一化的 TF-IDF"""
+    codepoints, owner, _, _ = text_codepoints([text.lower() for text in texts])
+    is_word = (is_cjk(codepoints)
+               | ((codepoints >= ord('0')) & (codepoints <= ord('9')))
+               | ((codepoints >= ord('a')) & (codepoints <= ord('z'))))
+    rows, keys, _ = hashed_ngrams(codepoints, owner, is_word)
+    if not len(rows):
+        return rows, rows, np.zeros(0)
+
+    # 相同 (消息, n-gram) 合并为词频，n-gram 重新编号为连续的列
+    vocab, cols = np.unique(keys, return_inverse=True)
+    cell = rows.astype(np.int64) * len(vocab) + cols
+    cell, tf = np.unique(cell, return_counts=True)
+    rows = cell // len(vocab)
+    cols = cell % len(vocab)
+    df = np.bincount(cols, minlength=len(vocab))
+    weights = (1 + np.log(tf)) * (np.log((len(texts) + 1) / (df[cols] + 1)) + 1)
+    norms = np.sqrt(np.bincount(rows, weights=weights * weights, minlength=len(texts)))
+    weights /= norms[rows]
+    return rows, cols, weights
+
+def textrank_scores(texts):
+    """返回每条文本的 TextRank 得分；相似度为 n-gram TF-IDF 向量的余弦相似度"""
+    count = len(texts)
+    rows, cols, weights = _ngram_matrix(texts)
+    if not len(rows):
+        return np.zeros(count)
+    vocab_size = int(cols.max()) + 1
+
+    def similarity_dot(vector):
+        # S·v = X·(Xᵀ·v)，不构造 S
+        per_ngram = np.bincount(cols, weights=weights * vector[rows], minlength=vocab_size)
+        return np.bincount(rows, weights=weights * per_ngram[cols], minlength=count)
+
+    # 有 n-gram 的消息与自身的相似度为 1，计算度数时去掉
+    self_similarity = (np.bincount(rows, minlength=count) > 0).astype(float)
+    degree = similarity_dot(np.ones(count)) - self_similarity
+    linked = degree > 1e-12
+    inverse_degree = np.zeros(count)
+    inverse_degree[linked] = 1 / degree[linked]
+
+    scores = np.full(count, 1 / count)
+    for _ in range(MAX_ITERATIONS):
+        spread = scores * inverse_degree
+        # 没有相似消息的节点的得分平均分给所有节点
+        dangling = scores[~linked].sum()
+        updated = (1 - DAMPING) / count + DAMPING * (
+            similarity_dot(spread) - spread * self_similarity + dangling / count
+        )
+        delta = np.abs(updated - scores).sum()
+        scores = updated
+        if delta < TOLERANCE:
+            break
+    # 信息量：同样居中的消息，包含的不同 n-gram 越多越优先
+    distinct = np.bincount(rows, minlength=count)
+    return scores * np.log1p(distinct)
+
+def select_records(records, budget, context=CONTEXT_MESSAGES):
+    """选取不超过 budget tokens 的记录，保持原有顺序，返回 (记录列表, 统计)
+
+    统计包含 messages、kept、tokens、kept_tokens、ratio（保留的 token 比例）和 seconds
+    """
+    started = time.perf_counter()
+    count = len(records)
+    tokens = estimate_line_tokens(records) if count else np.zeros(0, dtype=np.int64)
+    total = int(tokens.sum())
+    stats = {'messages': count, 'kept': count, 'tokens': total, 'kept_tokens': total, 'ratio': 1.0}
+    if total <= budget:
+        stats['seconds'] = time.perf_counter() - started
+        return list(records), stats
+
+    kinds = [record[0] for record in records]
+    candidate = np.array([kind in ('friend', 'self', 'sys') for kind in kinds])
+    texts = [record[-1] if candidate[i] else "" for i, record in enumerate(records)]
+    scores = textrank_scores(texts)
+    scores[~candidate] = 0
+    # 完全相同的消息（"收到"、"+1" 等）只保留最早的一条参与排序
+    seen = set()
+    for index in np.flatnonzero(candidate):
+        if texts[index] in seen:
+            scores[index] = 0
+        else:
+            seen.add(texts[index])
+
+    is_time = np.array([kind == 'time' for kind in kinds])
+    previous_time = np.maximum.accumulate(np.where(is_time, np.arange(count), -1))
+    message_positions = np.flatnonzero(candidate)
+
+    def reply_context(index):
+        """被选消息需要一并保留的记录"""
+        related = [index]
+        # 前面的若干条消息
+        position = np.searchsorted(message_positions, index)
+        related.extend(message_positions[max(0, position - context):position])
+        # 被 @ 的人最近一次发言
+        for name in MENTION_PATTERN.findall(records[index][-1]):
+            for earlier in range(index - 1, max(-1, index - MENTION_LOOKBACK), -1):
+                if kinds[earlier] in ('friend', 'self') and records[earlier][1] == name:
+                    related.append(earlier)
+                    break
+        related.extend(previous_time[j] for j in list(related) if previous_time[j] >= 0)
+        return related
+
+    kept = np.zeros(count, dtype=bool)
+    used = 0
+    smallest = int(tokens[candidate].min()) if candidate.any() else 0
+    for index in np.argsort(-scores, kind='stable'):
+        if scores[index] <= 0 or budget - used < smallest:
+            break
+        related = [j for j in set(reply_context(index)) if not kept[j]]
+        cost = int(tokens[related].sum())
+        if used + cost > budget:
+            # 带上下文放不下时只保留消息本身和时间
+            related = [j for j in (index, previous_time[index]) if j >= 0 and not kept[j]]
+            cost = int(tokens[related].sum())
+            if used + cost > budget:
+                continue
+        kept[related] = True
+        used += cost
+
+    selected = [records[i] for i in np.flatnonzero(kept)]
+    stats.update(kept=len(selected), kept_tokens=used, ratio=used / total if total else 1.0,
+                 seconds=time.perf_counter() - started)
+    return selected, stats
@@ -0,0 +1,250 @@
+"""本地模拟 OpenAI 兼容的 chat completions 接口，支持流式输出
+
+用法：python fake_openai_server.py --port 8765
+然后将服务的 base_url 配置为 http://127.0.0.1:8765/v1
+
+可模拟首字延迟、输出速度、随机错误和 429 限流，用于压测重试、并发限制和流式输出：
+    python fake_openai_server.py --latency 1.5 --tokens-per-second 30 --error-rate 0.05 \
+        --burst-every 20 --burst-length 3 --max-concurrent 4 --seed 1
+GET /stats 返回请求计数、各状态码次数和最大并发数。
+"""
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+
+DEFAULT_REPLY = "### 群聊精华总结\n1. 重要提醒：无\n2. 今日热门话题：部署计划确认\n3. 待跟进事项：确认部署时间"
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status, message, error_type, retry_after=None):
+        body = json.dumps({"error": {"message": message, "type": error_type}}).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if retry_after is not None:
+            self.send_header("Retry-After", str(retry_after))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip('/').endswith('/stats'):
+            self._send_json(200, self.server.stats())
+        elif self.path.rstrip('/').endswith('/models'):
+            self._send_json(200, {"object": "list", "data": [{"id": "fake-model", "object": "model"}]})
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+        self.server.requests.append(request)
+
+        outcome = self.server.begin_request()
+        try:
+            if outcome == 429:
+                self._send_error(429, "Rate limit reached, please retry later", "rate_limit_exceeded",
+                                 retry_after=self.server.retry_after)
+            elif outcome == 500:
+                self._send_error(500, "Simulated server error", "server_error")
+            else:
+                self._complete(request)
+        finally:
+            self.server.end_request(outcome)
+
+    def _complete(self, request):
+        server = self.server
+        reply = server.make_reply()
+        model = request.get('model', 'fake-model')
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        prompt_tokens = sum(len(m.get('content') or '') for m in request.get('messages', []))
+
+        server.wait_latency()
+        if not request.get('stream'):
+            # 非流式请求在返回前等待完整的生成时间
+            if server.tokens_per_second:
+                time.sleep(len(reply) / server.tokens_per_second)
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": reply},
+                    "finish_reason": "stop"
+                }],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": len(reply),
+                    "total_tokens": prompt_tokens + len(reply)
+                }
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        chunk_size = server.chunk_size
+        try:
+            for i in range(0, len(reply), chunk_size):
+                if i and server.tokens_per_second:
+                    time.sleep(chunk_size / server.tokens_per_second)
+                self._send_chunk(completion_id, created, model, {"content": reply[i:i + chunk_size]}, None)
+            self._send_chunk(completion_id, created, model, {}, "stop")
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端取消或超时后断开连接
+            pass
+        self.close_connection = True
+
+    def _send_chunk(self, completion_id, created, model, delta, finish_reason):
+        chunk = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+        }
+        self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode('utf-8'))
+        self.wfile.flush()
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    """模拟服务
+
+    latency / latency_jitter：收到请求到返回第一个字节的延迟（秒）及随机抖动
+    tokens_per_second：输出速度，每个字符按一个 token 计算，0 表示不限速
+    reply_tokens：将回复重复到指定长度，用于模拟长输出
+    error_rate：随机返回 500 的概率
+    burst_every / burst_length：每 burst_every 个请求之后，紧接着的 burst_length 个请求返回 429
+    max_concurrent：同时处理的请求超过该数量时返回 429
+    seed：随机数种子，相同种子和请求顺序下结果一致
+    """
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, reply=DEFAULT_REPLY, chunk_size=8, latency=0.0,
+                 latency_jitter=0.0, tokens_per_second=0, reply_tokens=None, error_rate=0.0,
+                 burst_every=0, burst_length=0, max_concurrent=0, retry_after=1, seed=None):
+        super().__init__((host, port), FakeOpenAIHandler)
+        self.reply = reply
+        self.chunk_size = chunk_size
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.tokens_per_second = tokens_per_second
+        self.reply_tokens = reply_tokens
+        self.error_rate = error_rate
+        self.burst_every = burst_every
+        self.burst_length = burst_length
+        self.max_concurrent = max_concurrent
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.requests = []
+        self.lock = threading.Lock()
+        self.received = 0
+        self.active = 0
+        self.max_active = 0
+        self.status_counts = {}
+
+    def begin_request(self):
+        """按到达顺序决定本次请求的结果：200、429 或 500"""
+        with self.lock:
+            self.received += 1
+            if self.burst_every and self.burst_length:
+                cycle = (self.received - 1) % (self.burst_every + self.burst_length)
+                if cycle >= self.burst_every:
+                    return 429
+            if self.max_concurrent and self.active >= self.max_concurrent:
+                return 429
+            if self.error_rate and self.random.random() < self.error_rate:
+                return 500
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            return 200
+
+    def end_request(self, status):
+        with self.lock:
+            if status == 200:
+                self.active -= 1
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+
+    def wait_latency(self):
+        delay = self.latency
+        if self.latency_jitter:
+            with self.lock:
+                delay += self.random.uniform(0, self.latency_jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def make_reply(self):
+        if not self.reply_tokens:
+            return self.reply
+        return (self.reply * (self.reply_tokens // len(self.reply) + 1))[:self.reply_tokens]
+
+    def stats(self):
+        with self.lock:
+            return {
+                'requests': self.received,
+                'active': self.active,
+                'max_concurrent': self.max_active,
+                'status': {str(status): count for status, count in sorted(self.status_counts.items())},
+            }
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        """在后台线程中启动服务，返回 base_url"""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self.base_url
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本地模拟 OpenAI 兼容接口")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="首字延迟（秒）")
+    parser.add_argument("--latency-jitter", type=float, default=0.0, help="首字延迟的随机抖动上限（秒）")
+    parser.add_argument("--tokens-per-second", type=float, default=0, help="输出速度，0 表示不限速")
+    parser.add_argument("--reply-tokens", type=int, help="回复长度（字符数）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="随机返回 500 的概率")
+    parser.add_argument("--burst-every", type=int, default=0, help="每隔多少个请求出现一次 429 突发")
+    parser.add_argument("--burst-length", type=int, default=0, help="每次 429 突发包含的请求数")
+    parser.add_argument("--max-concurrent", type=int, default=0, help="超过该并发数时返回 429，0 表示不限制")
+    parser.add_argument("--retry-after", type=int, default=1, help="429 响应的 Retry-After（秒）")
+    parser.add_argument("--seed", type=int, help="随机数种子")
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(
+        args.host, args.port, latency=args.latency, latency_jitter=args.latency_jitter,
+        tokens_per_second=args.tokens_per_second, reply_tokens=args.reply_tokens, error_rate=args.error_rate,
+        burst_every=args.burst_every, burst_length=args.burst_length, max_concurrent=args.max_concurrent,
+        retry_after=args.retry_after, seed=args.seed
+    )
+    print(f"模拟服务已启动：{server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
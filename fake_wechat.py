@@ -0,0 +1,64 @@
+"""模拟 wxauto.WeChat 的离线消息源，供测试工具和基准测试使用"""
+import datetime
+
+class FakeMessage:
+    def __init__(self, type, sender, content):
+        self.type = type
+        self.sender = sender
+        self.content = content
+
+    def __repr__(self):
+        return f"FakeMessage({self.type!r}, {self.sender!r}, {self.content!r})"
+
+def sample_messages(count=60, start=None, minutes_per_separator=10):
+    """生成一段当天的示例群聊记录，每隔若干分钟插入一条时间消息"""
+    if start is None:
+        start = datetime.datetime.now().replace(second=0, microsecond=0) - datetime.timedelta(minutes=count)
+    senders = ['张三', '李四', '王五']
+    messages = []
+    for i in range(count):
+        msg_time = start + datetime.timedelta(minutes=i)
+        if msg_time.date() != datetime.date.today():
+            continue
+        if i % minutes_per_separator == 0:
+            messages.append(FakeMessage('time', 'SYS', msg_time.strftime('%H:%M')))
+        messages.append(FakeMessage('friend', senders[i % len(senders)], f'第 {i} 条消息：今天的部署计划需要确认一下'))
+    return messages
+
+class FakeWeChat:
+    """与 wxauto.WeChat 接口一致的假消息源
+
+    GetAllMessage 返回当前已“加载”的消息，每次 LoadMoreMessage 向前多加载 page_size 条，
+    与真实客户端向上滚动时消息列表整体变长的行为一致。
+    groups 为群聊名称列表时只用于判断群聊是否存在；为 {群聊名称: 消息列表} 时 ChatWith 切换到该群聊的消息。
+    """
+
+    def __init__(self, messages=None, page_size=20, groups=None):
+        self.messages = list(sample_messages() if messages is None else messages)
+        self.page_size = page_size
+        self.groups = groups
+        self.loaded = min(page_size, len(self.messages))
+        self.current_chat = None
+        self.sent = []
+
+    def ChatWith(self, who):
+        if self.groups is not None and who not in self.groups:
+            return False
+        self.current_chat = who
+        if isinstance(self.groups, dict):
+            self.messages = list(self.groups[who])
+        self.loaded = min(self.page_size, len(self.messages))
+        return True
+
+    def GetAllMessage(self):
+        return self.messages[len(self.messages) - self.loaded:]
+
+    def LoadMoreMessage(self):
+        if self.loaded >= len(self.messages):
+            return False
+        self.loaded = min(self.loaded + self.page_size, len(self.messages))
+        return True
+
+    def SendMsg(self, msg):
+        self.sent.append((self.current_chat, msg))
+        return True
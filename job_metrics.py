@@ -0,0 +1,156 @@
+"""总结任务的阶段耗时统计
+
+每个任务结束后追加一条 JSON 记录到 logs/metrics/jobs_YYYY-MM-DD.jsonl，
+并汇总到 Prometheus 文本格式的 logs/metrics/wechat_summary.prom，供本机 node_exporter 的 textfile 采集器读取。
+设置环境变量 WECHAT_SUMMARY_METRICS=1 或调用 enable() 开启；关闭时不产生任何开销。
+"""
+from contextlib import contextmanager
+from loguru import logger
+import datetime
+import json
+import os
+import threading
+import time
+
+METRICS_DIR = os.path.join("logs", "metrics")
+PROM_FILE = "wechat_summary.prom"
+STATE_FILE = "aggregate.json"
+
+# 耗时直方图的分桶上限（秒）
+BUCKETS = (0.05, 0.1, 0.5, 1, 2, 5, 10, 30, 60, 120, 300, 600)
+
+_enabled = os.environ.get("WECHAT_SUMMARY_METRICS", "") not in ("", "0")
+_write_lock = threading.Lock()
+
+def enable(enabled=True):
+    global _enabled
+    _enabled = enabled
+
+def is_enabled():
+    return _enabled
+
+class JobTimer:
+    """记录一次总结任务中各命名阶段的耗时"""
+
+    def __init__(self, group_name, kind="summary"):
+        self.group_name = group_name
+        self.kind = kind
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.spans = []
+        self.finished = False
+
+    @contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans.append((name, time.perf_counter() - start))
+
+    def mark(self, name, seconds):
+        """记录不以代码块形式出现的耗时，例如首个 token 的到达时间"""
+        self.spans.append((name, seconds))
+
+    def to_record(self, status):
+        stages = {}
+        for name, seconds in self.spans:
+            stage = stages.setdefault(name, {'count': 0, 'seconds': 0.0})
+            stage['count'] += 1
+            stage['seconds'] += seconds
+        return {
+            'group': self.group_name,
+            'kind': self.kind,
+            'status': status,
+            'started_at': datetime.datetime.fromtimestamp(self.started_at).isoformat(timespec='seconds'),
+            'total_seconds': time.perf_counter() - self.started,
+            'stages': stages,
+            'spans': [{'name': name, 'seconds': round(seconds, 6)} for name, seconds in self.spans],
+        }
+
+    def finish(self, status="ok"):
+        """任务结束时写出记录，重复调用只写一次"""
+        if self.finished:
+            return None
+        self.finished = True
+        record = self.to_record(status)
+        try:
+            write_record(record)
+        except Exception as e:
+            logger.error(f"写入任务耗时统计失败: {e}")
+        return record
+
+def new_timer(group_name, kind="summary"):
+    """开启统计时返回 JobTimer，否则返回 None"""
+    return JobTimer(group_name, kind) if _enabled else None
+
+def _observe(histograms, name, seconds):
+    hist = histograms.setdefault(name, {'count': 0, 'sum': 0.0, 'buckets': [0] * len(BUCKETS)})
+    hist['count'] += 1
+    hist['sum'] += seconds
+    for i, bound in enumerate(BUCKETS):
+        if seconds <= bound:
+            hist['buckets'][i] += 1
+
+def _atomic_write(path, text):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def render_prometheus(state):
+    """将汇总数据渲染为 Prometheus 文本格式"""
+    lines = [
+        "# HELP wechat_summary_jobs_total Summary jobs finished, by kind and status.",
+        "# TYPE wechat_summary_jobs_total counter",
+    ]
+    for key, count in sorted(state['jobs'].items()):
+        kind, status = key.split('|', 1)
+        lines.append(
+            f'wechat_summary_jobs_total{{kind="{_escape_label(kind)}",status="{_escape_label(status)}"}} {count}'
+        )
+    for metric, label, histograms, help_text in (
+        ("wechat_summary_job_seconds", "kind", state['job_seconds'], "End-to-end summary job duration."),
+        ("wechat_summary_stage_seconds", "stage", state['stage_seconds'], "Duration of each summary job stage."),
+    ):
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} histogram")
+        for name, hist in sorted(histograms.items()):
+            label_value = _escape_label(name)
+            for bound, count in zip(BUCKETS, hist['buckets']):
+                lines.append(f'{metric}_bucket{{{label}="{label_value}",le="{bound}"}} {count}')
+            lines.append(f'{metric}_bucket{{{label}="{label_value}",le="+Inf"}} {hist["count"]}')
+            lines.append(f'{metric}_sum{{{label}="{label_value}"}} {hist["sum"]:.6f}')
+            lines.append(f'{metric}_count{{{label}="{label_value}"}} {hist["count"]}')
+    return "\n".join(lines) + "\n"
+
+def write_record(record, metrics_dir=METRICS_DIR):
+    """追加任务记录并更新 Prometheus 汇总文件"""
+    with _write_lock:
+        if not os.path.exists(metrics_dir):
+            os.makedirs(metrics_dir)
+        day = datetime.date.today().strftime('%Y-%m-%d')
+        with open(os.path.join(metrics_dir, f"jobs_{day}.jsonl"), 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+        # 汇总数据单独保存，进程重启后计数器继续累加
+        state_path = os.path.join(metrics_dir, STATE_FILE)
+        state = {'jobs': {}, 'job_seconds': {}, 'stage_seconds': {}}
+        if os.path.exists(state_path):
+            try:
+                with open(state_path, 'r', encoding='utf-8') as f:
+                    state.update(json.load(f))
+            except (OSError, ValueError) as e:
+                logger.error(f"读取耗时汇总失败，重新开始统计: {e}")
+
+        job_key = f"{record['kind']}|{record['status']}"
+        state['jobs'][job_key] = state['jobs'].get(job_key, 0) + 1
+        _observe(state['job_seconds'], record['kind'], record['total_seconds'])
+        for span in record['spans']:
+            _observe(state['stage_seconds'], span['name'], span['seconds'])
+
+        _atomic_write(state_path, json.dumps(state, ensure_ascii=False))
+        _atomic_write(os.path.join(metrics_dir, PROM_FILE), render_prometheus(state))
@@ -0,0 +1,67 @@
+"""进程内共用的异步任务运行环境
+
+一个后台线程运行 asyncio 事件循环，承载所有网络请求（AsyncOpenAI 流式输出等）；
+wxauto 操作和文件读写等阻塞调用交给事件循环的默认线程池执行。
+图形界面通过 submit 提交协程、通过 submit_blocking 提交阻塞调用，不再为每个任务创建线程，
+结果在 Future 的回调中以 Qt 信号的形式回到界面线程。
+"""
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
+import threading
+
+# 阻塞调用的线程数；wxauto 操作由 wx_lock 串行，其余为文件和数据库读写，不需要太多线程
+DEFAULT_WORKERS = 4
+
+class JobRuntime:
+    """后台事件循环和线程池，首次提交任务时启动"""
+
+    def __init__(self, max_workers=DEFAULT_WORKERS):
+        self.max_workers = max_workers
+        self.loop = None
+        self.executor = None
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        with self.lock:
+            if self.thread is not None:
+                return
+            ready = threading.Event()
+            self.thread = threading.Thread(target=self._run, args=(ready,), name="job-loop", daemon=True)
+            self.thread.start()
+        ready.wait()
+
+    def _run(self, ready):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="job-pool")
+        self.loop.set_default_executor(self.executor)
+        self.loop.call_soon(ready.set)
+        self.loop.run_forever()
+
+    def submit(self, coro):
+        """在事件循环中运行协程，返回 concurrent.futures.Future"""
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def submit_blocking(self, fn, *args, **kwargs):
+        """在线程池中执行阻塞调用，返回 concurrent.futures.Future"""
+        self.start()
+        return self.executor.submit(fn, *args, **kwargs)
+
+async def run_blocking(fn, *args, **kwargs):
+    """在协程中把阻塞调用交给事件循环的线程池执行"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, functools.partial(fn, *args, **kwargs))
+
+_runtime = None
+_runtime_lock = threading.Lock()
+
+def get_runtime():
+    """返回进程内共用的运行环境"""
+    global _runtime
+    with _runtime_lock:
+        if _runtime is None:
+            _runtime = JobRuntime()
+        return _runtime
@@ -0,0 +1,318 @@
+"""空闲时在后台预取常用群聊的总结
+
+图形界面记录每次请求的群聊、时间范围、提示词和服务，按总结存档中的总结次数选出最常用的几个群聊，
+在用户没有操作电脑、也没有其他任务使用微信时定期刷新这些群聊的滚动总结：
+
+    只滚动加载上次获取之后的新消息，与缓存的消息记录对齐后追加，超出时间范围的旧消息丢弃
+    新消息不多时把已有总结和新消息一起交给AI服务更新总结，否则重新总结全部消息
+    用户点击"获取总结"时，相同请求已有缓存则同样只加载新消息，几秒内即可返回
+
+让出交互：开始预取前检查 wx_lock 是否空闲以及（Windows 下通过 GetLastInputInfo）用户是否已空闲足够久；
+滚动加载过程中用户重新开始操作或有其他任务等待微信时立即停止。
+服务商限流：每个 base_url 一个令牌桶，后台预取只在有令牌时调用AI服务，界面请求同样消耗令牌。
+"""
+from loguru import logger
+import ctypes
+import datetime
+import sys
+import threading
+import time
+
+from summary_archive import get_archive
+from wechat_summary import (DEFAULT_PROMPT, JobControl, SummaryCancelled, estimate_tokens, fetch_group_messages,
+                            parse_message_time, build_transcript, summarize_messages, summarize_records,
+                            summary_flight, summary_key, wx_lock, wx_waiting)
+
+# 两次预取之间的间隔（秒）
+DEFAULT_INTERVAL = 300
+# 用户至少空闲多久（秒）才开始预取
+DEFAULT_IDLE_SECONDS = 120
+# 预取的群聊数量
+DEFAULT_MAX_GROUPS = 3
+# 未配置 rate_limit_rpm 时每个服务每分钟的请求数上限
+DEFAULT_RATE_LIMIT_RPM = 20
+# 新消息不超过该 token 数、且丢弃的旧消息不超过两成时增量更新总结
+DELTA_TOKENS = 4000
+MAX_DROPPED_SHARE = 0.2
+
+UPDATE_PROMPT = '''你会收到一份已有的微信群聊总结和之后的新消息。请把新消息的内容合并进总结，保持原有的结构和格式，输出完整的新总结，不要说明修改了哪些地方。原总结的要求如下：
+'''
+
+class TokenBucket:
+    """令牌桶：每分钟补充 rate_per_minute 个令牌，最多积累 capacity 个"""
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60
+        self.capacity = capacity or max(1, rate_per_minute // 4)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, count=1):
+        """有足够令牌时取出并返回 True，否则不等待直接返回 False"""
+        with self.lock:
+            self._refill()
+            if self.tokens < count:
+                return False
+            self.tokens -= count
+            return True
+
+    def consume(self, count=1):
+        """界面请求不等待令牌，直接扣除（可以为负），之后的后台预取相应推迟"""
+        with self.lock:
+            self._refill()
+            self.tokens -= count
+
+def user_idle_seconds():
+    """距用户最后一次键盘或鼠标操作的秒数；非 Windows 系统返回 None"""
+    if sys.platform != 'win32':
+        return None
+
+    class LASTINPUTINFO(ctypes.Structure):
+        _fields_ = [('cbSize', ctypes.c_uint), ('dwTime', ctypes.c_uint)]
+
+    info = LASTINPUTINFO()
+    info.cbSize = ctypes.sizeof(info)
+    if not ctypes.windll.user32.GetLastInputInfo(ctypes.byref(info)):
+        return None
+    ctypes.windll.kernel32.GetTickCount.restype = ctypes.c_uint
+    # 两个计数都是 32 位毫秒数，约 49.7 天回绕一次
+    return ((ctypes.windll.kernel32.GetTickCount() - info.dwTime) & 0xFFFFFFFF) / 1000
+
+class _YieldingControl(JobControl):
+    """后台预取的 JobControl：should_yield() 为真时在下一次检查或等待中停止"""
+
+    def __init__(self, should_yield):
+        super().__init__()
+        self.should_yield = should_yield
+
+    def check(self):
+        super().check()
+        if self.should_yield():
+            raise SummaryCancelled("用户正在使用电脑或微信，暂停预取")
+
+    def sleep(self, seconds):
+        deadline = time.monotonic() + seconds
+        while True:
+            self.check()
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            self.cancel_event.wait(min(remaining, 0.2))
+
+class _RollingSummary:
+    """一个请求的滚动总结：时间范围内的消息记录和对应的总结"""
+
+    def __init__(self, records, summary, fetched_at):
+        self.records = records
+        self.summary = summary
+        self.fetched_at = fetched_at
+
+def _new_records(old, new):
+    """返回 new 中排在 old 之后的部分；new 的开头与 old 的末尾对不上时返回 None"""
+    for start in range(min(len(new), len(old)) - 1, -1, -1):
+        if new[start] == old[-1] and new[:start + 1] == old[len(old) - start - 1:]:
+            return new[start + 1:]
+    return None
+
+def _trim_records(records, window_start):
+    """丢弃 window_start 之前的消息，返回 (保留的记录, 丢弃的条数)"""
+    for index, record in enumerate(records):
+        if record[0] == 'time':
+            parsed = parse_message_time(record[1])
+            if parsed and parsed >= window_start:
+                return records[index:], index
+    return records, 0
+
+def _last_time(records):
+    for record in reversed(records):
+        if record[0] == 'time':
+            parsed = parse_message_time(record[1])
+            if parsed:
+                return parsed
+    return None
+
+class Prefetcher:
+    """后台预取线程和滚动总结缓存"""
+
+    def __init__(self, interval=DEFAULT_INTERVAL, idle_seconds=DEFAULT_IDLE_SECONDS, max_groups=DEFAULT_MAX_GROUPS):
+        self.interval = interval
+        self.idle_seconds = idle_seconds
+        self.max_groups = max_groups
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.cache = {}
+        self.buckets = {}
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="prefetch", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def note_request(self, group_name, hours, ai_config, prompt):
+        """记录界面发起的请求，之后按相同的参数预取"""
+        with self.lock:
+            self.requests[group_name] = (hours, ai_config, prompt)
+
+    def has(self, group_name, hours, ai_config, prompt):
+        """是否有当天的滚动总结可以增量刷新"""
+        with self.lock:
+            entry = self.cache.get(summary_key(group_name, hours, prompt, ai_config))
+        return entry is not None and entry.fetched_at.date() == datetime.date.today()
+
+    def bucket(self, ai_config):
+        with self.lock:
+            key = ai_config.get('base_url')
+            if key not in self.buckets:
+                self.buckets[key] = TokenBucket(ai_config.get('rate_limit_rpm', DEFAULT_RATE_LIMIT_RPM))
+            return self.buckets[key]
+
+    def user_active(self):
+        idle = user_idle_seconds()
+        return idle is not None and idle < self.idle_seconds
+
+    def should_yield(self):
+        """用户正在操作电脑，或有其他任务在等待微信"""
+        return self.user_active() or wx_waiting()
+
+    def targets(self):
+        """按总结存档中的总结次数排序，返回最常用的 max_groups 个请求过的群聊"""
+        with self.lock:
+            requests = dict(self.requests)
+        counts = {row['group_name']: row['count'] for row in get_archive().groups()}
+        groups = sorted(requests, key=lambda group: counts.get(group, 0), reverse=True)[:self.max_groups]
+        return [(group,) + requests[group] for group in groups]
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"后台预取失败: {e}")
+
+    def run_once(self):
+        """预取一轮，返回刷新的群聊数量"""
+        refreshed = 0
+        for group_name, hours, ai_config, prompt in self.targets():
+            if self.user_active() or wx_lock.locked():
+                logger.debug("用户正在使用电脑或微信，跳过本轮预取")
+                break
+            if not self.bucket(ai_config).try_acquire():
+                logger.debug(f"{ai_config.get('base_url')} 的请求额度不足，跳过本轮预取")
+                break
+            control = _YieldingControl(self.should_yield)
+            try:
+                self.refresh(group_name, hours, ai_config, prompt, control=control, background=True)
+                refreshed += 1
+            except SummaryCancelled as e:
+                logger.info(f"预取群聊 {group_name} 已停止：{e}")
+                break
+        return refreshed
+
+    def refresh(self, group_name, hours, ai_config, prompt=None, control=None, wx=None, load_interval=2,
+                background=False):
+        """加载新消息并更新滚动总结，返回总结；相同请求正在执行时等待并共享其结果
+
+        background 为 True 时 control 只用于滚动加载（用户开始操作时停止），AI请求不受其影响
+        """
+        while True:
+            try:
+                summary, shared = summary_flight.do(
+                    summary_key(group_name, hours, prompt, ai_config),
+                    self._refresh, group_name, hours, ai_config, prompt, control, wx, load_interval, background,
+                    on_wait=control.check if control else None
+                )
+                break
+            except SummaryCancelled:
+                # 合并到的后台预取让出了微信，界面请求自己重新执行
+                if background or control is None or control.cancelled:
+                    raise
+        if shared:
+            logger.info(f"群聊 {group_name} 的相同总结任务正在执行，已合并请求")
+        return summary
+
+    def _refresh(self, group_name, hours, ai_config, prompt, control, wx, load_interval, background):
+        key = summary_key(group_name, hours, prompt, ai_config)
+        with self.lock:
+            entry = self.cache.get(key)
+        now = datetime.datetime.now()
+        window_start = max(now - datetime.timedelta(hours=float(hours)),
+                           now.replace(hour=0, minute=0, second=0, microsecond=0))
+        llm_control = None if background else control
+
+        last_time = _last_time(entry.records) if entry and entry.fetched_at.date() == now.date() else None
+        added = None
+        if last_time:
+            # 从缓存中最后一条时间消息之前开始加载，保证与缓存的记录有重叠
+            since = last_time - datetime.timedelta(minutes=1)
+            new = fetch_group_messages(group_name, (now - since).total_seconds() / 3600, wx=wx,
+                                       load_interval=load_interval, control=control)
+            added = _new_records(entry.records, new) if new else []
+            if added is None:
+                logger.info(f"群聊 {group_name} 的新消息与缓存对不上，重新加载")
+
+        if added is None:
+            records = fetch_group_messages(group_name, hours, wx=wx, load_interval=load_interval, control=control)
+            if not records:
+                return None
+            summary = self._summarize(records, ai_config, prompt, llm_control, background)
+        else:
+            records, dropped = _trim_records(entry.records + added, window_start)
+            if llm_control:
+                llm_control.report('delta', added=len(added), dropped=dropped)
+            if not added and not dropped:
+                summary = entry.summary
+            elif (added and dropped <= MAX_DROPPED_SHARE * len(records)
+                  and estimate_tokens(build_transcript(added)) <= DELTA_TOKENS):
+                summary = self._update(entry.summary, added, ai_config, prompt, llm_control, background)
+            else:
+                summary = self._summarize(records, ai_config, prompt, llm_control, background)
+            logger.info(f"群聊 {group_name} 的滚动总结：新增 {len(added)} 条消息，丢弃 {dropped} 条")
+
+        if summary:
+            with self.lock:
+                self.cache[key] = _RollingSummary(records, summary, now)
+        return summary
+
+    def _summarize(self, records, ai_config, prompt, control, background):
+        if not background:
+            self.bucket(ai_config).consume()
+        return summarize_records(records, ai_config, prompt, control=control)
+
+    def _update(self, summary, added, ai_config, prompt, control, background):
+        """把新消息合并进已有总结"""
+        if not background:
+            self.bucket(ai_config).consume()
+        header = f"【已有总结】\n{summary}\n\n【之后的新消息】"
+        return summarize_messages(added, ai_config, UPDATE_PROMPT + (prompt or DEFAULT_PROMPT), control=control,
+                                  header=header)
+
+_prefetcher = None
+
+def start_prefetcher(settings):
+    """按配置启动后台预取；settings 为 ai_config.json 中的 prefetch 字段，enabled 为真时才启动"""
+    global _prefetcher
+    if not settings.get('enabled') or _prefetcher is not None:
+        return _prefetcher
+    _prefetcher = Prefetcher(
+        interval=settings.get('interval', DEFAULT_INTERVAL),
+        idle_seconds=settings.get('idle_seconds', DEFAULT_IDLE_SECONDS),
+        max_groups=settings.get('max_groups', DEFAULT_MAX_GROUPS),
+    )
+    _prefetcher.start()
+    logger.info("已启动后台预取")
+    return _prefetcher
+
+def get_prefetcher():
+    """返回已启动的后台预取，未启用时返回 None"""
+    return _prefetcher
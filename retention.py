@@ -0,0 +1,158 @@
+"""日志和聊天记录存档的压缩与过期清理
+
+按目录配置保留策略：超过一定天数未修改的文件压缩为 .zst（安装了 zstandard 时）或 .gz，
+超过保留天数的文件删除，目录总大小超过上限时从最旧的文件开始删除。
+当天仍在写入的文件不会被处理。open_text 可以透明地读取压缩前后的文件。
+"""
+from loguru import logger
+import fnmatch
+import gzip
+import io
+import os
+import shutil
+import threading
+import time
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSED_SUFFIXES = ('.zst', '.gz')
+
+class RetentionPolicy:
+    """一个目录下匹配 patterns 的文件的保留策略
+
+    compress_after_days：修改时间早于该天数的文件压缩，None 表示不压缩
+    max_age_days：修改时间早于该天数的文件删除，None 表示不按时间删除
+    max_total_mb：匹配文件的总大小上限，None 表示不限制
+    """
+
+    def __init__(self, directory, patterns, compress_after_days=1, max_age_days=None, max_total_mb=None):
+        self.directory = directory
+        self.patterns = patterns
+        self.compress_after_days = compress_after_days
+        self.max_age_days = max_age_days
+        self.max_total_mb = max_total_mb
+
+    def matches(self, name):
+        for suffix in COMPRESSED_SUFFIXES:
+            if name.endswith(suffix):
+                name = name[:-len(suffix)]
+                break
+        return any(fnmatch.fnmatch(name, pattern) for pattern in self.patterns)
+
+DEFAULT_POLICIES = [
+    RetentionPolicy("logs", ["wx_summary_*.log"], compress_after_days=1, max_age_days=30, max_total_mb=200),
+    RetentionPolicy(os.path.join("logs", "metrics"), ["jobs_*.jsonl"], compress_after_days=1, max_age_days=90),
+    RetentionPolicy("logs", ["profile_*.folded", "alloc_*.txt"], compress_after_days=1, max_age_days=30),
+    # 聊天记录可能在第二天补写前一天的消息，晚一天再压缩
+    RetentionPolicy("transcripts", ["*.jsonl"], compress_after_days=2, max_age_days=180, max_total_mb=1024),
+]
+
+def compressed_suffix():
+    return '.zst' if zstandard else '.gz'
+
+def _open_binary(path):
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError(f"读取 {path} 需要安装 zstandard（pip install -r requirements.txt）")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'))
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    return open(path, 'rb')
+
+def compress_file(path):
+    """压缩文件并删除原文件，保留修改时间，返回压缩后的路径
+
+    已有同名的压缩文件时（压缩后又补写了内容），合并为一个压缩文件
+    """
+    target = path + compressed_suffix()
+    tmp_path = target + ".tmp"
+    existing = [path + suffix for suffix in COMPRESSED_SUFFIXES if os.path.exists(path + suffix)]
+    with open(tmp_path, 'wb') as dst:
+        if zstandard:
+            writer = zstandard.ZstdCompressor(level=10).stream_writer(dst, closefd=False)
+        else:
+            writer = gzip.GzipFile(fileobj=dst, mode='wb', mtime=0)
+        with writer:
+            for source in existing + [path]:
+                with _open_binary(source) as src:
+                    shutil.copyfileobj(src, writer, 1024 * 1024)
+    stat = os.stat(path)
+    os.utime(tmp_path, (stat.st_atime, stat.st_mtime))
+    os.replace(tmp_path, target)
+    for source in existing + [path]:
+        if source != target:
+            os.remove(source)
+    return target
+
+def open_text(path, encoding='utf-8'):
+    """以文本方式流式读取文件，.zst 和 .gz 文件自动解压"""
+    return io.TextIOWrapper(_open_binary(path), encoding=encoding)
+
+def apply_policy(policy, now=None):
+    """执行一个保留策略，返回 (压缩数, 删除数)"""
+    if not os.path.isdir(policy.directory):
+        return 0, 0
+    now = now or time.time()
+    compressed = deleted = 0
+    files = []
+    for name in os.listdir(policy.directory):
+        path = os.path.join(policy.directory, name)
+        if not policy.matches(name) or not os.path.isfile(path):
+            continue
+        age_days = (now - os.path.getmtime(path)) / 86400
+        if policy.max_age_days is not None and age_days > policy.max_age_days:
+            os.remove(path)
+            deleted += 1
+            continue
+        if (policy.compress_after_days is not None and age_days > policy.compress_after_days
+                and not name.endswith(COMPRESSED_SUFFIXES)):
+            try:
+                path = compress_file(path)
+                compressed += 1
+            except (OSError, RuntimeError) as e:
+                logger.error(f"压缩文件失败 {path}: {e}")
+                continue
+        files.append(path)
+
+    if policy.max_total_mb is not None:
+        limit = policy.max_total_mb * 1024 * 1024
+        # 合并压缩时可能已删除列表中较早出现的压缩文件
+        files = sorted({path for path in files if os.path.exists(path)}, key=os.path.getmtime)
+        total = sum(os.path.getsize(path) for path in files)
+        # 最新的文件始终保留
+        for path in files[:-1]:
+            if total <= limit:
+                break
+            total -= os.path.getsize(path)
+            os.remove(path)
+            deleted += 1
+    return compressed, deleted
+
+def run_retention(policies=None):
+    """执行全部保留策略，返回 (压缩数, 删除数)"""
+    compressed = deleted = 0
+    for policy in policies or DEFAULT_POLICIES:
+        try:
+            c, d = apply_policy(policy)
+        except Exception as e:
+            logger.error(f"清理 {policy.directory} 失败: {e}")
+            continue
+        compressed += c
+        deleted += d
+    if compressed or deleted:
+        logger.info(f"存储清理完成：压缩 {compressed} 个文件，删除 {deleted} 个文件")
+    return compressed, deleted
+
+def start_background(interval=6 * 3600, policies=None):
+    """在后台线程中立即执行一次清理，之后每隔 interval 秒执行一次"""
+    def loop():
+        while True:
+            run_retention(policies)
+            time.sleep(interval)
+
+    thread = threading.Thread(target=loop, name="retention", daemon=True)
+    thread.start()
+    return thread
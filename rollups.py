@@ -0,0 +1,316 @@
+"""按小时、天、周逐级汇总的群聊总结
+
+    小时汇总：读取 transcripts/ 中该小时的聊天记录调用AI服务总结；聊天记录很短时直接使用原文
+    天汇总：合并当天各小时的汇总
+    周汇总（周一至周日）：合并各天的汇总
+已结束时间段的汇总保存在总结存档的 rollups 表中，之后的请求直接复用；
+聊天记录或下一级汇总有变化（例如之后又补充获取了这段时间的消息）时重新生成。
+"最近 24 小时"、"本周"等请求按整点对齐后拆分为尽量大的时间段，只把这些汇总交给AI服务合并，
+不再重新阅读全部聊天记录。
+"""
+from loguru import logger
+import datetime
+import hashlib
+
+from summary_archive import get_archive
+from transcript_store import TRANSCRIPT_DIR, entry_to_record, read_transcript
+from wechat_summary import (build_transcript, estimate_tokens, fetch_group_messages, prepare_records,
+                            summarize_messages, transcript_writer)
+
+LEVELS = {
+    'hour': datetime.timedelta(hours=1),
+    'day': datetime.timedelta(days=1),
+    'week': datetime.timedelta(weeks=1),
+}
+CHILD_LEVEL = {'day': 'hour', 'week': 'day'}
+
+# 可直接请求的时间范围
+PERIODS = {
+    '24h': "最近 24 小时",
+    'today': "今天",
+    'week': "本周",
+    '7d': "最近 7 天",
+}
+
+# 不超过该 token 数的小时直接使用聊天记录原文，不调用AI服务
+RAW_TOKENS = 400
+# 同步消息时与已存档的最后一条消息重叠的时间
+SYNC_OVERLAP = datetime.timedelta(minutes=5)
+# 一次请求最多调用AI服务的次数；没有预先生成汇总时，"本周"可能需要为每个小时各调用一次
+MAX_COLD_CALLS = 60
+
+HOUR_PROMPT = '''请总结以下一小时内的微信群聊天记录：按话题列出要点，包括讨论内容、主要参与者、结论和待办事项，不超过 300 字。以下是微信群聊天记录：'''
+MERGE_PROMPT = '''以下是同一个微信群按时间顺序排列的分段总结，请合并为一份总结：相同话题合并在一起，保留重要提醒、结论和待办事项，注明讨论时间，不超过 600 字。'''
+SECTIONS_NOTE = "【说明】以下内容是按时间顺序排列的分段总结（消息很少的时段为聊天记录原文），不是完整的聊天记录"
+
+WEEKDAYS = "一二三四五六日"
+
+def period_range(period, now=None):
+    """返回 PERIODS 中时间范围的 (开始, 结束)"""
+    now = now or datetime.datetime.now()
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if period == '24h':
+        return now - datetime.timedelta(hours=24), now
+    if period == 'today':
+        return today, now
+    if period == 'week':
+        return today - datetime.timedelta(days=today.weekday()), now
+    if period == '7d':
+        return now - datetime.timedelta(days=7), now
+    raise ValueError(f"不支持的时间范围：{period}，可选 {', '.join(PERIODS)}")
+
+def period_label(level, start):
+    if level == 'hour':
+        return f"{start:%m-%d %H:00}-{start + LEVELS['hour']:%H:00}"
+    if level == 'day':
+        return f"{start:%m-%d}（周{WEEKDAYS[start.weekday()]}）"
+    return f"{start:%m-%d} 至 {start + LEVELS['week'] - LEVELS['day']:%m-%d}"
+
+def _digest(*parts):
+    return hashlib.sha1("\x00".join(parts).encode('utf-8')).hexdigest()[:16]
+
+def _section_records(sections):
+    """[(级别, 开始时间, 内容)] 转换为提交给AI服务的记录，每段前标注时间"""
+    return [('sys', f"【{period_label(level, start)}】\n{content}") for level, start, content in sections]
+
+class RollupBuilder:
+    """为一个群聊生成和复用各级汇总；control 为 JobControl，用于取消和进度报告"""
+
+    def __init__(self, group_name, ai_config, control=None, archive=None, transcript_dir=TRANSCRIPT_DIR, now=None):
+        self.group_name = group_name
+        self.ai_config = ai_config
+        self.model = ai_config.get('model', 'qwen-plus')
+        self.control = control
+        self.archive = archive or get_archive()
+        self.transcript_dir = transcript_dir
+        self.now = now or datetime.datetime.now()
+        self.days = {}
+        self.generated = 0
+        self.reused = 0
+        # estimate() 估计的调用次数，用于进度报告
+        self.planned = None
+
+    def _hour_records(self, start):
+        day = start.date()
+        if day not in self.days:
+            self.days[day] = self._load_day(day)
+        return self.days[day].get(start, [])
+
+    def _load_day(self, day):
+        """读取一天的聊天记录，按小时分组；没有时间的条目归入下一条有时间的条目所在的小时"""
+        by_hour = {}
+        pending = []
+        hour = None
+        for entry in read_transcript(self.group_name, day, self.transcript_dir):
+            if not entry.get('time'):
+                pending.append(entry_to_record(entry))
+                continue
+            hour = datetime.datetime.fromisoformat(entry['time']).replace(minute=0)
+            records = by_hour.setdefault(hour, [])
+            records.extend(pending)
+            pending = []
+            records.append(entry_to_record(entry))
+        if pending and hour is not None:
+            by_hour[hour].extend(pending)
+        return by_hour
+
+    def build(self, level, start):
+        """返回 (汇总内容, 消息数)，该时间段没有消息时返回 (None, 0)
+
+        已结束的时间段保存到存档，内容没有变化时直接复用
+        """
+        if level == 'hour':
+            records = self._hour_records(start)
+            messages = sum(1 for record in records if record[0] != 'time')
+            if not messages:
+                return None, 0
+            text = build_transcript(records)
+            source = _digest(HOUR_PROMPT, text)
+        else:
+            child_level = CHILD_LEVEL[level]
+            sections = []
+            messages = 0
+            child = start
+            while child < start + LEVELS[level] and child < self.now:
+                if self.control:
+                    self.control.check()
+                    self.control.report('rollup', state='child', level=child_level,
+                                        label=period_label(child_level, child), generated=self.generated,
+                                        planned=self.planned)
+                content, count = self.build(child_level, child)
+                if content:
+                    sections.append((child_level, child, content))
+                    messages += count
+                child += LEVELS[child_level]
+            if not sections:
+                return None, 0
+            records = _section_records(sections)
+            source = _digest(MERGE_PROMPT, build_transcript(records))
+
+        complete = start + LEVELS[level] <= self.now
+        if complete:
+            cached = self.archive.get_rollup(self.group_name, level, start, self.model)
+            if cached and cached['source'] == source:
+                self.reused += 1
+                return cached['content'], messages
+
+        if level == 'hour' and estimate_tokens(text) <= RAW_TOKENS:
+            content = text
+        else:
+            content = self._summarize(level, start, records)
+        if complete:
+            self.archive.put_rollup(self.group_name, level, start, self.model, source, content, messages)
+        return content, messages
+
+    def _summarize(self, level, start, records):
+        if self.control:
+            self.control.check()
+            self.control.report('rollup', state='generate', level=level, label=period_label(level, start),
+                                generated=self.generated, planned=self.planned)
+        self.generated += 1
+        if level == 'hour':
+            # 消息特别多的小时按模型上下文采样
+            records = prepare_records(records, self.ai_config, prompt=HOUR_PROMPT)
+            return summarize_messages(records, self.ai_config, HOUR_PROMPT)
+        return summarize_messages(records, self.ai_config, MERGE_PROMPT, header=SECTIONS_NOTE)
+
+    def _estimate(self, level, start):
+        """不调用AI服务，估计生成汇总还需要的调用次数，返回 (调用次数, 是否有消息)
+
+        已结束的天、周汇总在下一级都不需要重新生成且存档中已有时视为可以复用
+        """
+        complete = start + LEVELS[level] <= self.now
+        if level == 'hour':
+            records = self._hour_records(start)
+            if not any(record[0] != 'time' for record in records):
+                return 0, False
+            text = build_transcript(records)
+            if estimate_tokens(text) <= RAW_TOKENS:
+                return 0, True
+            if complete:
+                cached = self.archive.get_rollup(self.group_name, level, start, self.model)
+                if cached and cached['source'] == _digest(HOUR_PROMPT, text):
+                    return 0, True
+            return 1, True
+        child_level = CHILD_LEVEL[level]
+        calls = 0
+        has_messages = False
+        child = start
+        while child < start + LEVELS[level] and child < self.now:
+            child_calls, child_messages = self._estimate(child_level, child)
+            calls += child_calls
+            has_messages = has_messages or child_messages
+            child += LEVELS[child_level]
+        if not has_messages:
+            return 0, False
+        if calls or not complete or self.archive.get_rollup(self.group_name, level, start, self.model) is None:
+            calls += 1
+        return calls, True
+
+    def estimate(self, since, until=None):
+        """估计 cover(since, until) 需要调用AI服务的次数，同时用于之后的进度报告"""
+        self.planned = sum(self._estimate(level, start)[0] for level, start in self._periods(since, until))
+        return self.planned
+
+    def _periods(self, since, until):
+        """将 [since, until) 按整点对齐后拆分为尽量大的时间段，依次返回 (级别, 开始时间)"""
+        until = min(until or self.now, self.now)
+        start = since.replace(minute=0, second=0, microsecond=0)
+        while start < until:
+            if start.hour == 0 and start.weekday() == 0 and start + LEVELS['week'] <= until:
+                level = 'week'
+            elif start.hour == 0 and start + LEVELS['day'] <= until:
+                level = 'day'
+            else:
+                level = 'hour'
+            yield level, start
+            start += LEVELS[level]
+
+    def cover(self, since, until=None):
+        """将 [since, until) 按整点对齐后拆分为尽量大的时间段，返回有消息的 [(级别, 开始时间, 内容, 消息数)]"""
+        sections = []
+        for level, start in self._periods(since, until):
+            if self.control:
+                self.control.check()
+            content, messages = self.build(level, start)
+            if content:
+                sections.append((level, start, content, messages))
+        return sections
+
+def _latest_entry_time(group_name, day, transcript_dir=TRANSCRIPT_DIR):
+    times = [entry['time'] for entry in read_transcript(group_name, day, transcript_dir) if entry.get('time')]
+    return datetime.datetime.fromisoformat(max(times)) if times else None
+
+def sync_transcript(group_name, since, wx=None, load_interval=2, control=None):
+    """获取已存档的最后一条消息之后（不早于 since）的当天消息，写入聊天记录存档"""
+    now = datetime.datetime.now()
+    start = max(since, now.replace(hour=0, minute=0, second=0, microsecond=0))
+    latest = _latest_entry_time(group_name, now.date())
+    if latest:
+        start = max(start, latest - SYNC_OVERLAP)
+    records = fetch_group_messages(group_name, (now - start).total_seconds() / 3600, wx=wx,
+                                   load_interval=load_interval, control=control)
+    transcript_writer.flush()
+    return records
+
+def _plan(builder, since, until, control, max_calls):
+    """估计需要调用AI服务的次数并报告；超过 max_calls（不为 None 时）时抛出 RuntimeError"""
+    calls = builder.estimate(since, until)
+    if control:
+        control.report('rollup', state='plan', calls=calls)
+    if calls > MAX_COLD_CALLS:
+        logger.warning(f"群聊 {builder.group_name} 需要调用AI服务约 {calls} 次生成汇总")
+    if max_calls is not None and calls > max_calls:
+        raise RuntimeError(f"需要调用AI服务约 {calls} 次生成汇总，超过上限 {max_calls} 次；"
+                           f"可以先运行 rollup --precompute 生成汇总，或调大 --max-calls")
+    return calls
+
+def summarize_range(group_name, ai_config, since, until=None, prompt=None, control=None, sync=True, wx=None,
+                    load_interval=2, max_calls=MAX_COLD_CALLS):
+    """用各级汇总生成 [since, until) 的总结，返回 (总结, 统计)；没有消息时总结为 None
+
+    sync 为 True 时先获取当天的新消息；统计包含 sections、messages、generated（新生成的汇总数）和 reused。
+    需要新生成的汇总超过 max_calls 段时不调用AI服务，抛出 RuntimeError；max_calls 为 None 时不限制
+    """
+    if sync:
+        sync_transcript(group_name, since, wx=wx, load_interval=load_interval, control=control)
+    builder = RollupBuilder(group_name, ai_config, control=control)
+    _plan(builder, since, until, control, max_calls)
+    sections = builder.cover(since, until)
+    stats = {
+        'sections': len(sections),
+        'messages': sum(section[3] for section in sections),
+        'generated': builder.generated,
+        'reused': builder.reused,
+    }
+    logger.info(f"群聊 {group_name} 的汇总：{stats['sections']} 段，{stats['messages']} 条消息，"
+                f"新生成 {stats['generated']} 段，复用 {stats['reused']} 段")
+    if not sections:
+        return None, stats
+    records = _section_records([(level, start, content) for level, start, content, _ in sections])
+    summary = summarize_messages(records, ai_config, prompt, control=control, header=SECTIONS_NOTE)
+    return summary, stats
+
+def precompute(group_name, ai_config, days=1, control=None, sync=True, wx=None, load_interval=2):
+    """生成最近 days 天内已结束的各小时、各天汇总（以及已结束的周汇总），供之后的请求复用
+
+    返回 (新生成的汇总数, 复用的汇总数)
+    """
+    now = datetime.datetime.now()
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if sync:
+        sync_transcript(group_name, today, wx=wx, load_interval=load_interval, control=control)
+    builder = RollupBuilder(group_name, ai_config, control=control, now=now)
+    # 预先生成通常在后台运行，只提示调用次数，不限制
+    _plan(builder, today - datetime.timedelta(days=days), now, control, None)
+    for offset in range(days, 0, -1):
+        day = today - datetime.timedelta(days=offset)
+        builder.build('day', day)
+        if day.weekday() == 6:
+            builder.build('week', day - datetime.timedelta(days=6))
+    # 当天已结束的小时
+    hour = today
+    while hour + LEVELS['hour'] <= now:
+        builder.build('hour', hour)
+        hour += LEVELS['hour']
+    return builder.generated, builder.reused
@@ -0,0 +1,273 @@
+from loguru import logger
+from concurrent.futures import ThreadPoolExecutor
+import datetime
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+
+SCHEDULE_PATH = os.path.join("config", "schedule.json")
+JOB_DB_PATH = os.path.join("config", "job_queue.db")
+
+class CronSchedule:
+    """五段式 cron 表达式：分 时 日 月 周，支持 *、列表、范围和步长"""
+
+    FIELD_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+    def __init__(self, expr):
+        self.expr = expr
+        fields = expr.split()
+        if len(fields) != 5:
+            raise ValueError(f"cron 表达式必须包含5个字段：{expr}")
+        self.minutes, self.hours, self.days, self.months, self.weekdays = [
+            self._parse_field(field, low, high)
+            for field, (low, high) in zip(fields, self.FIELD_RANGES)
+        ]
+        # 周字段中 7 同样表示周日
+        if 7 in self.weekdays:
+            self.weekdays = (self.weekdays - {7}) | {0}
+        # 与 Vixie cron 一致：以 * 开头（如 */2）视为不限制，日和周此时需同时满足
+        self.any_day = fields[2].startswith('*')
+        self.any_weekday = fields[4].startswith('*')
+
+    @staticmethod
+    def _parse_field(field, low, high):
+        values = set()
+        for part in field.split(','):
+            step = 1
+            if '/' in part:
+                part, step_str = part.split('/', 1)
+                step = int(step_str)
+                if step <= 0:
+                    raise ValueError(f"cron 步长必须为正数：{field}")
+            if part == '*':
+                start, end = low, high
+            elif '-' in part:
+                start_str, end_str = part.split('-', 1)
+                start, end = int(start_str), int(end_str)
+            else:
+                start = int(part)
+                end = high if step > 1 else start
+            if start < low or end > high or start > end:
+                raise ValueError(f"cron 字段超出范围：{field}")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, dt):
+        day_ok = dt.day in self.days
+        # cron 中 0 表示周日，Python 的 weekday() 以周一为 0
+        weekday_ok = (dt.weekday() + 1) % 7 in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok
+
+    def next_after(self, dt):
+        """返回严格晚于 dt 的下一次触发时间"""
+        dt = dt.replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+        limit = dt + datetime.timedelta(days=366 * 5)
+        while dt <= limit:
+            if dt.month not in self.months or not self._day_matches(dt):
+                dt = dt.replace(hour=0, minute=0) + datetime.timedelta(days=1)
+                continue
+            if dt.hour not in self.hours:
+                dt = dt.replace(minute=0) + datetime.timedelta(hours=1)
+                continue
+            if dt.minute not in self.minutes:
+                dt += datetime.timedelta(minutes=1)
+                continue
+            return dt
+        raise ValueError(f"cron 表达式没有可触发的时间：{self.expr}")
+
+class JobQueue:
+    """基于 SQLite 的持久化任务队列，进程重启后未完成的任务会继续执行"""
+
+    def __init__(self, db_path=JOB_DB_PATH):
+        db_dir = os.path.dirname(db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        with self.lock, self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    run_at REAL NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    finished_at REAL
+                )
+            """)
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_due ON jobs (status, run_at)")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS schedule_state (
+                    name TEXT PRIMARY KEY,
+                    next_run REAL NOT NULL
+                )
+            """)
+            # 上次异常退出时仍在运行的任务重新排队
+            self.conn.execute("UPDATE jobs SET status = 'pending' WHERE status = 'running'")
+
+    def enqueue(self, name, payload, run_at):
+        with self.lock, self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO jobs (name, payload, run_at, created_at) VALUES (?, ?, ?, ?)",
+                (name, json.dumps(payload, ensure_ascii=False), run_at, time.time())
+            )
+            return cursor.lastrowid
+
+    def claim_due(self, limit, now=None):
+        """取出到期的待执行任务并标记为运行中"""
+        if limit <= 0:
+            return []
+        now = time.time() if now is None else now
+        with self.lock, self.conn:
+            rows = self.conn.execute(
+                "SELECT * FROM jobs WHERE status = 'pending' AND run_at <= ? ORDER BY run_at LIMIT ?",
+                (now, limit)
+            ).fetchall()
+            for row in rows:
+                self.conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1 WHERE id = ?",
+                    (row['id'],)
+                )
+        return [dict(row, payload=json.loads(row['payload']), attempts=row['attempts'] + 1) for row in rows]
+
+    def finish(self, job_id, error=None, retry_at=None):
+        """标记任务完成；失败且给出 retry_at 时重新排队"""
+        with self.lock, self.conn:
+            if error is None:
+                self.conn.execute(
+                    "UPDATE jobs SET status = 'done', error = NULL, finished_at = ? WHERE id = ?",
+                    (time.time(), job_id)
+                )
+            elif retry_at is not None:
+                self.conn.execute(
+                    "UPDATE jobs SET status = 'pending', error = ?, run_at = ? WHERE id = ?",
+                    (error, retry_at, job_id)
+                )
+            else:
+                self.conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, finished_at = ? WHERE id = ?",
+                    (error, time.time(), job_id)
+                )
+
+    def has_active(self, name):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT 1 FROM jobs WHERE name = ? AND status IN ('pending', 'running') LIMIT 1",
+                (name,)
+            ).fetchone()
+        return row is not None
+
+    def get_next_run(self, name):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT next_run FROM schedule_state WHERE name = ?", (name,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_next_run(self, name, next_run):
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO schedule_state (name, next_run) VALUES (?, ?)",
+                (name, next_run)
+            )
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+def load_schedule(path=SCHEDULE_PATH):
+    """读取定时任务配置
+
+    示例：{"max_concurrent": 2, "jitter_seconds": 60, "jobs": [
+        {"group": "群名", "cron": "0 18 * * 1-5", "hours": 8, "service": "DeepSeek", "prompt": "默认提示词", "send": true}
+    ]}
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+class Scheduler:
+    """按 cron 定时为各群聊生成总结的调度器"""
+
+    def __init__(self, schedule, run_job, queue=None, max_concurrent=None, jitter_seconds=None,
+                 max_attempts=3, retry_delay=300):
+        self.entries = []
+        for entry in schedule.get('jobs', []):
+            name = entry.get('name') or f"{entry['group']}|{entry['cron']}"
+            self.entries.append((name, CronSchedule(entry['cron']), entry))
+        self.run_job = run_job
+        self.queue = queue or JobQueue()
+        self.max_concurrent = max_concurrent or schedule.get('max_concurrent', 2)
+        self.jitter_seconds = schedule.get('jitter_seconds', 60) if jitter_seconds is None else jitter_seconds
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.running = 0
+        self.running_lock = threading.Lock()
+        self.stop_event = threading.Event()
+
+    def enqueue_due(self, now=None):
+        """将到期的定时任务加入队列（附加随机抖动），返回新增任务数"""
+        now = datetime.datetime.now() if now is None else now
+        added = 0
+        for name, cron, entry in self.entries:
+            next_run = self.queue.get_next_run(name)
+            if next_run is None:
+                self.queue.set_next_run(name, cron.next_after(now).timestamp())
+                continue
+            if next_run > now.timestamp():
+                continue
+            # 停机期间错过的多次触发只补跑一次；上一轮尚未完成时不再重复排队
+            if not self.queue.has_active(name):
+                run_at = max(next_run, now.timestamp()) + random.uniform(0, self.jitter_seconds)
+                job_id = self.queue.enqueue(name, entry, run_at)
+                logger.info(f"定时任务 {name} 已加入队列 #{job_id}")
+                added += 1
+            self.queue.set_next_run(name, cron.next_after(now).timestamp())
+        return added
+
+    def _execute(self, job):
+        try:
+            self.run_job(job['payload'])
+            self.queue.finish(job['id'])
+            logger.info(f"任务 #{job['id']} {job['name']} 执行完成")
+        except Exception as e:
+            if job['attempts'] < self.max_attempts:
+                retry_at = time.time() + self.retry_delay * job['attempts']
+                self.queue.finish(job['id'], error=str(e), retry_at=retry_at)
+                logger.error(f"任务 #{job['id']} 执行失败，稍后重试 ({job['attempts']}/{self.max_attempts}): {e}")
+            else:
+                self.queue.finish(job['id'], error=str(e))
+                logger.error(f"任务 #{job['id']} 执行失败，已放弃: {e}")
+        finally:
+            with self.running_lock:
+                self.running -= 1
+
+    def dispatch(self, executor):
+        """在并发上限内提交到期任务"""
+        with self.running_lock:
+            free_slots = self.max_concurrent - self.running
+        for job in self.queue.claim_due(free_slots):
+            with self.running_lock:
+                self.running += 1
+            executor.submit(self._execute, job)
+
+    def run_forever(self, poll_interval=5):
+        logger.info(f"调度器启动，共 {len(self.entries)} 个定时任务，并发上限 {self.max_concurrent}")
+        with ThreadPoolExecutor(max_workers=self.max_concurrent, thread_name_prefix="schedule") as executor:
+            while not self.stop_event.is_set():
+                self.enqueue_due()
+                self.dispatch(executor)
+                self.stop_event.wait(poll_interval)
+        self.queue.close()
+        logger.info("调度器已停止")
+
+    def stop(self):
+        self.stop_event.set()
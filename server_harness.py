@@ -0,0 +1,96 @@
+"""本地 HTTP 接口的端到端检查：使用假消息源和假 OpenAI 服务，无需微信客户端和网络
+
+用法：python server_harness.py
+"""
+from urllib.request import Request, urlopen
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import sys
+import tempfile
+
+from fake_openai_server import FakeOpenAIServer, DEFAULT_REPLY
+from fake_wechat import FakeWeChat
+from summary_server import SummaryServer, JobManager
+
+def request_json(url, data=None):
+    body = json.dumps(data).encode('utf-8') if data is not None else None
+    req = Request(url, data=body, headers={'Content-Type': 'application/json'})
+    with urlopen(req, timeout=30) as resp:
+        return resp.status, json.loads(resp.read())
+
+def read_events(url):
+    """读取 SSE 流，返回 [(事件名, 数据), ...]"""
+    events = []
+    event = None
+    with urlopen(url, timeout=30) as resp:
+        for raw in resp:
+            line = raw.decode('utf-8').rstrip('\n')
+            if line.startswith('event: '):
+                event = line[len('event: '):]
+            elif line.startswith('data: '):
+                events.append((event, json.loads(line[len('data: '):])))
+    return events
+
+def run_harness():
+    # 总结文件写入临时目录，避免污染工作目录
+    os.chdir(tempfile.mkdtemp(prefix="wechat_summary_harness_"))
+
+    fake_openai = FakeOpenAIServer(chunk_size=4)
+    base_url = fake_openai.start()
+    manager = JobManager(
+        service_loader=lambda service: {'api_key': 'fake', 'base_url': base_url, 'model': 'fake-model'},
+        prompt_loader=lambda name: None,
+        wechat_factory=FakeWeChat,
+        load_interval=0,
+    )
+    server = SummaryServer(port=0, manager=manager)
+    server_url = server.start()
+
+    # 同一群聊和时间范围的并发提交应合并为一个任务
+    job_request = {'group': '测试群', 'hours': 1}
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        responses = list(executor.map(
+            lambda _: request_json(f"{server_url}/jobs", job_request), range(3)
+        ))
+    job_ids = {data['id'] for _, data in responses}
+    assert len(job_ids) == 1, f"重复提交未合并: {responses}"
+    assert sum(1 for _, data in responses if data['coalesced']) == 2, responses
+    job_id = job_ids.pop()
+
+    events = read_events(f"{server_url}/jobs/{job_id}/events")
+    streamed = "".join(data['text'] for event, data in events if event == 'delta')
+    final_event, final = events[-1]
+    assert final_event == 'done', f"任务失败: {final}"
+    assert final['summary'] == DEFAULT_REPLY, final
+    assert streamed == DEFAULT_REPLY, f"流式输出不完整: {streamed!r}"
+
+    _, status = request_json(f"{server_url}/jobs/{job_id}")
+    assert status['status'] == 'done' and status['file'], status
+    assert len(fake_openai.requests) == 1, f"AI服务被调用了 {len(fake_openai.requests)} 次"
+
+    _, listing = request_json(f"{server_url}/summaries?group={quote(job_request['group'])}")
+    assert [os.path.basename(s['file']) for s in listing['summaries']] == [status['file']], listing
+    _, stored = request_json(f"{server_url}/summaries/{quote(status['file'])}")
+    assert stored['content'].endswith(DEFAULT_REPLY), stored
+    _, archived = request_json(f"{server_url}/summaries/{listing['summaries'][0]['id']}")
+    assert archived['content'] == DEFAULT_REPLY and archived['model'] == 'fake-model', archived
+    _, found = request_json(f"{server_url}/summaries?q={quote('待跟进')}")
+    assert [s['id'] for s in found['summaries']] == [archived['id']], found
+
+    # 任务结束后再次提交应创建新任务
+    _, again = request_json(f"{server_url}/jobs", job_request)
+    assert again['id'] != job_id and not again['coalesced'], again
+
+    server.shutdown()
+    manager.shutdown()
+    fake_openai.shutdown()
+    print(f"检查通过：任务 #{job_id} 合并了 3 次提交，流式输出 {len(streamed)} 字")
+
+if __name__ == "__main__":
+    try:
+        run_harness()
+    except AssertionError as e:
+        print(f"检查失败：{e}")
+        sys.exit(1)
@@ -0,0 +1,83 @@
+from concurrent.futures import Future, TimeoutError
+import asyncio
+import threading
+
+class SingleFlight:
+    """合并相同 key 的并发调用：同一时间只执行一次，其余调用者等待并共享结果"""
+
+    def __init__(self, cancelled=None):
+        # 领头的协程被取消时交给等待者的异常类型；为 None 时原样传递 CancelledError
+        self.cancelled = cancelled
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def do(self, key, fn, *args, on_wait=None, **kwargs):
+        """执行 fn(*args, **kwargs)；相同 key 的调用正在进行时直接等待其结果
+
+        返回 (结果, 是否共享了其他调用的结果)；执行出错时所有等待者都会收到同一个异常。
+        on_wait 在等待期间定期调用，抛出异常即可放弃等待（不影响正在执行的调用）
+        """
+        with self.lock:
+            future = self.calls.get(key)
+            shared = future is not None
+            if not shared:
+                future = Future()
+                self.calls[key] = future
+        if shared:
+            while True:
+                try:
+                    return future.result(timeout=0.2 if on_wait else None), True
+                except TimeoutError:
+                    on_wait()
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self.lock:
+                del self.calls[key]
+
+    async def do_async(self, key, fn, *args, on_wait=None, **kwargs):
+        """do 的协程版本：fn 为协程函数，等待其他调用者时不阻塞事件循环
+
+        与 do 共用同一组正在进行的调用，同步和异步的调用者之间同样会合并
+        """
+        with self.lock:
+            future = self.calls.get(key)
+            shared = future is not None
+            if not shared:
+                future = Future()
+                self.calls[key] = future
+        if shared:
+            waiter = asyncio.wrap_future(future)
+            while True:
+                # asyncio.wait 超时不会取消 waiter，也就不会影响正在执行的调用
+                done, _ = await asyncio.wait({waiter}, timeout=0.2 if on_wait else None)
+                if done:
+                    return waiter.result(), True
+                on_wait()
+
+        try:
+            result = await fn(*args, **kwargs)
+        except asyncio.CancelledError as e:
+            # 取消的只是领头的协程；CancelledError 传给等待者会被当作它们自己被取消
+            future.set_exception(self.cancelled() if self.cancelled else e)
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self.lock:
+                del self.calls[key]
+
+    def in_flight(self, key):
+        with self.lock:
+            return key in self.calls
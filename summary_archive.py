@@ -0,0 +1,236 @@
+"""总结存档：SQLite 全文索引
+
+每条总结连同群聊、时间、模型、token 数等信息保存在 summary/archive.db 中，
+正文使用 FTS5 的 trigram 分词建立索引，中文可直接按子串搜索。
+首次创建存档时会导入 summary/ 下已有的总结文本文件。
+rollups 表保存按小时、天、周逐级汇总的总结（见 rollups 模块），不出现在搜索结果中。
+"""
+import datetime
+import json
+import os
+import re
+import sqlite3
+import threading
+
+ARCHIVE_PATH = os.path.join("summary", "archive.db")
+
+# trigram 分词只能索引不少于 3 个字符的词，更短的关键词改用 LIKE 匹配
+MIN_FTS_TERM = 3
+
+def _parse_text_file(path):
+    """解析 save_summary 写出的文本文件，返回 (群聊名称, 时间, 正文)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    lines = text.split("\n", 3)
+    if len(lines) < 4 or not lines[0].startswith("群聊：") or not lines[1].startswith("时间："):
+        return None
+    try:
+        created_at = datetime.datetime.strptime(lines[1][len("时间："):].strip(), '%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        return None
+    return lines[0][len("群聊："):].strip(), created_at, lines[3]
+
+def _escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+class SummaryArchive:
+    """总结存档，可在多个线程中共用"""
+
+    def __init__(self, db_path=ARCHIVE_PATH, import_dir=None):
+        db_dir = os.path.dirname(db_path)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        with self.lock, self.conn:
+            created = self.conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'summaries'"
+            ).fetchone() is None
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS summaries (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    group_name TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    model TEXT,
+                    prompt_tokens INTEGER,
+                    completion_tokens INTEGER,
+                    messages INTEGER,
+                    file TEXT,
+                    meta TEXT,
+                    content TEXT NOT NULL
+                )
+            """)
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_summaries_group ON summaries (group_name, created_at)"
+            )
+            self.conn.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS summaries_fts USING fts5(
+                    content, content='summaries', content_rowid='id', tokenize='trigram'
+                )
+            """)
+            self.conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS summaries_ai AFTER INSERT ON summaries BEGIN
+                    INSERT INTO summaries_fts (rowid, content) VALUES (new.id, new.content);
+                END
+            """)
+            self.conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS summaries_ad AFTER DELETE ON summaries BEGIN
+                    INSERT INTO summaries_fts (summaries_fts, rowid, content) VALUES ('delete', old.id, old.content);
+                END
+            """)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS rollups (
+                    group_name TEXT NOT NULL,
+                    level TEXT NOT NULL,
+                    period_start TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    messages INTEGER,
+                    created_at TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    PRIMARY KEY (group_name, level, period_start, model)
+                )
+            """)
+        if created and import_dir:
+            self.import_text_files(import_dir)
+
+    def add(self, group_name, content, created_at=None, model=None, prompt_tokens=None, completion_tokens=None,
+            messages=None, file=None, meta=None):
+        """保存一条总结，返回编号"""
+        created_at = created_at or datetime.datetime.now()
+        with self.lock, self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO summaries (group_name, created_at, model, prompt_tokens, completion_tokens, messages, "
+                "file, meta, content) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (group_name, created_at.isoformat(timespec='seconds'), model, prompt_tokens, completion_tokens,
+                 messages, file, json.dumps(meta, ensure_ascii=False) if meta else None, content)
+            )
+            return cursor.lastrowid
+
+    def import_text_files(self, summary_dir):
+        """导入已有的总结文本文件，返回导入的数量"""
+        if not os.path.isdir(summary_dir):
+            return 0
+        rows = []
+        for name in sorted(os.listdir(summary_dir)):
+            path = os.path.join(summary_dir, name)
+            if not name.endswith('.txt') or not os.path.isfile(path):
+                continue
+            parsed = _parse_text_file(path)
+            if parsed:
+                group_name, created_at, content = parsed
+                rows.append((group_name, created_at.isoformat(timespec='seconds'), path, content))
+        rows.sort(key=lambda row: row[1])
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT INTO summaries (group_name, created_at, file, content) VALUES (?, ?, ?, ?)", rows
+            )
+        return len(rows)
+
+    def search(self, query=None, group_name=None, since=None, until=None, limit=20, before_id=None):
+        """按时间倒序搜索总结，返回不含正文的摘要列表
+
+        query 按空白分隔为多个关键词，全部匹配才返回；翻页时传入上一页最后一条的编号作为 before_id
+        """
+        terms = (query or "").split()
+        fts_terms = [term for term in terms if len(term) >= MIN_FTS_TERM]
+        like_terms = [term for term in terms if len(term) < MIN_FTS_TERM]
+
+        conditions = []
+        params = []
+        if fts_terms:
+            conditions.append("s.id IN (SELECT rowid FROM summaries_fts WHERE summaries_fts MATCH ?)")
+            params.append(" AND ".join('"' + term.replace('"', '""') + '"' for term in fts_terms))
+        for term in like_terms:
+            conditions.append("s.content LIKE ? ESCAPE '\\'")
+            params.append(f"%{_escape_like(term)}%")
+        if group_name:
+            conditions.append("s.group_name = ?")
+            params.append(group_name)
+        if since:
+            conditions.append("s.created_at >= ?")
+            params.append(since.isoformat(timespec='seconds'))
+        if until:
+            conditions.append("s.created_at < ?")
+            params.append(until.isoformat(timespec='seconds'))
+        if before_id:
+            conditions.append("s.id < ?")
+            params.append(before_id)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        # 摘要从第一个关键词之前不远处开始截取
+        snippet_params = [terms[0] if terms else ""]
+        params.append(limit)
+
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT s.id, s.group_name, s.created_at, s.model, s.prompt_tokens, s.completion_tokens, "
+                f"s.messages, s.file, max(1, instr(s.content, ?) - 20) AS snippet_start, "
+                f"substr(s.content, max(1, instr(s.content, ?) - 20), 80) AS snippet "
+                f"FROM summaries s {where} ORDER BY s.id DESC LIMIT ?",
+                snippet_params * 2 + params
+            ).fetchall()
+        results = []
+        for row in rows:
+            result = dict(row)
+            snippet = re.sub(r'\s+', ' ', result['snippet']).strip()
+            result['snippet'] = ("…" if result.pop('snippet_start') > 1 else "") + snippet
+            results.append(result)
+        return results
+
+    def get(self, summary_id):
+        """返回完整的总结记录，不存在时返回 None"""
+        with self.lock:
+            row = self.conn.execute("SELECT * FROM summaries WHERE id = ?", (summary_id,)).fetchone()
+        if row is None:
+            return None
+        result = dict(row)
+        result['meta'] = json.loads(result['meta']) if result['meta'] else {}
+        return result
+
+    def groups(self):
+        """返回存档中的群聊名称及总结数量"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT group_name, COUNT(*) AS count, MAX(created_at) AS latest FROM summaries "
+                "GROUP BY group_name ORDER BY latest DESC"
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_rollup(self, group_name, level, period_start, model):
+        """返回某个时间段的汇总总结，没有时返回 None"""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT * FROM rollups WHERE group_name = ? AND level = ? AND period_start = ? AND model = ?",
+                (group_name, level, period_start.isoformat(timespec='minutes'), model)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def put_rollup(self, group_name, level, period_start, model, source, content, messages=None):
+        """保存或替换某个时间段的汇总总结；source 为生成时所用内容的摘要，内容变化时需要重新生成"""
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO rollups (group_name, level, period_start, model, source, messages, "
+                "created_at, content) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (group_name, level, period_start.isoformat(timespec='minutes'), model, source, messages,
+                 datetime.datetime.now().isoformat(timespec='seconds'), content)
+            )
+
+    def delete(self, summary_id):
+        with self.lock, self.conn:
+            return self.conn.execute("DELETE FROM summaries WHERE id = ?", (summary_id,)).rowcount > 0
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+_archive = None
+_archive_lock = threading.Lock()
+
+def get_archive():
+    """返回进程内共用的存档，首次调用时打开"""
+    global _archive
+    with _archive_lock:
+        if _archive is None:
+            _archive = SummaryArchive(ARCHIVE_PATH, import_dir=os.path.dirname(ARCHIVE_PATH))
+        return _archive
@@ -0,0 +1,349 @@
+"""本地 HTTP 接口，供内部工具触发群聊总结（不依赖 PySide6）
+
+接口：
+    POST /jobs                      提交任务 {"group": 群名, "hours": 1, "service": 可选, "prompt": 可选, "send": false, "deadline": 可选秒数}
+    POST /jobs/<id>/cancel          取消任务
+    GET  /jobs/<id>                 查询任务状态
+    GET  /jobs/<id>/events          以 SSE 推送总结的流式输出
+    GET  /summaries?group=群名&q=关键词&limit=20&before=编号
+                                    按时间倒序搜索已保存的总结，翻页时 before 取上一页最后一条的编号
+    GET  /summaries/<编号>          获取存档中的总结内容和元数据
+    GET  /summaries/<文件名>        获取总结文本文件内容
+
+同一群聊、时间范围、提示词和模型的任务在执行期间重复提交时，会合并到正在执行的任务。
+"""
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, parse_qs, unquote
+import argparse
+import itertools
+import json
+import os
+import threading
+import time
+
+from config_store import load_service_config, load_prompt
+import retention
+from summary_archive import get_archive
+from job_metrics import new_timer
+from wechat_summary import (
+    get_wechat_messages, save_summary, send_summary, summary_key, JobControl, SummaryCancelled, SUMMARY_DIR, logger
+)
+
+class SummaryJob:
+    """一次总结任务的状态和流式输出"""
+
+    def __init__(self, job_id, group_name, hours, ai_config, prompt=None, send=False, deadline=None):
+        self.id = job_id
+        self.group_name = group_name
+        self.hours = hours
+        self.ai_config = ai_config
+        self.prompt = prompt
+        self.send = send
+        # 已决定是否发送；此后合并进来的发送请求不会再被执行
+        self.send_decided = False
+        self.control = JobControl(deadline=deadline, on_progress=self.set_progress,
+                                  timer=new_timer(group_name, "http"))
+        self.progress = None
+        self.status = 'queued'
+        self.chunks = []
+        self.summary = None
+        self.file = None
+        self.summary_id = None
+        self.error = None
+        self.subscribers = 1
+        self.created_at = time.time()
+        self.finished_at = None
+        self.condition = threading.Condition()
+
+    @property
+    def done(self):
+        return self.status in ('done', 'error', 'cancelled')
+
+    def set_status(self, status):
+        with self.condition:
+            self.status = status
+            self.condition.notify_all()
+
+    def set_progress(self, event):
+        self.progress = event
+
+    def add_delta(self, text):
+        with self.condition:
+            self.chunks.append(text)
+            self.condition.notify_all()
+
+    def finish(self, summary=None, file=None, summary_id=None, error=None, status=None):
+        with self.condition:
+            self.summary = summary
+            self.file = file
+            self.summary_id = summary_id
+            self.error = error
+            self.status = status or ('error' if error else 'done')
+            self.finished_at = time.time()
+            self.condition.notify_all()
+        self.control.finish(self.status)
+
+    def wait_events(self, offset, timeout=15):
+        """等待 offset 之后的新输出，返回 (新文本片段列表, 是否已结束)"""
+        with self.condition:
+            if len(self.chunks) <= offset and not self.done:
+                self.condition.wait(timeout)
+            return self.chunks[offset:], self.done
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'group': self.group_name,
+            'hours': self.hours,
+            'model': self.ai_config.get('model'),
+            'status': self.status,
+            'progress': self.progress,
+            'summary': self.summary if self.done else "".join(self.chunks),
+            'file': self.file,
+            'summary_id': self.summary_id,
+            'error': self.error,
+            'subscribers': self.subscribers,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+        }
+
+class JobManager:
+    """管理总结任务，合并相同群聊、时间范围、提示词和模型的并发请求"""
+
+    def __init__(self, service_loader=load_service_config, prompt_loader=load_prompt,
+                 wechat_factory=None, load_interval=2, max_workers=2, max_history=200):
+        self.service_loader = service_loader
+        self.prompt_loader = prompt_loader
+        self.wechat_factory = wechat_factory
+        self.load_interval = load_interval
+        self.max_history = max_history
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="summary-job")
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.jobs = {}
+        self.in_flight = {}
+
+    def submit(self, group_name, hours=1, service=None, prompt_name=None, send=False, deadline=None):
+        """提交任务，返回 (任务, 是否合并到已有任务)；服务或提示词不存在时抛出 ValueError"""
+        ai_config = self.service_loader(service)
+        prompt = self.prompt_loader(prompt_name)
+        key = summary_key(group_name, hours, prompt, ai_config)
+        with self.lock:
+            job = self.in_flight.get(key)
+            if job is not None and send and not job.send and job.send_decided:
+                # 已有任务已经过了发送步骤，另起任务完成发送
+                job = None
+            if job is not None:
+                job.subscribers += 1
+                job.send = job.send or send
+                return job, True
+            job = SummaryJob(str(next(self.ids)), group_name, float(hours), ai_config, prompt, send, deadline)
+            self.jobs[job.id] = job
+            self.in_flight[key] = job
+            self._trim_history()
+        self.executor.submit(self._run, key, job)
+        return job, False
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """取消任务，返回任务对象；任务不存在时返回 None"""
+        job = self.get(job_id)
+        if job is not None and not job.done:
+            job.control.cancel()
+        return job
+
+    def _trim_history(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.done]
+        for job_id in finished[:max(0, len(self.jobs) - self.max_history)]:
+            del self.jobs[job_id]
+
+    def _run(self, key, job):
+        try:
+            job.set_status('running')
+            wx = self.wechat_factory() if self.wechat_factory else None
+            summary = get_wechat_messages(
+                job.group_name, job.hours, job.ai_config, job.prompt,
+                on_delta=job.add_delta, wx=wx, load_interval=self.load_interval, control=job.control
+            )
+            if not summary:
+                job.finish(error="未获取到消息")
+                return
+            saved_file, summary_id = save_summary(job.group_name, summary, control=job.control)
+            with self.lock:
+                job.send_decided = True
+            if job.send:
+                job.set_status('sending')
+                if not send_summary(job.group_name, summary, wx=wx, control=job.control):
+                    raise RuntimeError("发送总结失败")
+            job.finish(summary=summary, file=os.path.basename(saved_file) if saved_file else None,
+                       summary_id=summary_id)
+        except SummaryCancelled:
+            job.finish(status='cancelled')
+        except Exception as e:
+            logger.error(f"任务 #{job.id} 执行失败: {e}")
+            job.finish(error=str(e))
+        finally:
+            with self.lock:
+                if self.in_flight.get(key) is job:
+                    del self.in_flight[key]
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+class SummaryRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logger.debug("HTTP " + format % args)
+
+    def _send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        parts = [unquote(p) for p in urlparse(self.path).path.strip('/').split('/') if p]
+        if len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'cancel':
+            job = self.server.manager.cancel(parts[1])
+            if job is None:
+                self._send_json(404, {'error': '任务不存在'})
+            else:
+                self._send_json(202, job.to_dict())
+            return
+        if parts != ['jobs']:
+            self._send_json(404, {'error': 'not found'})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            data = json.loads(self.rfile.read(length) or b'{}')
+            group_name = data['group']
+            hours = float(data.get('hours', 1))
+            deadline = float(data['deadline']) if data.get('deadline') else None
+        except (KeyError, ValueError, TypeError) as e:
+            self._send_json(400, {'error': f'请求参数错误: {e}'})
+            return
+        if not group_name or hours <= 0:
+            self._send_json(400, {'error': '请提供群聊名称和有效的时间范围'})
+            return
+
+        try:
+            job, coalesced = self.server.manager.submit(
+                group_name, hours, data.get('service'), data.get('prompt'), bool(data.get('send', False)),
+                deadline
+            )
+        except (ValueError, OSError) as e:
+            self._send_json(400, {'error': str(e)})
+            return
+        result = job.to_dict()
+        result['coalesced'] = coalesced
+        self._send_json(200 if coalesced else 202, result)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = [unquote(p) for p in url.path.strip('/').split('/') if p]
+
+        if len(parts) in (2, 3) and parts[0] == 'jobs':
+            job = self.server.manager.get(parts[1])
+            if job is None:
+                self._send_json(404, {'error': '任务不存在'})
+            elif len(parts) == 2:
+                self._send_json(200, job.to_dict())
+            elif parts[2] == 'events':
+                self._stream_events(job)
+            else:
+                self._send_json(404, {'error': 'not found'})
+        elif parts == ['summaries']:
+            query = parse_qs(url.query)
+            try:
+                limit = min(int(query.get('limit', [20])[0]), 200)
+                before = int(query['before'][0]) if query.get('before') else None
+            except ValueError as e:
+                self._send_json(400, {'error': f'请求参数错误: {e}'})
+                return
+            results = get_archive().search(
+                query.get('q', [None])[0], query.get('group', [None])[0], limit=limit, before_id=before
+            )
+            self._send_json(200, {'summaries': results})
+        elif len(parts) == 2 and parts[0] == 'summaries' and parts[1].isdigit():
+            record = get_archive().get(int(parts[1]))
+            if record is None:
+                self._send_json(404, {'error': '总结不存在'})
+            else:
+                self._send_json(200, record)
+        elif len(parts) == 2 and parts[0] == 'summaries':
+            path = os.path.join(SUMMARY_DIR, os.path.basename(parts[1]))
+            if not os.path.isfile(path):
+                self._send_json(404, {'error': '总结不存在'})
+                return
+            with open(path, 'r', encoding='utf-8') as f:
+                self._send_json(200, {'file': os.path.basename(path), 'content': f.read()})
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def _stream_events(self, job):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        offset = 0
+        try:
+            while True:
+                chunks, done = job.wait_events(offset)
+                for text in chunks:
+                    self._send_event('delta', {'text': text})
+                offset += len(chunks)
+                if done:
+                    self._send_event(job.status, job.to_dict())
+                    return
+                if not chunks:
+                    # 保持连接
+                    self.wfile.write(b": keep-alive\n\n")
+                    self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _send_event(self, event, data):
+        payload = json.dumps(data, ensure_ascii=False)
+        self.wfile.write(f"event: {event}\ndata: {payload}\n\n".encode('utf-8'))
+        self.wfile.flush()
+
+class SummaryServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=8600, manager=None):
+        super().__init__((host, port), SummaryRequestHandler)
+        self.manager = manager or JobManager()
+
+    def start(self):
+        """在后台线程中启动服务，返回服务地址"""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="微信群聊总结本地 HTTP 接口")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址，默认仅本机可访问")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--max-workers", type=int, default=2, help="同时执行的任务数")
+    args = parser.parse_args()
+
+    server = SummaryServer(args.host, args.port, JobManager(max_workers=args.max_workers))
+    retention.start_background()
+    print(f"服务已启动：http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.manager.shutdown()
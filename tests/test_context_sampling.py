@@ -0,0 +1,56 @@
+"""context_sampling 的测试：上下文长度查找和分层采样"""
+from collections import Counter
+
+from context_sampling import context_window, sample_records
+from wechat_summary import build_transcript, estimate_tokens
+
+def make_records(hours=8, per_hour=60):
+    records = []
+    for hour in range(hours):
+        records.append(('time', f"{hour + 9:02d}:00"))
+        for i in range(per_hour):
+            records.append(('friend', f"用户{i % 6}", f"第 {hour} 小时的第 {i} 条消息，讨论接口联调"))
+    return records
+
+def test_context_window_lookup():
+    assert context_window({'model': 'moonshot-v1-8k'}) == 8192
+    assert context_window({'model': 'moonshot-v1-8k', 'context_window': 4000}) == 4000
+    assert context_window({'model': '未知模型'}) == 32768
+
+def test_records_within_budget_are_unchanged():
+    records = make_records(1, 5)
+    selected, stats = sample_records(records, 10_000)
+    assert selected == records and stats['rate'] == 1.0
+
+def test_sample_fits_budget_and_keeps_order():
+    records = make_records()
+    selected, stats = sample_records(records, 2000)
+    assert estimate_tokens(build_transcript(selected)) <= 2000
+    positions = [records.index(record) for record in selected]
+    assert positions == sorted(positions)
+    assert stats['kept'] < stats['messages']
+
+def test_sample_covers_every_hour_and_sender():
+    records = make_records()
+    selected, _ = sample_records(records, 2000)
+    per_hour = Counter()
+    hour = None
+    for record in selected:
+        if record[0] == 'time':
+            hour = record[1]
+        else:
+            per_hour[hour] += 1
+    assert len(per_hour) == 8
+    assert max(per_hour.values()) - min(per_hour.values()) <= 2
+    assert {record[1] for record in selected if record[0] == 'friend'} == {f"用户{i}" for i in range(6)}
+
+def test_priority_messages_and_their_time_are_kept():
+    records = make_records()
+    notice = ('friend', "群主", "重要通知：周五截止提交")
+    records.insert(200, notice)
+    selected, stats = sample_records(records, 500)
+    assert notice in selected
+    assert stats['priority'] == 1
+    # 被选中的消息连同所在时间段的时间消息一起保留
+    hour_time = next(record for record in reversed(records[:200]) if record[0] == 'time')
+    assert hour_time in selected[:selected.index(notice)]
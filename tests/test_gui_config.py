@@ -0,0 +1,71 @@
+"""图形界面自动保存服务配置时保留手动加入的字段"""
+import json
+import os
+
+import pytest
+
+pytest.importorskip("PySide6")
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PySide6.QtWidgets import QApplication
+
+import config_store
+
+# 配置文件中手动加入的字段（见 README）
+EXTRA_KEYS = {
+    'extract_budget': 8000,
+    'chat_stats': True,
+    'context_window': 16000,
+    'sample_overflow': False,
+    'sample_keywords': ["通知", "作业"],
+    'draft_model': "deepseek-chat",
+    'draft_context_window': 64000,
+    'rate_limit_rpm': 5,
+}
+
+@pytest.fixture
+def window(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(config_store, '_stores', {})
+    os.makedirs("config")
+    service = dict({'api_key': "old-key", 'base_url': "https://api.deepseek.com", 'model': "deepseek-reasoner"},
+                   **EXTRA_KEYS)
+    with open(os.path.join("config", "ai_config.json"), 'w', encoding='utf-8') as f:
+        json.dump({'services': {'DeepSeek': service}, 'last_service': 'DeepSeek'}, f, ensure_ascii=False)
+
+    import wechat_summary_gui
+    app = QApplication.instance() or QApplication([])
+    window = wechat_summary_gui.MainWindow()
+    window.tab_widget.setCurrentIndex(
+        next(i for i in range(window.tab_widget.count()) if window.tab_widget.tabText(i) == "AI服务配置")
+    )
+    yield window
+    window.close()
+    app.processEvents()
+
+def saved_service():
+    store = config_store.get_store(os.path.join("config", "ai_config.json"))
+    store.flush()
+    with open(store.path, 'r', encoding='utf-8') as f:
+        return json.load(f)['services']['DeepSeek']
+
+def test_autosave_keeps_hand_added_keys(window):
+    card = window.config_cards['DeepSeek']
+    # 每次按键都会触发 auto_save_config
+    card.key_input.setText("new-key")
+    card.auto_save_config()
+    service = saved_service()
+    assert service['api_key'] == "new-key"
+    for key, value in EXTRA_KEYS.items():
+        assert service[key] == value
+
+def test_prefetch_rate_limit_survives_autosave(window):
+    import prefetch
+
+    card = window.config_cards['DeepSeek']
+    card.model_combo.setCurrentText("deepseek-chat")
+    card.auto_save_config()
+    config = window.ai_config.get_config('DeepSeek')
+    assert saved_service()['rate_limit_rpm'] == 5
+    # 后台预取按这份配置建立令牌桶
+    assert prefetch.Prefetcher().bucket(config).rate == 5 / 60
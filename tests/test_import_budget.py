@@ -0,0 +1,20 @@
+"""入口模块导入耗时和打包程序启动耗时的预算检查（见 benchmarks/bench_imports.py、bench_startup.py）"""
+import importlib.util
+import os
+
+import pytest
+
+import bench_imports
+import bench_startup
+
+def test_cli_import_budget():
+    assert bench_imports.main(["wechat_summary_cli", "--top", "0"]) == 0
+
+@pytest.mark.skipif(importlib.util.find_spec("PySide6") is None, reason="未安装 PySide6")
+def test_gui_import_budget():
+    assert bench_imports.main(["wechat_summary_gui", "--top", "0"]) == 0
+
+@pytest.mark.skipif(not os.environ.get("WECHAT_SUMMARY_EXE"), reason="未设置 WECHAT_SUMMARY_EXE（打包后的程序路径）")
+def test_frozen_startup_budget():
+    budget = os.environ.get("WECHAT_SUMMARY_STARTUP_BUDGET", "2.0")
+    assert bench_startup.main(["--exe", os.environ["WECHAT_SUMMARY_EXE"], "--budget", budget]) == 0
@@ -0,0 +1,36 @@
+"""prefetch 中新消息对齐和过期消息丢弃的测试"""
+import datetime
+
+from prefetch import _new_records, _trim_records
+
+OLD = [('time', '09:00'), ('friend', '张三', '早'), ('friend', '李四', '收到'), ('time', '09:30'),
+       ('friend', '张三', '开会')]
+
+def test_new_messages_after_overlap():
+    new = OLD[3:] + [('friend', '李四', '好的'), ('self', '我', '马上到')]
+    assert _new_records(OLD, new) == [('friend', '李四', '好的'), ('self', '我', '马上到')]
+
+def test_no_new_messages():
+    assert _new_records(OLD, OLD[3:]) == []
+    assert _new_records(OLD, list(OLD)) == []
+
+def test_single_overlapping_message():
+    assert _new_records(OLD, [OLD[-1], ('friend', '李四', '好的')]) == [('friend', '李四', '好的')]
+
+def test_repeated_messages_use_longest_overlap():
+    old = [('time', '10:00'), ('friend', '张三', '收到'), ('friend', '张三', '收到')]
+    new = [('friend', '张三', '收到'), ('friend', '张三', '收到'), ('friend', '张三', '收到')]
+    assert _new_records(old, new) == [('friend', '张三', '收到')]
+
+def test_misaligned_history_returns_none():
+    assert _new_records(OLD, [('friend', '王五', '撤回了一条消息'), ('friend', '李四', '好的')]) is None
+    # 加载的范围比缓存更早时同样无法对齐，由调用方重新加载
+    assert _new_records(OLD[3:], OLD) is None
+
+def test_trim_records_keeps_window():
+    today = datetime.date.today()
+    window_start = datetime.datetime.combine(today, datetime.time(9, 15))
+    assert _trim_records(OLD, window_start) == (OLD[3:], 3)
+    assert _trim_records(OLD, datetime.datetime.combine(today, datetime.time(8, 0))) == (OLD, 0)
+    # 窗口内没有时间消息时不丢弃
+    assert _trim_records(OLD, datetime.datetime.combine(today, datetime.time(10, 0))) == (OLD, 0)
@@ -0,0 +1,18 @@
+"""profile_run 默认不开启内存追踪的测试"""
+import os
+import tracemalloc
+
+from profiling import profile_run
+
+def test_memory_tracing_off_by_default(tmp_path, monkeypatch):
+    monkeypatch.delenv("WECHAT_SUMMARY_PROFILE_MEMORY", raising=False)
+    with profile_run("测试", output_dir=str(tmp_path)):
+        assert not tracemalloc.is_tracing()
+    assert [name.split('_')[0] for name in os.listdir(tmp_path)] == ["profile"]
+
+def test_memory_tracing_from_environment(tmp_path, monkeypatch):
+    monkeypatch.setenv("WECHAT_SUMMARY_PROFILE_MEMORY", "1")
+    with profile_run("测试", output_dir=str(tmp_path)):
+        assert tracemalloc.is_tracing()
+    assert not tracemalloc.is_tracing()
+    assert sorted(name.split('_')[0] for name in os.listdir(tmp_path)) == ["alloc", "profile"]
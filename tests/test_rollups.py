@@ -0,0 +1,96 @@
+"""RollupBuilder 按整点、天、周拆分时间范围和复用已保存汇总的测试"""
+import datetime
+import json
+
+import pytest
+
+import rollups
+from rollups import RollupBuilder
+from summary_archive import SummaryArchive
+from transcript_store import transcript_path
+
+GROUP = "测试群"
+# 2026-01-07 是周三
+NOW = datetime.datetime(2026, 1, 7, 10, 30)
+
+def at(*args):
+    return datetime.datetime(*args)
+
+def write_messages(directory, times):
+    by_day = {}
+    for msg_time in times:
+        by_day.setdefault(msg_time.date(), []).append(msg_time)
+    for day, day_times in by_day.items():
+        with open(transcript_path(GROUP, day, str(directory)), 'w', encoding='utf-8') as f:
+            for msg_time in sorted(day_times):
+                text = msg_time.isoformat(timespec='minutes')
+                f.write(json.dumps({'time': text, 'type': 'time', 'sender': None, 'content': f"{msg_time:%H:%M}"},
+                                   ensure_ascii=False) + "\n")
+                f.write(json.dumps({'time': text, 'type': 'friend', 'sender': "张三", 'content': "收到"},
+                                   ensure_ascii=False) + "\n")
+
+@pytest.fixture
+def builder_factory(tmp_path, monkeypatch):
+    archive = SummaryArchive(str(tmp_path / "archive.db"))
+    # 不调用AI服务，返回由输入决定的文字
+    monkeypatch.setattr(rollups, 'summarize_messages',
+                        lambda records, ai_config, prompt, **kwargs: f"汇总：{rollups.build_transcript(records)}")
+
+    def make():
+        return RollupBuilder(GROUP, {'model': 'test'}, archive=archive, transcript_dir=str(tmp_path), now=NOW)
+
+    yield make
+    archive.close()
+
+def levels(builder, since, until=None):
+    return [(level, start) for level, start in builder._periods(since, until)]
+
+def test_partial_hours_then_days(builder_factory):
+    periods = levels(builder_factory(), at(2026, 1, 5, 8, 20))
+    assert periods[0] == ('hour', at(2026, 1, 5, 8))
+    assert periods[15] == ('hour', at(2026, 1, 5, 23))
+    assert periods[16] == ('day', at(2026, 1, 6))
+    assert periods[17:] == [('hour', at(2026, 1, 7, hour)) for hour in range(11)]
+
+def test_week_starts_on_monday(builder_factory):
+    periods = levels(builder_factory(), at(2025, 12, 29))
+    assert periods[:3] == [('week', at(2025, 12, 29)), ('day', at(2026, 1, 5)), ('day', at(2026, 1, 6))]
+    # 周日开始的范围不足一整周
+    periods = levels(builder_factory(), at(2026, 1, 4))
+    assert periods[:3] == [('day', at(2026, 1, 4)), ('day', at(2026, 1, 5)), ('day', at(2026, 1, 6))]
+
+def test_until_on_hour_boundary(builder_factory):
+    assert levels(builder_factory(), at(2026, 1, 7, 8, 59), at(2026, 1, 7, 10)) == [
+        ('hour', at(2026, 1, 7, 8)), ('hour', at(2026, 1, 7, 9))
+    ]
+    assert levels(builder_factory(), at(2026, 1, 6), at(2026, 1, 7)) == [('day', at(2026, 1, 6))]
+
+def test_cover_returns_sections_with_messages(tmp_path, builder_factory):
+    write_messages(tmp_path, [at(2025, 12, 31, 9, 5), at(2026, 1, 6, 14, 0), at(2026, 1, 6, 14, 30),
+                              at(2026, 1, 7, 10, 10)])
+    builder = builder_factory()
+    sections = builder.cover(at(2025, 12, 29))
+    assert [(level, start, messages) for level, start, _, messages in sections] == [
+        ('week', at(2025, 12, 29), 1), ('day', at(2026, 1, 6), 2), ('hour', at(2026, 1, 7, 10), 1)
+    ]
+    # 只有一个小时有消息的天也合并为一段，消息很少的小时直接使用原文
+    assert sections[1][2].startswith("汇总：【01-06 14:00-15:00】")
+    assert "收到" in sections[2][2]
+
+def test_finished_periods_are_reused(tmp_path, builder_factory):
+    write_messages(tmp_path, [at(2026, 1, 5, 9, 0), at(2026, 1, 6, 14, 0), at(2026, 1, 7, 10, 10)])
+    first = builder_factory()
+    assert first.estimate(at(2026, 1, 5)) == 2
+    first.cover(at(2026, 1, 5))
+    assert first.generated == 2
+
+    second = builder_factory()
+    assert second.estimate(at(2026, 1, 5)) == 0
+    second.cover(at(2026, 1, 5))
+    assert second.generated == 0 and second.reused > 0
+
+    # 已结束的小时补充了消息后重新生成所在的天汇总
+    write_messages(tmp_path, [at(2026, 1, 6, 14, 0), at(2026, 1, 6, 15, 0)])
+    third = builder_factory()
+    third.cover(at(2026, 1, 5))
+    assert third.generated == 1
@@ -0,0 +1,59 @@
+"""CronSchedule.next_after 的测试"""
+import datetime
+
+import pytest
+
+from scheduler import CronSchedule
+
+def at(*args):
+    return datetime.datetime(*args)
+
+def test_step_minutes_strictly_after():
+    schedule = CronSchedule("*/15 * * * *")
+    assert schedule.next_after(at(2026, 1, 1, 10, 7, 42)) == at(2026, 1, 1, 10, 15)
+    assert schedule.next_after(at(2026, 1, 1, 10, 15)) == at(2026, 1, 1, 10, 30)
+    assert schedule.next_after(at(2026, 1, 1, 23, 50)) == at(2026, 1, 2, 0, 0)
+
+def test_weekday_range_skips_weekend():
+    # 2026-01-02 是周五
+    schedule = CronSchedule("30 9 * * 1-5")
+    assert schedule.next_after(at(2026, 1, 2, 10, 0)) == at(2026, 1, 5, 9, 30)
+    assert schedule.next_after(at(2026, 1, 5, 9, 0)) == at(2026, 1, 5, 9, 30)
+
+def test_day_of_month_or_day_of_week():
+    # 日和周都有限制时满足任意一个即触发：每月 13 日或每周五
+    schedule = CronSchedule("0 8 13 * 5")
+    assert schedule.next_after(at(2026, 1, 1, 0, 0)) == at(2026, 1, 2, 8, 0)
+    # 2026-01-13 是周二
+    assert schedule.next_after(at(2026, 1, 10, 0, 0)) == at(2026, 1, 13, 8, 0)
+    assert schedule.next_after(at(2026, 1, 13, 8, 0)) == at(2026, 1, 16, 8, 0)
+
+def test_day_of_month_only_when_weekday_is_any():
+    schedule = CronSchedule("0 8 13 * *")
+    assert schedule.next_after(at(2026, 1, 1, 0, 0)) == at(2026, 1, 13, 8, 0)
+    assert schedule.next_after(at(2026, 1, 13, 8, 0)) == at(2026, 2, 13, 8, 0)
+
+def test_seven_means_sunday():
+    # 2026-01-04 是周日
+    for expr in ("0 0 * * 7", "0 0 * * 0"):
+        assert CronSchedule(expr).next_after(at(2026, 1, 1, 12, 0)) == at(2026, 1, 4, 0, 0)
+    assert CronSchedule("0 0 * * 5-7").next_after(at(2026, 1, 3, 12, 0)) == at(2026, 1, 4, 0, 0)
+
+def test_year_rollover():
+    assert CronSchedule("0 0 1 1 *").next_after(at(2026, 6, 1)) == at(2027, 1, 1)
+
+@pytest.mark.parametrize("expr", ["* * * *", "60 * * * *", "*/0 * * * *", "0 0 0 * *", "5-1 * * * *"])
+def test_invalid_expressions(expr):
+    with pytest.raises(ValueError):
+        CronSchedule(expr)
+
+def test_never_fires():
+    with pytest.raises(ValueError):
+        CronSchedule("0 0 31 2 *").next_after(at(2026, 1, 1))
+
+def test_star_step_day_still_requires_weekday():
+    # 日字段以 * 开头时与周字段同时满足才触发：奇数日的周一
+    schedule = CronSchedule("0 9 */2 * 1")
+    # 2026-01-05 是周一，2026-01-12 周一为偶数日
+    assert schedule.next_after(at(2026, 1, 1, 0, 0)) == at(2026, 1, 5, 9, 0)
+    assert schedule.next_after(at(2026, 1, 5, 9, 0)) == at(2026, 1, 19, 9, 0)
@@ -0,0 +1,44 @@
+"""ScrollDeduper 的测试：模拟向上滚动加载时 GetAllMessage 返回的列表"""
+from fake_wechat import FakeMessage, FakeWeChat
+from wechat_summary import ScrollDeduper
+
+def collect(wx, deduper):
+    """按滚动加载的顺序收集新消息，返回按时间正序排列的全部消息"""
+    batches = [deduper.new_messages(wx.GetAllMessage())]
+    while wx.LoadMoreMessage():
+        batches.append(deduper.new_messages(wx.GetAllMessage()))
+    return [msg for batch in reversed(batches) for msg in batch]
+
+def test_identical_messages_are_kept():
+    messages = [FakeMessage('friend', '张三', '收到') for _ in range(100)]
+    wx = FakeWeChat(messages, page_size=7)
+    assert collect(wx, ScrollDeduper()) == messages
+
+def test_repeated_runs_of_messages():
+    messages = []
+    for i in range(30):
+        messages.append(FakeMessage('time', 'SYS', f'{i // 6:02d}:{i % 6 * 10:02d}'))
+        messages.extend(FakeMessage('friend', sender, '收到') for sender in ('张三', '李四', '张三'))
+    wx = FakeWeChat(messages, page_size=20)
+    # 窗口比重复的周期短，只能依靠位置对齐
+    assert collect(wx, ScrollDeduper(window=4)) == messages
+
+def test_new_message_arriving_while_loading():
+    messages = [FakeMessage('friend', '张三', f'第 {i} 条') for i in range(60)]
+    wx = FakeWeChat(messages, page_size=20)
+    deduper = ScrollDeduper()
+    newer = deduper.new_messages(wx.GetAllMessage())
+    # 加载更早的消息时末尾收到一条新消息
+    wx.LoadMoreMessage()
+    wx.messages.append(FakeMessage('friend', '李四', '新消息'))
+    wx.loaded += 1
+    older = deduper.new_messages(wx.GetAllMessage())
+    assert older + newer == messages[20:]
+    wx.LoadMoreMessage()
+    assert deduper.new_messages(wx.GetAllMessage()) == messages[:20]
+
+def test_nothing_new_when_list_unchanged():
+    messages = [FakeMessage('friend', '张三', '收到') for _ in range(10)]
+    deduper = ScrollDeduper()
+    assert deduper.new_messages(messages) == messages
+    assert deduper.new_messages(list(messages)) == []
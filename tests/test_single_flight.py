@@ -0,0 +1,144 @@
+"""SingleFlight 合并并发调用的测试"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from single_flight import SingleFlight
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "总结"
+
+    results = []
+    waiting = set()
+
+    def follow():
+        # on_wait 被调用说明已经在等待正在执行的调用
+        results.append(flight.do("key", work, on_wait=lambda: waiting.add(threading.get_ident())))
+
+    leader = threading.Thread(target=lambda: results.append(flight.do("key", work)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=follow) for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    wait_until(lambda: len(waiting) == 3)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+    assert len(calls) == 1
+    assert sorted(results) == [("总结", False)] + [("总结", True)] * 3
+    assert not flight.in_flight("key")
+
+def test_error_reaches_waiters_and_key_is_released():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+
+    def fail():
+        started.set()
+        release.wait(5)
+        raise RuntimeError("服务不可用")
+
+    errors = []
+    waiting = threading.Event()
+
+    def call():
+        try:
+            flight.do("key", fail, on_wait=waiting.set)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=call)]
+    threads[0].start()
+    started.wait(5)
+    threads.append(threading.Thread(target=call))
+    threads[1].start()
+    waiting.wait(5)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert errors == ["服务不可用"] * 2
+    assert flight.do("key", lambda: "重试") == ("重试", False)
+
+def test_on_wait_can_abandon_waiting():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    leader = threading.Thread(target=lambda: flight.do("key", lambda: started.set() or release.wait(5)))
+    leader.start()
+    started.wait(5)
+
+    def give_up():
+        raise TimeoutError("已取消")
+
+    with pytest.raises(TimeoutError):
+        flight.do("key", lambda: None, on_wait=give_up)
+    assert flight.in_flight("key")
+    release.set()
+    leader.join(5)
+
+def test_async_and_sync_callers_are_merged():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    async def work():
+        await asyncio.get_running_loop().run_in_executor(None, release.wait, 5)
+        return "总结"
+
+    async def main():
+        task = asyncio.ensure_future(flight.do_async("key", work))
+        await asyncio.sleep(0.05)
+        waiting = threading.Event()
+        waiter = asyncio.get_running_loop().run_in_executor(
+            None, lambda: flight.do("key", lambda: "不会执行", on_wait=waiting.set)
+        )
+        await asyncio.get_running_loop().run_in_executor(None, waiting.wait, 5)
+        release.set()
+        return await task, await waiter
+
+    assert asyncio.run(main()) == (("总结", False), ("总结", True))
+
+def test_cancelled_leader_hands_waiters_summary_cancelled():
+    from wechat_summary import SummaryCancelled
+
+    flight = SingleFlight(cancelled=SummaryCancelled)
+    started = asyncio.Event()
+
+    async def work():
+        started.set()
+        await asyncio.sleep(5)
+        return "总结"
+
+    async def main():
+        leader = asyncio.ensure_future(flight.do_async("key", work))
+        await started.wait()
+        waiting = asyncio.Event()
+        waiter = asyncio.ensure_future(flight.do_async("key", work, on_wait=waiting.set))
+        await asyncio.wait_for(waiting.wait(), 5)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        # 等待者没有被取消，收到 SummaryCancelled 后可以自行重试
+        with pytest.raises(SummaryCancelled):
+            await waiter
+        assert not waiter.cancelled()
+        assert not flight.in_flight("key")
+
+    asyncio.run(main())
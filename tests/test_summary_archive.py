@@ -0,0 +1,48 @@
+"""SummaryArchive.search 的测试：不少于 3 个字符的关键词走 FTS5 trigram 索引，更短的走 LIKE"""
+import pytest
+
+from summary_archive import SummaryArchive
+
+@pytest.fixture
+def archive(tmp_path):
+    archive = SummaryArchive(str(tmp_path / "archive.db"))
+    archive.add("群聊A", "今天讨论了部署计划，需要在周五前确认上线时间")
+    archive.add("群聊A", "接口联调发现两个问题，李四负责跟进")
+    archive.add("群聊B", "午饭吃什么；部署脚本已经完成 100%")
+    archive.add("群聊B", "周末_团建 报名截止到周三")
+    yield archive
+    archive.close()
+
+def contents(results, archive):
+    return [archive.get(result['id'])['content'] for result in results]
+
+def test_one_character_term(archive):
+    assert contents(archive.search("午"), archive) == ["午饭吃什么；部署脚本已经完成 100%"]
+
+def test_two_character_term(archive):
+    results = archive.search("部署")
+    assert [result['id'] for result in results] == [3, 1]
+
+def test_three_character_term_uses_fts(archive):
+    assert contents(archive.search("联调发"), archive) == ["接口联调发现两个问题，李四负责跟进"]
+    assert archive.search("联调后") == []
+
+def test_mixed_terms_must_all_match(archive):
+    assert contents(archive.search("部署计划 周五"), archive) == ["今天讨论了部署计划，需要在周五前确认上线时间"]
+    assert archive.search("部署计划 午") == []
+
+def test_like_wildcards_are_literal(archive):
+    assert contents(archive.search("%"), archive) == ["午饭吃什么；部署脚本已经完成 100%"]
+    assert contents(archive.search("_"), archive) == ["周末_团建 报名截止到周三"]
+
+def test_group_filter_and_paging(archive):
+    assert [result['id'] for result in archive.search("部署", group_name="群聊B")] == [3]
+    first_page = archive.search(limit=2)
+    assert [result['id'] for result in first_page] == [4, 3]
+    assert [result['id'] for result in archive.search(limit=2, before_id=first_page[-1]['id'])] == [2, 1]
+
+def test_snippet_starts_near_first_term(archive):
+    archive.add("群聊C", "无关的开头" * 10 + "重要通知：明天停电")
+    result = archive.search("停电")[0]
+    assert result['snippet'].startswith("…")
+    assert "停电" in result['snippet']
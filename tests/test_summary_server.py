@@ -0,0 +1,63 @@
+"""JobManager 合并发送请求的测试"""
+import threading
+
+import pytest
+
+import summary_server
+from summary_server import JobManager, SummaryJob
+
+@pytest.fixture
+def sent(monkeypatch):
+    sent = []
+    monkeypatch.setattr(summary_server, 'get_wechat_messages', lambda *args, **kwargs: "总结")
+    monkeypatch.setattr(summary_server, 'save_summary', lambda *args, **kwargs: (None, 1))
+    monkeypatch.setattr(summary_server, 'send_summary',
+                        lambda group_name, summary, **kwargs: sent.append(group_name) or True)
+    return sent
+
+def make_manager():
+    return JobManager(service_loader=lambda name: {'model': 'test'}, prompt_loader=lambda name: None,
+                      load_interval=0)
+
+def wait_done(job):
+    offset = 0
+    while True:
+        chunks, done = job.wait_events(offset, timeout=5)
+        offset += len(chunks)
+        if done:
+            return
+
+def test_send_request_merged_before_send_step(monkeypatch, sent):
+    release = threading.Event()
+    monkeypatch.setattr(summary_server, 'get_wechat_messages', lambda *args, **kwargs: release.wait(5) and "总结")
+    manager = make_manager()
+    first, _ = manager.submit("测试群")
+    second, merged = manager.submit("测试群", send=True)
+    release.set()
+    wait_done(first)
+    assert merged and second is first
+    assert first.status == 'done' and sent == ["测试群"]
+
+def test_send_request_after_send_step_starts_new_job(monkeypatch, sent):
+    finishing = threading.Event()
+    release = threading.Event()
+    finish = SummaryJob.finish
+
+    def slow_finish(self, *args, **kwargs):
+        # 第一个任务停在已跳过发送、尚未结束的位置
+        if self.id == '1':
+            finishing.set()
+            release.wait(5)
+        finish(self, *args, **kwargs)
+
+    monkeypatch.setattr(SummaryJob, 'finish', slow_finish)
+    manager = make_manager()
+    first, _ = manager.submit("测试群")
+    assert finishing.wait(5)
+    second, merged = manager.submit("测试群", send=True)
+    assert not merged and second is not first
+    wait_done(second)
+    release.set()
+    wait_done(first)
+    assert first.status == second.status == 'done'
+    assert sent == ["测试群"]
@@ -0,0 +1,66 @@
+"""TranscriptWriter 的测试：重叠的多次获取只追加尚未写入的消息"""
+import datetime
+
+from transcript_store import TranscriptWriter, entry_to_record, read_transcript
+
+# 第一条时间消息之前的记录写入当天的文件
+DAY = datetime.date.today()
+GROUP = "测试群"
+
+def parse_time(text):
+    try:
+        return datetime.datetime.fromisoformat(text)
+    except ValueError:
+        return None
+
+def make_records(count, day=DAY):
+    records = []
+    for i in range(count):
+        if i % 10 == 0:
+            records.append(('time', f"{day} {i // 10:02d}:00"))
+        records.append(('friend', f"用户{i % 3}", f"第 {i} 条"))
+    return records
+
+def stored(tmp_path, day=DAY):
+    return [entry_to_record(entry) for entry in read_transcript(GROUP, day, str(tmp_path))]
+
+def write(writer, records):
+    writer.submit(GROUP, records)
+    writer.flush()
+
+def test_overlapping_fetches(tmp_path):
+    records = make_records(100)
+    writer = TranscriptWriter(parse_time, str(tmp_path))
+    write(writer, records[:50])
+    write(writer, records[30:80])
+    # 每次获取都到最新的消息为止；比锚点短的获取从锚点中间对齐
+    write(writer, records[75:80])
+    assert stored(tmp_path) == records[:80]
+    write(writer, records[75:85])
+    assert stored(tmp_path) == records[:85]
+
+def test_anchor_is_read_back_from_file(tmp_path):
+    records = make_records(100)
+    write(TranscriptWriter(parse_time, str(tmp_path)), records[:60])
+    # 新的写入线程（例如程序重启后）从文件末尾读取锚点
+    write(TranscriptWriter(parse_time, str(tmp_path)), records[40:])
+    assert stored(tmp_path) == records
+
+def test_repeated_messages_after_overlap(tmp_path):
+    records = make_records(40) + [('friend', "用户0", "收到")] * 5
+    writer = TranscriptWriter(parse_time, str(tmp_path))
+    write(writer, records[:42])
+    write(writer, records[20:])
+    assert stored(tmp_path) == records
+
+def test_batched_submissions_and_day_split(tmp_path):
+    previous = DAY - datetime.timedelta(days=1)
+    records = make_records(20, previous) + make_records(20)
+    writer = TranscriptWriter(parse_time, str(tmp_path))
+    # 不等待写入，多次提交在后台线程中合并处理；每次获取的记录都从时间消息开始
+    writer.submit(GROUP, records[:15])
+    writer.submit(GROUP, records[11:30])
+    writer.submit(GROUP, records[22:])
+    writer.flush()
+    assert stored(tmp_path, previous) == records[:22]
+    assert stored(tmp_path) == records[22:]
@@ -0,0 +1,216 @@
+"""群聊记录的结构化存档
+
+每次获取消息后，记录提交给后台线程批量写入 transcripts/<群聊>_<日期>.jsonl，每行一条消息：
+    {"time": "2026-10-19T14:05", "type": "friend", "sender": "张三", "content": "收到"}
+同一天多次获取的消息会有重叠，写入时与文件末尾的若干条消息对齐，只追加尚未写入的部分。
+需要查看时用 render_transcript 渲染为原来日志中的对齐格式。
+较早的存档由 retention 模块压缩和清理，read_transcript 可直接读取压缩后的文件。
+"""
+from collections import deque
+from loguru import logger
+import atexit
+import datetime
+import hashlib
+import json
+import os
+import queue
+import threading
+
+from retention import COMPRESSED_SUFFIXES, open_text
+
+TRANSCRIPT_DIR = "transcripts"
+
+# 用于对齐的文件末尾消息条数
+ANCHOR_SIZE = 32
+# 读取文件末尾时最多读取的字节数
+TAIL_BYTES = 64 * 1024
+
+_encode = json.JSONEncoder(ensure_ascii=False).encode
+
+def transcript_path(group_name, day, transcript_dir=TRANSCRIPT_DIR):
+    safe_name = "".join(c for c in group_name if c.isalnum() or c in (' ', '-', '_'))
+    return os.path.join(transcript_dir, f"{safe_name}_{day:%Y-%m-%d}.jsonl")
+
+def entry_digest(entry):
+    text = f"{entry['type']}\x00{entry.get('sender') or ''}\x00{entry['content']}"
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest()
+
+def record_to_entry(record, time_text):
+    """将 fetch_group_messages 返回的记录元组转换为存档条目"""
+    kind = record[0]
+    return {
+        'time': time_text,
+        'type': kind,
+        'sender': record[1] if kind in ('friend', 'self') else None,
+        'content': record[-1],
+    }
+
+def entry_to_record(entry):
+    """record_to_entry 的逆转换，返回与 fetch_group_messages 相同格式的记录元组"""
+    kind = entry['type']
+    if kind in ('friend', 'self'):
+        return (kind, entry['sender'], entry['content'])
+    return (kind, entry['content'])
+
+def new_entries_start(entries, anchor):
+    """返回 entries 中第一条尚未写入的位置；anchor 为文件末尾若干条消息的哈希
+
+    只对比较时用到的条目计算哈希，没有重叠的新记录几乎不需要计算
+    """
+    size = len(anchor)
+    if not size:
+        return 0
+    digests = {}
+
+    def digest(index):
+        if index not in digests:
+            digests[index] = entry_digest(entries[index])
+        return digests[index]
+
+    def matches(start, length, offset):
+        return all(digest(start + i) == anchor[offset + i] for i in range(length))
+
+    # 锚点完整出现时取最后一次出现的位置
+    for start in range(len(entries) - size, -1, -1):
+        if matches(start, size, 0):
+            return start + size
+    # 本次获取的范围较短，从锚点中间开始
+    for length in range(min(size - 1, len(entries)), 0, -1):
+        if matches(0, length, size - length):
+            return length
+    return 0
+
+def read_transcript(group_name, day=None, transcript_dir=TRANSCRIPT_DIR):
+    """读取某个群聊某一天的存档条目，默认当天；已压缩的文件自动解压"""
+    path = transcript_path(group_name, day or datetime.date.today(), transcript_dir)
+    # 压缩后又补写的消息保存在新的未压缩文件中，排在压缩文件之后
+    paths = [path + suffix for suffix in COMPRESSED_SUFFIXES if os.path.exists(path + suffix)]
+    if os.path.exists(path):
+        paths.append(path)
+    entries = []
+    for path in paths:
+        with open_text(path) as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    entries.append(json.loads(line))
+    return entries
+
+def render_transcript(entries):
+    """渲染为便于阅读的聊天记录文本"""
+    lines = []
+    for entry in entries:
+        kind = entry['type']
+        if kind == 'sys':
+            lines.append(f"【系统消息】{entry['content']}")
+        elif kind == 'friend':
+            lines.append(f"{entry['sender'].rjust(20)}：{entry['content']}")
+        elif kind == 'self':
+            lines.append(f"{entry['sender'].ljust(20)}：{entry['content']}")
+        elif kind == 'time':
+            lines.append(f"\n【时间消息】{entry['content']}")
+        elif kind == 'recall':
+            lines.append(f"【撤回消息】{entry['content']}")
+    return "\n".join(lines)
+
+class TranscriptWriter:
+    """在后台线程中批量写入群聊记录
+
+    parse_time 用于解析时间消息的内容，返回 datetime 或 None
+    """
+
+    def __init__(self, parse_time, transcript_dir=TRANSCRIPT_DIR):
+        self.parse_time = parse_time
+        self.transcript_dir = transcript_dir
+        self.queue = queue.Queue()
+        self.anchors = {}
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def submit(self, group_name, records):
+        """提交按时间正序排列的记录，立即返回"""
+        if not records:
+            return
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="transcript-writer", daemon=True)
+                self.thread.start()
+                atexit.register(self.flush)
+        self.queue.put((group_name, list(records)))
+
+    def flush(self, timeout=None):
+        """等待已提交的记录全部写入"""
+        if self.thread is None:
+            return
+        done = threading.Event()
+        self.queue.put(done)
+        done.wait(timeout)
+
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            # 一次取出积压的全部记录，合并写入
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            jobs = [item for item in batch if not isinstance(item, threading.Event)]
+            try:
+                self._write(jobs)
+            except Exception as e:
+                logger.error(f"写入聊天记录存档失败: {e}")
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    item.set()
+
+    def _write(self, jobs):
+        pending = {}
+        for group_name, records in jobs:
+            msg_time = None
+            time_text = None
+            by_day = {}
+            day_entries = by_day.setdefault(datetime.date.today(), [])
+            for record in records:
+                if record[0] == 'time':
+                    parsed = self.parse_time(record[1])
+                    if parsed:
+                        msg_time = parsed
+                        time_text = msg_time.isoformat(timespec='minutes')
+                        day_entries = by_day.setdefault(msg_time.date(), [])
+                day_entries.append(record_to_entry(record, time_text))
+            for day, entries in by_day.items():
+                if not entries:
+                    continue
+                path = transcript_path(group_name, day, self.transcript_dir)
+                anchor = self._anchor(path)
+                start = new_entries_start(entries, list(anchor))
+                anchor.extend(entry_digest(entry) for entry in entries[max(start, len(entries) - ANCHOR_SIZE):])
+                pending.setdefault(path, []).extend(entries[start:])
+
+        if pending and not os.path.exists(self.transcript_dir):
+            os.makedirs(self.transcript_dir)
+        for path, entries in pending.items():
+            if not entries:
+                continue
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write("".join(_encode(entry) + "\n" for entry in entries))
+            logger.debug(f"已追加 {len(entries)} 条消息到 {path}")
+
+    def _anchor(self, path):
+        """返回文件末尾若干条消息的哈希，首次访问时从文件读取"""
+        anchor = self.anchors.get(path)
+        if anchor is None:
+            anchor = deque(maxlen=ANCHOR_SIZE)
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    f.seek(max(0, os.path.getsize(path) - TAIL_BYTES))
+                    lines = f.read().splitlines()[-ANCHOR_SIZE:]
+                for line in lines:
+                    try:
+                        anchor.append(entry_digest(json.loads(line)))
+                    except (ValueError, KeyError, TypeError):
+                        # 从文件中间开始读取时第一行可能不完整
+                        continue
+            self.anchors[path] = anchor
+        return anchor
@@ -1,9 +1,16 @@
-from wxauto import WeChat
 from loguru import logger
-from openai import OpenAI
+import asyncio
 import time
 import datetime
 import os
+import threading
+import hashlib
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from single_flight import SingleFlight
+from job_runtime import run_blocking
+from transcript_store import TranscriptWriter
+from summary_archive import get_archive
 
 # 配置日志记录
 logger.remove()  # 移除默认的处理器
@@ -40,144 +47,204 @@ def parse_message_time(msg_content):
         logger.debug(f"时间解析错误: {e}, 消息内容: {msg_content}")
         return None
 
-def get_wechat_messages(group_name, hours=None, ai_config=None, prompt=None):
-    wx = WeChat()
-    wx.ChatWith(group_name)
+SUMMARY_DIR = "summary"
+# 总结始终保存到 summary/archive.db；设置 WECHAT_SUMMARY_TEXT_FILES=0 时不再另写文本文件
+SAVE_TEXT_FILES = os.environ.get("WECHAT_SUMMARY_TEXT_FILES", "1") != "0"
 
-    # 获取当天的起始时间（0点0分0秒）
-    today_start = datetime.datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-    
-    if hours is None:
-        start_time = datetime.datetime.now() - datetime.timedelta(hours=1)
-    else:
-        # 支持小数点形式的小时数
-        start_time = datetime.datetime.now() - datetime.timedelta(hours=float(hours))
-    
-    # 确保开始时间不早于今天凌晨
-    start_time = max(start_time, today_start)
-    
-    logger.info(f"开始获取 {start_time} 之后的消息，仅包含当天消息")
-    print(f"开始获取 {start_time} 之后的消息，仅包含当天消息")
-    
-    all_messages = []
-    temp_messages = []
-    processed_msgs = set()
-    continue_loading = True
-    load_count = 0
-    max_load_attempts = 50
-    msg_time = None
-
-    current_msgs = wx.GetAllMessage()
-    if current_msgs:
-        for msg in reversed(current_msgs):
-            msg_id = f"{msg.content}_{msg.sender}_{msg.type}"
-            if msg_id in processed_msgs:
-                continue
-                
-            processed_msgs.add(msg_id)
-            
-            # 解析消息时间
-            if msg.type == 'sys' or msg.type == 'time':
-                msg_time = parse_message_time(msg.content)
-                # 如果消息时间不是今天或早于指定时间，则停止加载
-                if msg_time and (msg_time.date() < today_start.date() or msg_time < start_time):
-                    continue_loading = False
-                    break
-            
-            if msg.type == 'sys':
-                temp_messages.append(('sys', msg.content))
-                all_messages.append(msg.content)
-            elif msg.type == 'friend':
-                temp_messages.append(('friend', msg.sender, msg.content))
-                all_messages.append(f'{msg.sender}: {msg.content}')
-            elif msg.type == 'self':
-                if not msg.content.startswith("### 群聊精华总结"):
-                    temp_messages.append(('self', msg.sender, msg.content))
-                    all_messages.append(f'{msg.sender}: {msg.content}')
-            elif msg.type == 'time':
-                temp_messages.append(('time', msg.content))
-                all_messages.append(f'[时间] {msg.content}')
-            elif msg.type == 'recall':
-                temp_messages.append(('recall', msg.content))
-                all_messages.append(f'撤回消息: {msg.content}')
-
-    while continue_loading and load_count < max_load_attempts:
-        wx.LoadMoreMessage()
-        time.sleep(2)
-        load_count += 1
-        
-        current_msgs = wx.GetAllMessage()
-        if not current_msgs:
-            break
-            
-        for msg in reversed(current_msgs):
-            msg_id = f"{msg.content}_{msg.sender}_{msg.type}"
-            if msg_id in processed_msgs:
-                continue
-                
-            processed_msgs.add(msg_id)
-            
-            # 解析消息时间
-            if msg.type == 'sys' or msg.type == 'time':
-                msg_time = parse_message_time(msg.content)
-                # 如果消息时间不是今天或早于指定时间，则停止加载
-                if msg_time and (msg_time.date() < today_start.date() or msg_time < start_time):
-                    continue_loading = False
-                    break
-            
-            if msg.type == 'sys':
-                temp_messages.append(('sys', msg.content))
-                all_messages.append(msg.content)
-            elif msg.type == 'friend':
-                temp_messages.append(('friend', msg.sender, msg.content))
-                all_messages.append(f'{msg.sender}: {msg.content}')
-            elif msg.type == 'self':
-                if not msg.content.startswith("### 群聊精华总结"):
-                    temp_messages.append(('self', msg.sender, msg.content))
-                    all_messages.append(f'{msg.sender}: {msg.content}')
-            elif msg.type == 'time':
-                temp_messages.append(('time', msg.content))
-                all_messages.append(f'[时间] {msg.content}')
-            elif msg.type == 'recall':
-                temp_messages.append(('recall', msg.content))
-                all_messages.append(f'撤回消息: {msg.content}')
-
-    logger.info(f"共加载 {len(processed_msgs)} 条消息")
-    print(f"共加载 {len(processed_msgs)} 条消息")
-    if msg_time:
-        print(f"起始时间为 {msg_time}")
-    
-    all_messages.reverse()
-    temp_messages.reverse()
-    
-    if msg_time:
-        logger.info(f"【系统消息】{msg_time}")
-    for msg in temp_messages:
-        if msg[0] == 'sys':
-            logger.info(f'【系统消息】{msg[1]}')
-        elif msg[0] == 'friend':
-            logger.info(f'{msg[1].rjust(20)}：{msg[2]}')
-        elif msg[0] == 'self':
-            logger.info(f'{msg[1].ljust(20)}：{msg[2]}')
-        elif msg[0] == 'time':
-            logger.info(f'\n【时间消息】{msg[1]}')
-        elif msg[0] == 'recall':
-            logger.info(f'【撤回消息】{msg[1]}')
-            
-    if ai_config and all_messages:
-        client = OpenAI(
-            api_key=ai_config['api_key'],
-            base_url=ai_config['base_url']
-        )
-    
-        messages_text = "\n".join(all_messages)
+# 微信界面同一时间只能操作一个聊天窗口，所有 wxauto 调用都需要串行
+wx_lock = threading.Lock()
+# 正在等待 wx_lock 的调用者数量，后台预取据此让出微信
+_wx_waiters = 0
+_wx_waiters_lock = threading.Lock()
+
+def wx_waiting():
+    """是否有调用者在等待微信操作锁"""
+    return _wx_waiters > 0
+
+# 获取到的聊天记录在后台批量写入 transcripts/
+transcript_writer = TranscriptWriter(parse_message_time)
+
+DEADLINE_NOTE = "\n\n（已到达任务截止时间，总结可能不完整）"
+
+# openai 和 wxauto 导入较慢（openai 约 0.8 秒），首次使用时才导入，命令行的搜索、清理等命令和图形界面启动不必等待
+def create_wechat():
+    """连接微信客户端"""
+    from wxauto import WeChat
+    return WeChat()
+
+def preload_wxauto():
+    """预先导入 wxauto
+
+    wxauto 依赖的 comtypes 会在首次导入它的线程中初始化 COM，图形界面应在主线程中调用，不能放到后台线程
+    """
+    try:
+        import wxauto  # noqa: F401
+    except ImportError as e:
+        logger.error(f"导入 wxauto 失败: {e}")
+
+def warm_up_imports():
+    """在后台线程中预先导入 openai，返回线程"""
+    def run():
+        started = time.perf_counter()
         try:
-            completion = client.chat.completions.create(
-                model=ai_config.get('model', 'qwen-plus'),
-                messages=[
-                    {
-                        'role': 'system',
-                        'content': prompt or '''你是一个专业的聊天记录总结员，请根据提供的微信群聊天记录生成一个简明的群聊精华总结，重点包括以下内容： 
+            import openai  # noqa: F401
+        except ImportError as e:
+            logger.error(f"预加载 openai 失败: {e}")
+            return
+        logger.debug(f"预加载 openai 完成，耗时 {time.perf_counter() - started:.2f} 秒")
+
+    thread = threading.Thread(target=run, name="import-warmup", daemon=True)
+    thread.start()
+    return thread
+
+class SummaryCancelled(Exception):
+    """总结任务已被取消"""
+
+# 合并进程内重复的总结请求；领头的任务被取消时，等待者收到 SummaryCancelled 后自行重试
+summary_flight = SingleFlight(cancelled=SummaryCancelled)
+
+class JobControl:
+    """总结任务的控制对象：支持协作式取消、整体截止时间和进度回调
+
+    deadline 为从创建起允许运行的秒数；滚动加载在剩余时间不足 llm_reserve 秒时提前结束，
+    使用已加载的消息进行总结，为AI服务留出时间。
+    on_progress 接收各阶段的进度事件字典，stage 取值见 describe_progress。
+    timer 为 job_metrics.JobTimer，用于记录各阶段耗时，为 None 时不做统计。
+    usage 在总结完成后记录模型、消息条数和 token 数，保存总结时写入存档。
+    sampling 在聊天记录超出模型上下文、经过分层采样时记录采样情况，随 usage 一起写入存档。
+    """
+
+    def __init__(self, deadline=None, llm_reserve=60, on_progress=None, timer=None):
+        self.on_progress = on_progress
+        self.timer = timer
+        self.usage = None
+        self.sampling = None
+        self.cancel_event = threading.Event()
+        self.deadline = time.monotonic() + deadline if deadline else None
+        self.llm_reserve = min(llm_reserve, deadline / 2) if deadline else llm_reserve
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def remaining(self):
+        """距离截止时间的秒数，未设置截止时间时返回 None"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def expired(self):
+        return self.deadline is not None and self.remaining() <= 0
+
+    def loading_expired(self):
+        """是否应停止滚动加载，为总结留出时间"""
+        return self.deadline is not None and self.remaining() <= self.llm_reserve
+
+    def check(self):
+        """任务被取消时抛出 SummaryCancelled"""
+        if self.cancelled:
+            raise SummaryCancelled("任务已取消")
+
+    def sleep(self, seconds):
+        """可被取消打断的等待"""
+        if self.cancel_event.wait(seconds):
+            raise SummaryCancelled("任务已取消")
+
+    def span(self, name):
+        """记录代码块耗时的上下文管理器"""
+        return self.timer.span(name) if self.timer else nullcontext()
+
+    def mark(self, name, seconds):
+        if self.timer:
+            self.timer.mark(name, seconds)
+
+    def finish(self, status="ok"):
+        """任务结束时写出耗时统计"""
+        if self.timer:
+            self.timer.finish(status)
+
+    def report(self, stage, **data):
+        """发送进度事件，回调出错不影响任务本身"""
+        if self.on_progress is None:
+            return
+        try:
+            self.on_progress(dict(data, stage=stage))
+        except Exception as e:
+            logger.debug(f"进度回调失败: {e}")
+
+def describe_progress(event):
+    """将进度事件转换为界面和命令行显示的文字"""
+    stage = event.get('stage')
+    if stage == 'load':
+        text = f"正在加载消息：第 {event['round']} 轮，已加载 {event['messages']} 条"
+        if event.get('oldest'):
+            text += f"，最早到 {event['oldest']}"
+        return text
+    if stage == 'rollup':
+        if event['state'] == 'plan':
+            return f"需要调用AI服务 {event['calls']} 次生成汇总"
+        text = f"{'正在生成汇总' if event['state'] == 'generate' else '正在汇总'}：{event['label']}"
+        if event['planned']:
+            text += f"（已调用AI服务 {event['generated']}/{event['planned']} 次）"
+        return text
+    if stage == 'delta':
+        return f"使用后台预取的总结：新增 {event['added']} 条消息"
+    if stage == 'stats':
+        return f"已统计：{event['messages']} 条发言，{event['senders']} 人参与"
+    if stage == 'extract':
+        return f"已筛选消息：保留 {event['kept']}/{event['messages']} 条，压缩到 {event['ratio']:.1%}"
+    if stage == 'sample':
+        return (f"聊天记录超出模型上下文，已分层采样：保留 {event['kept']}/{event['messages']} 条，"
+                f"采样率 {event['rate']:.1%}")
+    if stage == 'draft':
+        if event['state'] == 'done':
+            return f"快速草稿已生成（{event['model']}），正在等待完整总结..."
+        return f"正在生成快速草稿（{event['model']}）：已生成 {len(event['text'])} 字"
+    if stage == 'tokens':
+        return f"消息整理完成：{event['messages']} 条，约 {event['estimated']} tokens"
+    if stage == 'llm':
+        if event['state'] == 'queued':
+            return f"已提交 {event.get('model', 'AI服务')}，等待响应..."
+        if event['state'] == 'streaming':
+            return f"AI正在生成总结：已生成 {event['chars']} 字"
+        return f"总结完成：{event['chars']} 字，用时 {event['seconds']:.1f} 秒"
+    if stage == 'save':
+        target = event['file'] or f"总结存档（编号 {event['summary_id']}）"
+        return f"已保存 {event['bytes']} 字节到 {target}"
+    return str(event)
+
+def estimate_tokens(text):
+    """粗略估算文本的 token 数：中文约每字 1 个，其他字符约每 4 个 1 个"""
+    cjk = sum(1 for c in text if '\u4e00' <= c <= '\u9fff')
+    return cjk + (len(text) - cjk + 3) // 4
+
+def job_span(control, name):
+    """control 可能为 None 时使用的阶段计时"""
+    return control.span(name) if control else nullcontext()
+
+@contextmanager
+def wx_session(control=None):
+    """获取微信操作锁，等待期间可被取消"""
+    global _wx_waiters
+    if not wx_lock.acquire(blocking=False):
+        with _wx_waiters_lock:
+            _wx_waiters += 1
+        try:
+            while not wx_lock.acquire(timeout=0.2):
+                if control:
+                    control.check()
+        finally:
+            with _wx_waiters_lock:
+                _wx_waiters -= 1
+    try:
+        yield
+    finally:
+        wx_lock.release()
+
+DEFAULT_PROMPT = '''你是一个专业的聊天记录总结员，请根据提供的微信群聊天记录生成一个简明的群聊精华总结，重点包括以下内容： 
                         1. 重要提醒：提取群聊中提到的任何提醒、禁止事项或重要信息。 
                         2. 今日热门话题：总结群聊中讨论过的主要话题，包含讨论时间、内容摘要、参与者以及关键建议或观点。 
                         3. 点评：对每个热门话题提供简短的点评，突出群聊中的实用建议或存在的问题。 
@@ -186,108 +253,713 @@ def get_wechat_messages(group_name, hours=None, ai_config=None, prompt=None):
                         6. 结语：对整体讨论的总结，提到群友间的合作和技术交流。 
                         请确保精华总结简明扼要，突出重点，格式清晰易读。以下是微信群聊天记录：
                         '''
-                    },
-                    {
-                        'role': 'user',
-                        'content': messages_text
-                    }
-                ]
+
+# 服务配置中设置 draft_model 时，快速草稿使用的提示词
+DRAFT_PROMPT = '''请用不超过 300 字快速概括以下微信群聊天记录：列出 3 到 5 条最重要的话题或提醒，每条一句话，不要展开点评。以下是微信群聊天记录：'''
+
+def message_digest(msg):
+    """消息内容的定长哈希（8 字节），用于对齐相邻两次加载的消息列表"""
+    return hashlib.blake2b(f"{msg.type}\x00{msg.sender}\x00{msg.content}".encode('utf-8'), digest_size=8).digest()
+
+class ScrollDeduper:
+    """找出每次滚动加载后新出现的更早消息
+
+    GetAllMessage 返回当前已加载的全部消息，向上滚动时更早的消息插入到列表前部。
+    这里只保存已处理消息中最早 window 条的哈希，在新列表中按位置对齐这段重叠区域，
+    对齐点之前的就是新加载的消息。内容相同的消息（如多次“收到”）位于不同位置，不会被当作重复丢弃；
+    占用的内存与加载的消息总数无关。
+    """
+
+    def __init__(self, window=32):
+        # 已处理的最早若干条消息的哈希，按时间正序
+        self.anchor = deque(maxlen=window)
+        self.last_length = 0
+
+    def new_messages(self, messages):
+        """返回 messages 中尚未处理过的消息，按时间正序"""
+        digests = {}
+
+        def digest(index):
+            if index not in digests:
+                digests[index] = message_digest(messages[index])
+            return digests[index]
+
+        end = self._align(messages, digest) if self.anchor else len(messages)
+        # 新消息都比锚点更早，只需把其中最早的 window 条从后往前插入锚点前部，deque 会自动丢弃较新的部分
+        for index in range(min(end, self.anchor.maxlen) - 1, -1, -1):
+            self.anchor.appendleft(digest(index))
+        self.last_length = len(messages)
+        return messages[:end]
+
+    def _align(self, messages, digest):
+        """返回锚点在 messages 中的起始位置"""
+        anchor = list(self.anchor)
+        size = len(anchor)
+
+        def matches(index):
+            return all(digest(index + offset) == anchor[offset] for offset in range(size))
+
+        # 通常只是在前部插入了更早的消息，锚点位于列表长度的增量处
+        expected = len(messages) - self.last_length
+        if 0 <= expected <= len(messages) - size and matches(expected):
+            return expected
+        # 加载期间收到新消息或客户端回收了部分消息时，选择离预期位置最近的匹配
+        candidates = [index for index in range(len(messages) - size + 1) if matches(index)]
+        if candidates:
+            return min(candidates, key=lambda index: abs(index - expected))
+        logger.warning("无法与已加载的消息对齐，按消息列表长度的变化判断新消息")
+        return min(max(expected, 0), len(messages))
+
+def _append_record(msg, records):
+    """将一条 wxauto 消息转换为记录元组"""
+    if msg.type == 'sys':
+        records.append(('sys', msg.content))
+    elif msg.type == 'friend':
+        records.append(('friend', msg.sender, msg.content))
+    elif msg.type == 'self':
+        if not msg.content.startswith("### 群聊精华总结"):
+            records.append(('self', msg.sender, msg.content))
+    elif msg.type == 'time':
+        records.append(('time', msg.content))
+    elif msg.type == 'recall':
+        records.append(('recall', msg.content))
+
+def fetch_group_messages(group_name, hours=None, wx=None, load_interval=2, control=None):
+    """滚动加载群聊消息，返回按时间正序排列的消息记录
+
+    wx 可传入与 wxauto.WeChat 接口一致的消息源（如 fake_wechat.FakeWeChat），默认连接微信客户端；
+    control 为 JobControl，每次加载前检查取消，接近截止时间时停止加载并返回已加载的消息
+    """
+    with wx_session(control):
+        if wx is None:
+            with job_span(control, 'attach'):
+                wx = create_wechat()
+        with job_span(control, 'chat_with'):
+            wx.ChatWith(group_name)
+
+        # 获取当天的起始时间（0点0分0秒）
+        today_start = datetime.datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        
+        if hours is None:
+            start_time = datetime.datetime.now() - datetime.timedelta(hours=1)
+        else:
+            # 支持小数点形式的小时数
+            start_time = datetime.datetime.now() - datetime.timedelta(hours=float(hours))
+        
+        # 确保开始时间不早于今天凌晨
+        start_time = max(start_time, today_start)
+        
+        logger.info(f"开始获取 {start_time} 之后的消息，仅包含当天消息")
+        print(f"开始获取 {start_time} 之后的消息，仅包含当天消息")
+        
+        records = []
+        deduper = ScrollDeduper()
+        loaded_count = 0
+        empty_loads = 0
+        continue_loading = True
+        load_count = 0
+        max_load_attempts = 50
+        msg_time = None
+
+        with job_span(control, 'get_all_message'):
+            current_msgs = wx.GetAllMessage()
+        while current_msgs:
+            with job_span(control, 'parse'):
+                new_msgs = deduper.new_messages(current_msgs)
+                loaded_count += len(new_msgs)
+                for msg in reversed(new_msgs):
+                    # 解析消息时间
+                    if msg.type == 'sys' or msg.type == 'time':
+                        msg_time = parse_message_time(msg.content)
+                        # 如果消息时间不是今天或早于指定时间，则停止加载
+                        if msg_time and (msg_time.date() < today_start.date() or msg_time < start_time):
+                            continue_loading = False
+                            break
+                
+                    _append_record(msg, records)
+            empty_loads = 0 if new_msgs else empty_loads + 1
+
+            if control:
+                control.report(
+                    'load', round=load_count, messages=len(records),
+                    oldest=msg_time.strftime('%H:%M') if msg_time else None
+                )
+
+            if not continue_loading or load_count >= max_load_attempts:
+                break
+            # 连续两次加载都没有更早的消息，说明已经到达聊天记录顶部
+            if empty_loads >= 2:
+                logger.info("没有更早的消息，停止加载")
+                break
+
+            if control:
+                control.check()
+                if control.loading_expired():
+                    logger.info("接近任务截止时间，停止加载，使用已加载的消息进行总结")
+                    break
+
+            with job_span(control, 'load_more'):
+                wx.LoadMoreMessage()
+            with job_span(control, 'load_wait'):
+                if control:
+                    control.sleep(load_interval)
+                else:
+                    time.sleep(load_interval)
+            load_count += 1
+            with job_span(control, 'get_all_message'):
+                current_msgs = wx.GetAllMessage()
+
+    logger.info(f"共加载 {loaded_count} 条消息")
+    print(f"共加载 {loaded_count} 条消息")
+    if msg_time:
+        print(f"起始时间为 {msg_time}")
+    
+    records.reverse()
+    transcript_writer.submit(group_name, records)
+
+    return records
+
+def render_record(msg):
+    """单条消息记录在聊天记录文本中的一行"""
+    if msg[0] in ('friend', 'self'):
+        return f'{msg[1]}: {msg[2]}'
+    if msg[0] == 'time':
+        return f'[时间] {msg[1]}'
+    if msg[0] == 'recall':
+        return f'撤回消息: {msg[1]}'
+    return msg[1]
+
+def build_transcript(records):
+    """将消息记录拼接为提交给模型的聊天记录文本"""
+    return "\n".join(render_record(msg) for msg in records)
+
+class _SummaryRequest:
+    """summarize_messages 和 summarize_messages_async 共用的请求参数、流式输出处理和结果记录"""
+
+    def __init__(self, records, ai_config, prompt, on_delta, control, header=None):
+        self.records = records
+        self.ai_config = ai_config
+        self.prompt = prompt
+        self.on_delta = on_delta
+        self.control = control
+        with job_span(control, 'transcript'):
+            self.messages_text = build_transcript(records)
+        if header:
+            self.messages_text = header + "\n\n" + self.messages_text
+        self.model = ai_config.get('model', 'qwen-plus')
+        if control:
+            control.report('tokens', messages=len(records), chars=len(self.messages_text),
+                           estimated=estimate_tokens(self.messages_text))
+        self.stream = on_delta is not None or control is not None
+        self.parts = []
+        self.chars = 0
+        self.usage = None
+        self.started = time.monotonic()
+        self.stream_started = None
+        self.last_report = 0.0
+
+    def client_options(self):
+        return {
+            'api_key': self.ai_config['api_key'],
+            'base_url': self.ai_config['base_url'],
+            # 遇到 429 和 5xx 时 SDK 自动重试的次数，可在服务配置中调整
+            'max_retries': self.ai_config.get('max_retries', 2),
+        }
+
+    def create_options(self):
+        """chat.completions.create 的参数"""
+        options = {
+            'model': self.model,
+            'messages': [
+                {
+                    'role': 'system',
+                    'content': self.prompt or DEFAULT_PROMPT
+                },
+                {
+                    'role': 'user',
+                    'content': self.messages_text
+                }
+            ],
+            'stream': self.stream,
+        }
+        if self.control and self.control.deadline is not None:
+            options['timeout'] = max(self.control.remaining(), 1.0)
+        return options
+
+    def begin(self):
+        if self.control:
+            self.control.check()
+            self.control.report('llm', state='queued', model=self.model)
+
+    def opened(self):
+        """流式请求已返回，开始读取输出"""
+        self.stream_started = time.monotonic()
+
+    def feed(self, chunk):
+        """处理一个流式数据块；返回 "cancelled" 或 "expired" 时调用方应关闭连接并调用 stop"""
+        control = self.control
+        if control:
+            if control.cancelled:
+                return "cancelled"
+            if control.expired():
+                return "expired"
+        # 部分服务在最后一个数据块中返回 token 用量
+        if getattr(chunk, 'usage', None):
+            self.usage = chunk.usage
+        if not chunk.choices:
+            return None
+        delta = chunk.choices[0].delta.content
+        if delta:
+            if not self.parts and control:
+                control.mark('llm_first_token', time.monotonic() - self.started)
+            self.parts.append(delta)
+            self.chars += len(delta)
+            if self.on_delta:
+                self.on_delta(delta)
+            # 流式进度最多每 0.5 秒报告一次
+            if control and time.monotonic() - self.last_report >= 0.5:
+                self.last_report = time.monotonic()
+                control.report('llm', state='streaming', model=self.model, chars=self.chars)
+        return None
+
+    def stop(self, reason):
+        """feed 要求停止读取时调用：取消时抛出 SummaryCancelled，到达截止时间时保留已生成的部分"""
+        if reason == "cancelled":
+            raise SummaryCancelled("任务已取消")
+        logger.info("已到达任务截止时间，返回已生成的部分总结")
+        self.parts.append(DEADLINE_NOTE)
+
+    def finish(self, summary=None, usage=None):
+        """记录用量和耗时，返回总结；流式请求时 summary 为 None，使用已接收的内容"""
+        control = self.control
+        if summary is None:
+            summary = "".join(self.parts)
+            if control and self.stream_started is not None:
+                control.mark('llm_stream', time.monotonic() - self.stream_started)
+        usage = usage or self.usage
+        if control:
+            # 服务未返回用量时使用估算值
+            control.usage = {
+                'model': self.model,
+                'messages': len(self.records),
+                'prompt_tokens': usage.prompt_tokens if usage else estimate_tokens(self.messages_text),
+                'completion_tokens': usage.completion_tokens if usage else estimate_tokens(summary),
+                'estimated': usage is None,
+            }
+            if control.sampling:
+                control.usage['sampling'] = control.sampling
+            control.report('llm', state='done', model=self.model, chars=len(summary),
+                           seconds=time.monotonic() - self.started)
+        logger.info("\n=== 消息总结 ===\n" + summary)
+        return summary
+
+    def fail(self, error):
+        """请求出错时调用：超时发生在流式输出过程中时返回已生成的内容，否则重新抛出"""
+        if self.parts and self.control and self.control.expired():
+            logger.info(f"已到达任务截止时间，返回已生成的部分总结: {error}")
+            return "".join(self.parts) + DEADLINE_NOTE
+        logger.error(f"消息总结失败: {error}")
+        raise error
+
+def summarize_messages(records, ai_config, prompt=None, on_delta=None, control=None, header=None):
+    """调用AI服务总结消息记录
+
+    传入 on_delta 时以流式方式请求，每收到一段文本就回调 on_delta(text)；
+    传入 control 时同样使用流式请求，在每段文本之间检查取消，到达截止时间后返回已生成的部分。
+    header 为附在聊天记录之前的文字（如 chat_statistics 的统计结果）
+    """
+    from openai import OpenAI
+
+    request = _SummaryRequest(records, ai_config, prompt, on_delta, control, header)
+    client = OpenAI(**request.client_options())
+    try:
+        request.begin()
+        with job_span(control, 'llm_request'):
+            completion = client.chat.completions.create(**request.create_options())
+        if not request.stream:
+            return request.finish(completion.choices[0].message.content, completion.usage)
+        request.opened()
+        for chunk in completion:
+            reason = request.feed(chunk)
+            if reason:
+                completion.close()
+                request.stop(reason)
+                break
+        return request.finish()
+    except SummaryCancelled:
+        logger.info("总结任务已取消")
+        raise
+    except Exception as e:
+        return request.fail(e)
+
+async def _wait_cancellable(awaitable, control, interval=0.2):
+    """等待 awaitable 完成，期间每隔 interval 秒检查一次取消，取消时中止请求"""
+    task = asyncio.ensure_future(awaitable)
+    if control is None:
+        return await task
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=interval)
+        if done:
+            return task.result()
+        if control.cancelled:
+            task.cancel()
+            raise SummaryCancelled("任务已取消")
+
+async def summarize_messages_async(records, ai_config, prompt=None, on_delta=None, control=None, header=None):
+    """summarize_messages 的异步版本，使用 AsyncOpenAI，在 job_runtime 的事件循环中运行
+
+    等待AI服务响应期间也能及时取消，不必等到第一段输出
+    """
+    from openai import AsyncOpenAI
+
+    request = _SummaryRequest(records, ai_config, prompt, on_delta, control, header)
+    client = AsyncOpenAI(**request.client_options())
+    try:
+        request.begin()
+        with job_span(control, 'llm_request'):
+            completion = await _wait_cancellable(
+                client.chat.completions.create(**request.create_options()), control
             )
-            summary = completion.choices[0].message.content
-            logger.info("\n=== 消息总结 ===\n" + summary)
-            return summary
-        except Exception as e:
-            logger.error(f"消息总结失败: {e}")
-            raise
+        if not request.stream:
+            return request.finish(completion.choices[0].message.content, completion.usage)
+        request.opened()
+        async for chunk in completion:
+            reason = request.feed(chunk)
+            if reason:
+                await completion.close()
+                request.stop(reason)
+                break
+        return request.finish()
+    except SummaryCancelled:
+        logger.info("总结任务已取消")
+        raise
+    except Exception as e:
+        return request.fail(e)
+    finally:
+        await client.close()
+
+def summary_key(group_name, hours, prompt, ai_config):
+    """同一群聊、时间范围、提示词和模型的总结请求使用相同的 key"""
+    prompt_digest = hashlib.sha1((prompt or DEFAULT_PROMPT).encode('utf-8')).hexdigest()
+    return (
+        group_name,
+        round(float(1 if hours is None else hours), 4),
+        prompt_digest,
+        ai_config.get('base_url'),
+        ai_config.get('model', 'qwen-plus'),
+        ai_config.get('extract_budget'),
+        ai_config.get('chat_stats', False),
+        ai_config.get('sample_overflow', True),
+        ai_config.get('context_window'),
+    )
+
+def chat_statistics(records, ai_config, control=None):
+    """统计全部聊天记录（抽取之前），返回附在聊天记录之前的统计文字
+
+    服务配置中没有开启 chat_stats 或没有安装 numpy 时返回 None。
+    统计结果通过 'stats' 进度事件发出，界面在等待AI服务时即可显示
+    """
+    if not records or not (ai_config or {}).get('chat_stats', False):
+        return None
+    # numpy 导入较慢，需要统计时才导入
+    import chat_stats
+    if not chat_stats.available():
+        logger.warning("未安装 numpy，跳过聊天统计")
+        return None
+    with job_span(control, 'stats'):
+        stats = chat_stats.compute_stats(records, parse_message_time)
+        header = chat_stats.format_stats(stats)
+    if control:
+        control.report('stats', text=header, messages=stats['messages'], senders=stats['senders'])
+    return header
+
+def prepare_records(records, ai_config, control=None, prompt=None, header=None):
+    """提交给AI服务前处理消息记录
+
+    服务配置中设置了 extract_budget（token 数）且聊天记录超出时，用 extractive_summary
+    抽取信息量最高的消息及其回复上下文；没有安装 numpy 时跳过这一步。
+    处理后的聊天记录连同提示词 prompt 和统计文字 header 仍然超出模型上下文时，
+    用 context_sampling 分层采样到正好填满上下文（服务配置中 sample_overflow 为 false 时不采样）
+    """
+    if not ai_config or not records:
+        return records
+    budget = ai_config.get('extract_budget')
+    if budget:
+        records = _extract_records(records, int(budget), control)
+    if ai_config.get('sample_overflow', True):
+        records = _sample_records(records, ai_config, control, prompt, header)
+    return records
+
+def _extract_records(records, budget, control):
+    # numpy 导入较慢，需要抽取时才导入
+    import extractive_summary
+    if not extractive_summary.available():
+        logger.warning("未安装 numpy，跳过抽取式预总结")
+        return records
+    with job_span(control, 'extract'):
+        selected, stats = extractive_summary.select_records(records, budget)
+    if stats['kept'] < stats['messages']:
+        logger.info(f"抽取式预总结：保留 {stats['kept']}/{stats['messages']} 条消息，"
+                    f"约 {stats['kept_tokens']}/{stats['tokens']} tokens，压缩到 {stats['ratio']:.1%}，"
+                    f"用时 {stats['seconds']:.2f} 秒")
+        if control:
+            control.report('extract', **stats)
+    return selected
+
+def _sample_records(records, ai_config, control, prompt, header):
+    import context_sampling
+    budget = context_sampling.input_budget(ai_config, prompt or DEFAULT_PROMPT, header)
+    keywords = ai_config.get('sample_keywords') or context_sampling.DEFAULT_KEYWORDS
+    with job_span(control, 'sample'):
+        selected, stats = context_sampling.sample_records(records, budget, keywords)
+    if stats['kept'] < stats['messages']:
+        logger.info(f"聊天记录约 {stats['tokens']} tokens，超出模型可用的 {budget} tokens，"
+                    f"分层采样保留 {stats['kept']}/{stats['messages']} 条消息（其中优先消息 {stats['priority']} 条），"
+                    f"采样率 {stats['rate']:.1%}，用时 {stats['seconds']:.2f} 秒")
+        if control:
+            control.sampling = {'kept': stats['kept'], 'messages': stats['messages'],
+                                'rate': round(stats['rate'], 4)}
+            control.report('sample', **stats)
+    return selected
+
+def sampling_note(meta):
+    """存档 meta 中有采样记录时返回总结标题中的采样说明，否则返回 None"""
+    sampling = (meta or {}).get('sampling')
+    if not sampling:
+        return None
+    return f"采样：聊天记录超出模型上下文，保留 {sampling['kept']}/{sampling['messages']} 条消息，采样率 {sampling['rate']:.1%}"
+
+def summarize_records(records, ai_config, prompt=None, on_delta=None, control=None):
+    """统计、抽取或采样后调用AI服务总结已获取的消息记录"""
+    header = chat_statistics(records, ai_config, control)
+    records = prepare_records(records, ai_config, control, prompt, header)
+    return summarize_messages(records, ai_config, prompt, on_delta=on_delta, control=control, header=header)
+
+def _get_wechat_messages(group_name, hours, ai_config, prompt, on_delta, wx, load_interval, control):
+    records = fetch_group_messages(group_name, hours, wx=wx, load_interval=load_interval, control=control)
+            
+    if ai_config and records:
+        return summarize_records(records, ai_config, prompt, on_delta, control)
     else:
         logger.info("未获取到任何消息或未提供AI配置")
         return None
 
-def save_summary(group_name, summary, timestamp=None):
-    """保存群聊总结到文件"""
-    if timestamp is None:
-        timestamp = datetime.datetime.now()
-    
-    # 确保目录名称合法
-    safe_group_name = "".join(c for c in group_name if c.isalnum() or c in (' ', '-', '_'))
-    
-    summary_dir = "summary"
-    if not os.path.exists(summary_dir):
-        os.makedirs(summary_dir)
-    
-    filename = f"{summary_dir}/{safe_group_name}_{timestamp.strftime('%Y%m%d_%H%M%S')}.txt"
-    
+def get_wechat_messages(group_name, hours=None, ai_config=None, prompt=None, on_delta=None, wx=None,
+                        load_interval=2, control=None):
+    """获取并总结群聊消息
+
+    相同群聊、时间范围、提示词和模型的请求正在执行时，后来的调用直接等待并共享其结果，
+    不会重复滚动加载消息和调用AI服务（后来者不会收到 on_delta 流式回调）。
+    control 为 JobControl：执行任务的调用者取消时任务中止，其余等待者会重新发起；等待者取消时只是不再等待。
+    """
+    if not ai_config:
+        return _get_wechat_messages(group_name, hours, ai_config, prompt, on_delta, wx, load_interval, control)
+
+    while True:
+        try:
+            summary, shared = summary_flight.do(
+                summary_key(group_name, hours, prompt, ai_config),
+                _get_wechat_messages, group_name, hours, ai_config, prompt, on_delta, wx, load_interval, control,
+                on_wait=control.check if control else None
+            )
+            break
+        except SummaryCancelled:
+            # 执行任务的调用者取消了任务，而当前调用者没有取消时重新发起
+            if control is not None and control.cancelled:
+                raise
+    if shared:
+        logger.info(f"群聊 {group_name} 的相同总结任务正在执行，已合并请求")
+    return summary
+
+async def _draft_summary_async(records, ai_config, control, header):
+    """用 draft_model 生成简短的快速草稿，通过 'draft' 进度事件发出；出错时只记录日志，不影响完整总结"""
+    # 上下文长度按草稿模型查表，聊天记录放不下时单独采样
+    draft_config = dict(ai_config, model=ai_config['draft_model'], context_window=ai_config.get('draft_context_window'))
+    model = draft_config['model']
+    started = time.monotonic()
+    parts = []
+    last_report = 0.0
+
+    def on_delta(text):
+        nonlocal last_report
+        if not parts:
+            control.mark('draft_first_token', time.monotonic() - started)
+        parts.append(text)
+        # 草稿进度最多每 0.3 秒报告一次
+        if time.monotonic() - last_report >= 0.3:
+            last_report = time.monotonic()
+            control.report('draft', state='streaming', model=model, text="".join(parts))
+
     try:
-        with open(filename, 'w', encoding='utf-8') as f:
-            f.write(f"群聊：{group_name}\n")
-            f.write(f"时间：{timestamp.strftime('%Y-%m-%d %H:%M:%S')}\n")
-            f.write("="*50 + "\n")
-            f.write(summary)
-        logger.info(f"总结已保存到文件：{filename}")
-        return filename
+        records = await run_blocking(_sample_records, records, draft_config, None, DRAFT_PROMPT, header)
+        draft = await summarize_messages_async(records, draft_config, DRAFT_PROMPT, on_delta=on_delta, header=header)
     except Exception as e:
-        logger.error(f"保存总结失败：{str(e)}")
+        logger.warning(f"快速草稿生成失败（{model}）: {e}")
         return None
+    control.mark('draft', time.monotonic() - started)
+    control.report('draft', state='done', model=model, text=draft)
+    return draft
 
-def send_summary(group_name, summary, max_retries=3):
-    """发送群聊总结，支持重试机制"""
+def _start_draft(records, ai_config, control, header):
+    """服务配置中设置了 draft_model 且有进度回调时，在事件循环中并行生成快速草稿，返回 Task"""
+    if not ai_config.get('draft_model') or control is None or control.on_progress is None:
+        return None
+    if ai_config['draft_model'] == ai_config.get('model'):
+        return None
+    return asyncio.ensure_future(_draft_summary_async(records, ai_config, control, header))
+
+async def _get_wechat_messages_async(group_name, hours, ai_config, prompt, on_delta, wx, load_interval, control):
+    # 滚动加载是阻塞的 wxauto 操作，交给线程池执行
+    records = await run_blocking(fetch_group_messages, group_name, hours, wx=wx, load_interval=load_interval,
+                                 control=control)
+    if ai_config and records:
+        header = await run_blocking(chat_statistics, records, ai_config, control)
+        records = await run_blocking(prepare_records, records, ai_config, control, prompt, header)
+        draft = _start_draft(records, ai_config, control, header)
+        try:
+            return await summarize_messages_async(records, ai_config, prompt, on_delta=on_delta, control=control,
+                                                  header=header)
+        finally:
+            # 完整总结已完成、出错或被取消时不再需要草稿
+            if draft is not None:
+                draft.cancel()
+    else:
+        logger.info("未获取到任何消息或未提供AI配置")
+        return None
+
+async def get_wechat_messages_async(group_name, hours=None, ai_config=None, prompt=None, on_delta=None, wx=None,
+                                    load_interval=2, control=None):
+    """get_wechat_messages 的异步版本：滚动加载在线程池中执行，AI请求在事件循环中执行
+
+    与同步版本共用 summary_flight，命令行、HTTP 接口和图形界面发起的相同请求同样会合并
+    """
+    if not ai_config:
+        return await _get_wechat_messages_async(group_name, hours, ai_config, prompt, on_delta, wx, load_interval,
+                                                control)
+
+    while True:
+        try:
+            summary, shared = await summary_flight.do_async(
+                summary_key(group_name, hours, prompt, ai_config),
+                _get_wechat_messages_async, group_name, hours, ai_config, prompt, on_delta, wx, load_interval,
+                control, on_wait=control.check if control else None
+            )
+            break
+        except SummaryCancelled:
+            # 执行任务的调用者取消了任务，而当前调用者没有取消时重新发起
+            if control is not None and control.cancelled:
+                raise
+    if shared:
+        logger.info(f"群聊 {group_name} 的相同总结任务正在执行，已合并请求")
+    return summary
+
+def safe_filename(group_name):
+    """去掉群聊名称中不能用于文件名的字符"""
+    return "".join(c for c in group_name if c.isalnum() or c in (' ', '-', '_'))
+
+def save_summary(group_name, summary, timestamp=None, control=None, meta=None):
+    """保存群聊总结到存档，SAVE_TEXT_FILES 开启时同时写出文本文件
+
+    meta 为附加信息字典；control 中记录的模型和 token 数会一并保存。
+    返回 (文本文件路径, 存档编号)，未写出或写入失败的一项为 None；存档不可用时总结仍保存在文本文件中
+    """
+    if timestamp is None:
+        timestamp = datetime.datetime.now()
+    meta = dict(control.usage or {}, **(meta or {})) if control else dict(meta or {})
+    filename = None
+    summary_id = None
+    
+    with job_span(control, 'save'):
+        # 先打开存档：首次打开时会导入已有的文本文件，不能包括这次写出的文件
+        try:
+            archive = get_archive()
+        except Exception as e:
+            archive = None
+            logger.error(f"打开总结存档失败：{str(e)}")
+
+        if SAVE_TEXT_FILES:
+            try:
+                # 确保目录名称合法
+                safe_group_name = safe_filename(group_name)
+                
+                summary_dir = SUMMARY_DIR
+                if not os.path.exists(summary_dir):
+                    os.makedirs(summary_dir)
+                
+                path = f"{summary_dir}/{safe_group_name}_{timestamp.strftime('%Y%m%d_%H%M%S')}.txt"
+                with open(path, 'w', encoding='utf-8') as f:
+                    f.write(f"群聊：{group_name}\n")
+                    f.write(f"时间：{timestamp.strftime('%Y-%m-%d %H:%M:%S')}\n")
+                    if sampling_note(meta):
+                        f.write(sampling_note(meta) + "\n")
+                    f.write("="*50 + "\n")
+                    f.write(summary)
+                filename = path
+                logger.info(f"总结已保存到文件：{filename}")
+            except Exception as e:
+                logger.error(f"保存总结文件失败：{str(e)}")
+
+        if archive is not None:
+            try:
+                summary_id = archive.add(
+                    group_name, summary, created_at=timestamp, model=meta.pop('model', None),
+                    prompt_tokens=meta.pop('prompt_tokens', None),
+                    completion_tokens=meta.pop('completion_tokens', None),
+                    messages=meta.pop('messages', None), file=filename, meta=meta
+                )
+                logger.info(f"总结已保存到存档，编号 {summary_id}")
+            except Exception as e:
+                logger.error(f"保存总结到存档失败：{str(e)}")
+
+    if control and (filename or summary_id):
+        control.report('save', file=filename, summary_id=summary_id, bytes=len(summary.encode('utf-8')))
+    return filename, summary_id
+
+def send_summary(group_name, summary, max_retries=3, wx=None, control=None):
+    """发送群聊总结，支持重试机制；等待其他任务释放微信期间可通过 control 取消"""
     if not summary:
         logger.error("没有要发送的总结内容")
         return False
     
-    wx = WeChat()
-    retry_count = 0
+    with wx_session(control), job_span(control, 'send'):
+        if wx is None:
+            wx = create_wechat()
+        retry_count = 0
     
-    while retry_count < max_retries:
-        try:
-            # 确保成功切换到目标群聊
-            if not wx.ChatWith(group_name):
-                logger.error(f"未找到群聊：{group_name}")
-                time.sleep(2)
-                retry_count += 1
-                continue
+        while retry_count < max_retries:
+            try:
+                # 确保成功切换到目标群聊
+                if not wx.ChatWith(group_name):
+                    logger.error(f"未找到群聊：{group_name}")
+                    time.sleep(2)
+                    retry_count += 1
+                    continue
             
-            # 分段发送长消息
-            max_length = 2000  # 微信单条消息最大长度限制
-            message = summary
+                # 分段发送长消息
+                max_length = 2000  # 微信单条消息最大长度限制
+                message = summary
             
-            # 如果消息长度超过限制，分段发送
-            if len(message) > max_length:
-                parts = [message[i:i+max_length] for i in range(0, len(message), max_length)]
-                for part in parts:
-                    wx.SendMsg(part)
-                    time.sleep(1)  # 添加发送间隔
-            else:
-                wx.SendMsg(message)
+                # 如果消息长度超过限制，分段发送
+                if len(message) > max_length:
+                    parts = [message[i:i+max_length] for i in range(0, len(message), max_length)]
+                    for part in parts:
+                        wx.SendMsg(part)
+                        time.sleep(1)  # 添加发送间隔
+                else:
+                    wx.SendMsg(message)
             
-            logger.info("总结发送成功")
-            return True
+                logger.info("总结发送成功")
+                return True
             
-        except Exception as e:
-            logger.error(f"发送失败 (尝试 {retry_count + 1}/{max_retries}): {str(e)}")
-            time.sleep(2)
-            retry_count += 1
+            except Exception as e:
+                logger.error(f"发送失败 (尝试 {retry_count + 1}/{max_retries}): {str(e)}")
+                time.sleep(2)
+                retry_count += 1
     
     logger.error(f"发送总结失败，已达到最大重试次数 ({max_retries})")
     return False
 
 
 if __name__ == "__main__":
-    group_name = "大数据开发小组"
-    
-    try:
-        summary = get_wechat_messages(group_name, 1)
-        if summary:
-            saved_file = save_summary(group_name, summary)
-            if saved_file:
-                logger.info(f"总结已保存到：{saved_file}")
-            
-            if send_summary(group_name, summary):
-                logger.info("总结已成功发送到群聊")
-            else:
-                logger.error("发送总结失败")
-        else:
-            logger.error("生成总结失败")
-            
-    except Exception as e:
-        logger.error(f"程序执行出错：{str(e)}")
+    # 命令行入口见 wechat_summary_cli.py
+    print("用法：python wechat_summary_cli.py {fetch,summarize,send,run-schedule} ...")
@@ -0,0 +1,311 @@
+"""微信群聊总结命令行工具（不依赖 PySide6）
+
+用法示例：
+    python wechat_summary_cli.py fetch 群聊名称 --hours 2
+    python wechat_summary_cli.py summarize 群聊名称 --hours 2 --service DeepSeek --send
+    python wechat_summary_cli.py rollup 群聊名称 --period week    用已保存的逐级汇总总结本周消息
+    python wechat_summary_cli.py send 群聊名称 summary/xxx.txt
+    python wechat_summary_cli.py transcript 群聊名称 --date 2024-01-01
+    python wechat_summary_cli.py search 关键词 --group 群聊名称
+    python wechat_summary_cli.py show 12
+    python wechat_summary_cli.py run-schedule --schedule config/schedule.json
+    python wechat_summary_cli.py cleanup
+    python wechat_summary_cli.py --profile summarize 群聊名称     剖析本次运行，结果写入 logs/
+    python wechat_summary_cli.py --profile-memory summarize 群聊名称     同时记录内存分配，运行明显变慢
+"""
+from contextlib import nullcontext
+import argparse
+import datetime
+import signal
+import sys
+
+from config_store import load_service_config, load_prompt
+import job_metrics
+from wechat_summary import (
+    fetch_group_messages, build_transcript, get_wechat_messages, save_summary, send_summary, JobControl,
+    describe_progress, sampling_note, logger
+)
+
+def print_progress(event):
+    print(describe_progress(event), file=sys.stderr)
+
+def summarize_group(group_name, hours, service=None, prompt_name=None, send=False, save=True, deadline=None,
+                    on_progress=None):
+    """获取并总结群聊消息，按需保存和发送，返回总结内容
+
+    deadline 为任务最长耗时（秒），超时后使用已加载的消息生成总结
+    """
+    ai_config = load_service_config(service)
+    prompt = load_prompt(prompt_name)
+    control = JobControl(deadline=deadline, on_progress=on_progress, timer=job_metrics.new_timer(group_name, "cli"))
+    try:
+        # 多个定时任务同时总结同一群聊时只执行一次
+        summary = get_wechat_messages(group_name, hours, ai_config, prompt, control=control)
+        if summary and save:
+            save_summary(group_name, summary, control=control)
+        if summary and send and not send_summary(group_name, summary, control=control):
+            raise RuntimeError(f"发送总结到群聊 {group_name} 失败")
+    except Exception:
+        control.finish("error")
+        raise
+    control.finish("ok" if summary else "empty")
+    return summary
+
+def summarize_period(group_name, period, service=None, prompt_name=None, send=False, save=True, sync=True,
+                     on_progress=None, max_calls=None):
+    """用 rollups 的逐级汇总总结一段较长的时间（PERIODS 中的 24h、today、week 等），按需保存和发送
+
+    max_calls 为需要新生成的汇总段数上限，None 时使用 rollups.MAX_COLD_CALLS，0 表示不限制
+    """
+    import rollups
+
+    ai_config = load_service_config(service)
+    prompt = load_prompt(prompt_name)
+    since, until = rollups.period_range(period)
+    control = JobControl(on_progress=on_progress, timer=job_metrics.new_timer(group_name, "rollup"))
+    try:
+        if max_calls is None:
+            max_calls = rollups.MAX_COLD_CALLS
+        summary, stats = rollups.summarize_range(group_name, ai_config, since, until, prompt, control=control,
+                                                 sync=sync, max_calls=max_calls or None)
+        if summary and save:
+            save_summary(group_name, summary, control=control, meta=dict(stats, period=period))
+        if summary and send and not send_summary(group_name, summary, control=control):
+            raise RuntimeError(f"发送总结到群聊 {group_name} 失败")
+    except Exception:
+        control.finish("error")
+        raise
+    control.finish("ok" if summary else "empty")
+    return summary
+
+def cmd_fetch(args):
+    records = fetch_group_messages(args.group, args.hours)
+    transcript = build_transcript(records)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(transcript)
+        print(f"已保存 {len(records)} 条消息到 {args.output}")
+    else:
+        print(transcript)
+    return 0
+
+def cmd_summarize(args):
+    summary = summarize_group(
+        args.group, args.hours, args.service, args.prompt,
+        send=args.send, save=not args.no_save, deadline=args.deadline,
+        on_progress=None if args.quiet else print_progress
+    )
+    if not summary:
+        print("未获取到消息")
+        return 1
+    print(summary)
+    return 0
+
+def cmd_rollup(args):
+    if args.precompute:
+        import rollups
+
+        control = JobControl(on_progress=None if args.quiet else print_progress)
+        generated, reused = rollups.precompute(args.group, load_service_config(args.service), days=args.days,
+                                               control=control, sync=not args.no_sync)
+        print(f"新生成 {generated} 段汇总，复用 {reused} 段")
+        return 0
+    summary = summarize_period(
+        args.group, args.period, args.service, args.prompt, send=args.send, save=not args.no_save,
+        sync=not args.no_sync, on_progress=None if args.quiet else print_progress, max_calls=args.max_calls
+    )
+    if not summary:
+        print("这段时间没有已存档的消息")
+        return 1
+    print(summary)
+    return 0
+
+def cmd_send(args):
+    if args.file == '-':
+        summary = sys.stdin.read()
+    else:
+        with open(args.file, 'r', encoding='utf-8') as f:
+            summary = f.read()
+    return 0 if send_summary(args.group, summary) else 1
+
+def cmd_transcript(args):
+    from transcript_store import read_transcript, render_transcript
+
+    day = datetime.datetime.strptime(args.date, '%Y-%m-%d').date() if args.date else None
+    entries = read_transcript(args.group, day)
+    if not entries:
+        print("没有找到该群聊的聊天记录存档")
+        return 1
+    print(render_transcript(entries))
+    return 0
+
+def cmd_search(args):
+    from summary_archive import get_archive
+
+    results = get_archive().search(" ".join(args.query), args.group, limit=args.limit, before_id=args.before)
+    if not results:
+        print("没有找到匹配的总结")
+        return 1
+    for result in results:
+        print(f"#{result['id']:<6} {result['created_at'].replace('T', ' ')}  {result['group_name']}  "
+              f"{result['model'] or ''}\n        {result['snippet']}")
+    if len(results) == args.limit:
+        print(f"\n下一页：--before {results[-1]['id']}")
+    return 0
+
+def cmd_show(args):
+    from summary_archive import get_archive
+
+    record = get_archive().get(args.id)
+    if record is None:
+        print(f"总结 #{args.id} 不存在")
+        return 1
+    print(f"群聊：{record['group_name']}")
+    print(f"时间：{record['created_at'].replace('T', ' ')}")
+    if record['model']:
+        print(f"模型：{record['model']}  输入 {record['prompt_tokens']} tokens，输出 {record['completion_tokens']} tokens")
+    if sampling_note(record['meta']):
+        print(sampling_note(record['meta']))
+    print("=" * 50)
+    print(record['content'])
+    return 0
+
+def cmd_cleanup(args):
+    from retention import run_retention
+
+    compressed, deleted = run_retention()
+    print(f"压缩 {compressed} 个文件，删除 {deleted} 个文件")
+    return 0
+
+def cmd_run_schedule(args):
+    import retention
+    from scheduler import Scheduler, JobQueue, load_schedule
+
+    def run_job(entry):
+        if entry.get('precompute'):
+            import rollups
+
+            rollups.precompute(entry['group'], load_service_config(entry.get('service')), days=entry.get('days', 1))
+        elif entry.get('period'):
+            summarize_period(
+                entry['group'], entry['period'], entry.get('service'), entry.get('prompt'),
+                send=entry.get('send', False), save=entry.get('save', True)
+            )
+        else:
+            summarize_group(
+                entry['group'], entry.get('hours', 1), entry.get('service'), entry.get('prompt'),
+                send=entry.get('send', False), save=entry.get('save', True), deadline=entry.get('deadline')
+            )
+
+    scheduler = Scheduler(
+        load_schedule(args.schedule), run_job, queue=JobQueue(args.db),
+        max_concurrent=args.max_concurrent, jitter_seconds=args.jitter
+    )
+    # 常驻运行时定期压缩和清理日志、聊天记录存档
+    retention.start_background()
+    signal.signal(signal.SIGINT, lambda *_: scheduler.stop())
+    signal.signal(signal.SIGTERM, lambda *_: scheduler.stop())
+    scheduler.run_forever()
+    return 0
+
+def build_parser():
+    from scheduler import SCHEDULE_PATH, JOB_DB_PATH
+
+    parser = argparse.ArgumentParser(description="微信群聊总结命令行工具")
+    parser.add_argument("--metrics", action="store_true",
+                        help="记录各阶段耗时到 logs/metrics（JSON 记录和 Prometheus 文本文件）")
+    parser.add_argument("--profile", action="store_true",
+                        help="剖析本次运行，在 logs/ 下写出火焰图折叠栈")
+    parser.add_argument("--profile-memory", action="store_true",
+                        help="剖析时同时用 tracemalloc 记录内存分配排行（会让本次运行明显变慢），隐含 --profile")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    fetch_parser = subparsers.add_parser("fetch", help="获取群聊消息")
+    fetch_parser.add_argument("group", help="群聊名称")
+    fetch_parser.add_argument("--hours", type=float, default=1, help="获取多少小时内的消息")
+    fetch_parser.add_argument("-o", "--output", help="保存聊天记录的文件，默认输出到终端")
+    fetch_parser.set_defaults(func=cmd_fetch)
+
+    summarize_parser = subparsers.add_parser("summarize", help="获取并总结群聊消息")
+    summarize_parser.add_argument("group", help="群聊名称")
+    summarize_parser.add_argument("--hours", type=float, default=1, help="获取多少小时内的消息")
+    summarize_parser.add_argument("--service", help="AI服务名称，默认使用上次使用的服务")
+    summarize_parser.add_argument("--prompt", help="提示词名称，默认使用上次使用的提示词")
+    summarize_parser.add_argument("--send", action="store_true", help="总结完成后发送到群聊")
+    summarize_parser.add_argument("--no-save", action="store_true", help="不保存总结文件")
+    summarize_parser.add_argument("-q", "--quiet", action="store_true", help="不输出进度信息")
+    summarize_parser.add_argument("--deadline", type=float, help="任务最长耗时（秒），超时后使用已加载的消息生成总结")
+    summarize_parser.set_defaults(func=cmd_summarize)
+
+    from rollups import PERIODS
+
+    rollup_parser = subparsers.add_parser("rollup", help="用按小时、天、周保存的汇总总结较长的时间范围")
+    rollup_parser.add_argument("group", help="群聊名称")
+    rollup_parser.add_argument("--period", choices=list(PERIODS), default="24h",
+                               help="时间范围：" + "，".join(f"{key} {name}" for key, name in PERIODS.items()))
+    rollup_parser.add_argument("--precompute", action="store_true",
+                               help="只生成已结束的各小时、各天汇总，不生成总结")
+    rollup_parser.add_argument("--days", type=int, default=1, help="--precompute 时生成最近几天的天汇总")
+    rollup_parser.add_argument("--no-sync", action="store_true", help="不获取新消息，只使用已存档的聊天记录")
+    rollup_parser.add_argument("--max-calls", type=int,
+                               help="需要新生成的汇总超过该段数时不调用AI服务直接退出，默认 60，0 表示不限制")
+    rollup_parser.add_argument("--service", help="AI服务名称，默认使用上次使用的服务")
+    rollup_parser.add_argument("--prompt", help="提示词名称，默认使用上次使用的提示词")
+    rollup_parser.add_argument("--send", action="store_true", help="总结完成后发送到群聊")
+    rollup_parser.add_argument("--no-save", action="store_true", help="不保存总结文件")
+    rollup_parser.add_argument("-q", "--quiet", action="store_true", help="不输出进度信息")
+    rollup_parser.set_defaults(func=cmd_rollup)
+
+    send_parser = subparsers.add_parser("send", help="发送总结文件到群聊")
+    send_parser.add_argument("group", help="群聊名称")
+    send_parser.add_argument("file", help="总结文件路径，- 表示从标准输入读取")
+    send_parser.set_defaults(func=cmd_send)
+
+    transcript_parser = subparsers.add_parser("transcript", help="查看已存档的聊天记录")
+    transcript_parser.add_argument("group", help="群聊名称")
+    transcript_parser.add_argument("--date", help="日期，格式 YYYY-MM-DD，默认当天")
+    transcript_parser.set_defaults(func=cmd_transcript)
+
+    search_parser = subparsers.add_parser("search", help="搜索已保存的总结")
+    search_parser.add_argument("query", nargs="*", help="关键词，多个关键词需全部匹配；不填时列出最近的总结")
+    search_parser.add_argument("--group", help="只搜索指定群聊")
+    search_parser.add_argument("--limit", type=int, default=20, help="每页条数")
+    search_parser.add_argument("--before", type=int, help="只显示编号小于该值的总结，用于翻页")
+    search_parser.set_defaults(func=cmd_search)
+
+    show_parser = subparsers.add_parser("show", help="查看存档中的总结")
+    show_parser.add_argument("id", type=int, help="总结编号")
+    show_parser.set_defaults(func=cmd_show)
+
+    cleanup_parser = subparsers.add_parser("cleanup", help="压缩和清理过期的日志和聊天记录存档")
+    cleanup_parser.set_defaults(func=cmd_cleanup)
+
+    schedule_parser = subparsers.add_parser("run-schedule", help="按定时配置持续运行")
+    schedule_parser.add_argument("--schedule", default=SCHEDULE_PATH, help="定时任务配置文件")
+    schedule_parser.add_argument("--db", default=JOB_DB_PATH, help="持久化任务队列数据库")
+    schedule_parser.add_argument("--max-concurrent", type=int, help="同时运行的任务数上限")
+    schedule_parser.add_argument("--jitter", type=float, help="任务启动的随机延迟上限（秒）")
+    schedule_parser.set_defaults(func=cmd_run_schedule)
+
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.metrics:
+        job_metrics.enable()
+    try:
+        if args.profile or args.profile_memory:
+            from profiling import profile_run
+            name = f"cli_{args.command}_{args.group}" if hasattr(args, 'group') else f"cli_{args.command}"
+            profile = profile_run(name, trace_memory=args.profile_memory or None)
+        else:
+            profile = nullcontext()
+        with profile:
+            return args.func(args)
+    except Exception as e:
+        logger.error(f"程序执行出错：{str(e)}")
+        print(f"程序执行出错：{str(e)}", file=sys.stderr)
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,14 +2,36 @@ from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                               QHBoxLayout, QLabel, QLineEdit, QSpinBox, QPushButton, 
                               QTextEdit, QComboBox, QMessageBox, QTabWidget, 
                               QScrollArea, QFrame, QStackedWidget, QInputDialog, QDialog, QMenu, QListWidget, QListWidgetItem)
-from PySide6.QtCore import Qt, QSettings, Signal, QThread, QTimer
-from PySide6.QtGui import QFont, QPalette, QColor, QIcon
+from PySide6.QtCore import Qt, QSettings, Signal, QObject, QTimer
+from PySide6.QtGui import QFont, QPalette, QColor, QIcon, QShortcut, QKeySequence
 import sys
-import json
 import os
-from wechat_summary import get_wechat_messages, send_summary, save_summary
+from wechat_summary import (get_wechat_messages_async, send_summary, save_summary, JobControl, SummaryCancelled,
+                            describe_progress, sampling_note, preload_wxauto, warm_up_imports)
+from job_metrics import new_timer
+from job_runtime import get_runtime, run_blocking
+from prefetch import get_prefetcher, start_prefetcher
+from summary_archive import get_archive
+from config_store import get_store
+import retention
 from loguru import logger
-import resources
+import time
+
+# PyInstaller 打包后数据文件解压在 sys._MEIPASS 下
+BASE_DIR = getattr(sys, '_MEIPASS', os.path.dirname(os.path.abspath(__file__)))
+ICON_DIR = os.path.join(BASE_DIR, "icons")
+_icons = {}
+
+def load_icon(name):
+    """首次使用时从 icons/ 加载图标；找不到文件时退回到编译进 resources.py 的资源"""
+    if name not in _icons:
+        path = os.path.join(ICON_DIR, name)
+        if os.path.exists(path):
+            _icons[name] = QIcon(path)
+        else:
+            import resources  # 注册内嵌资源，体积较大，只在缺少图标文件时导入
+            _icons[name] = QIcon(f":/{name}")
+    return _icons[name]
 
 class ModernStyle:
     # 颜色
@@ -114,33 +136,96 @@ class ModernStyle:
             }}
         """)
 
-class SummaryWorker(QThread):
-    """异步处理总结的工作线程"""
+class SummaryJob(QObject):
+    """一次总结任务：在 job_runtime 的事件循环中运行，进度和结果通过 Qt 信号回到界面线程"""
     finished = Signal(str)  # 成功信号
     error = Signal(str)     # 错误信号
+    cancelled = Signal()    # 取消信号
+    progress = Signal(dict) # 各阶段进度信号
+    
+    # 单次总结的最长耗时（秒），超时后使用已加载的消息生成总结
+    DEADLINE = 600
     
-    def __init__(self, group_name, hours, service_config, prompt):
+    def __init__(self, group_name, hours, service_config, prompt, profile=False):
         super().__init__()
         self.group_name = group_name
         self.hours = hours
         self.service_config = service_config
         self.prompt = prompt
-        
-    def run(self):
+        self.profile = profile
+        self.control = JobControl(deadline=self.DEADLINE, on_progress=self.progress.emit,
+                                  timer=new_timer(group_name, "gui"))
+        self.future = None
+        
+    def start(self):
+        self.future = get_runtime().submit(self.run())
+        
+    def isRunning(self):
+        return self.future is not None and not self.future.done()
+        
+    def cancel(self):
+        """请求取消任务，在下一次加载、等待AI服务响应或下一段输出时生效"""
+        self.control.cancel()
+        
+    async def run(self):
+        if self.profile:
+            from profiling import profile_run
+            with profile_run(f"gui_{self.group_name}"):
+                await self.summarize()
+        else:
+            await self.summarize()
+            
+    async def summarize(self):
         try:
-            summary = get_wechat_messages(
-                self.group_name, 
-                self.hours, 
-                self.service_config,
-                self.prompt
-            )
+            prefetcher = get_prefetcher()
+            if prefetcher:
+                prefetcher.note_request(self.group_name, self.hours, self.service_config, self.prompt)
+            if prefetcher and prefetcher.has(self.group_name, self.hours, self.service_config, self.prompt):
+                # 已有后台预取的滚动总结，只加载之后的新消息
+                summary = await run_blocking(prefetcher.refresh, self.group_name, self.hours,
+                                             self.service_config, self.prompt, control=self.control)
+            else:
+                summary = await get_wechat_messages_async(
+                    self.group_name, 
+                    self.hours, 
+                    self.service_config,
+                    self.prompt,
+                    control=self.control
+                )
             if summary:
+                self.control.finish("ok")
                 self.finished.emit(summary)
             else:
+                self.control.finish("empty")
                 self.error.emit("未获取到消息")
+        except SummaryCancelled:
+            self.control.finish("cancelled")
+            self.cancelled.emit()
         except Exception as e:
+            self.control.finish("error")
             self.error.emit(str(e))
 
+class BackgroundCall(QObject):
+    """在 job_runtime 的线程池中执行阻塞调用（发送到群聊、保存文件等），结果通过 Qt 信号回到界面线程"""
+    succeeded = Signal(object)
+    failed = Signal(str)
+    
+    def __init__(self, fn, *args, **kwargs):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        
+    def start(self):
+        get_runtime().submit_blocking(self.fn, *self.args, **self.kwargs).add_done_callback(self.on_done)
+        
+    def on_done(self, future):
+        error = future.exception()
+        if error is None:
+            self.succeeded.emit(future.result())
+        else:
+            self.failed.emit(str(error))
+
 class AIServiceConfig:
     SERVICES = {}  # 移除默认配置，改为空字典
     
@@ -165,6 +250,8 @@ class AIConfig:
         self.config_dir = "config"
         self.config_file = "ai_config.json"
         self.config_path = os.path.join(self.config_dir, self.config_file)
+        # 合并频繁的保存并原子写入
+        self.store = get_store(self.config_path)
         
         # 确保配置目录存在
         if not os.path.exists(self.config_dir):
@@ -174,6 +261,8 @@ class AIConfig:
         self.configs = {}
         self.last_service = ''
         self.last_prompt = '默认提示词'
+        # 后台预取设置，见 prefetch 模块
+        self.prefetch = {}
         self.default_prompt = '''你是一个专业的聊天记录总结员，请根据提供的微信群聊天记录生成一个简明的群聊精华总结，重点包括以下内容： 
 1. 重要提醒：提取群聊中提到的任何提醒、禁止事项或重要信息。 
 2. 今日热门话题：总结群聊中讨论过的主要话题，包含讨论时间、内容摘要、参与者以及关键建议或观点。 
@@ -183,7 +272,7 @@ class AIConfig:
 6. 结语：对整体讨论的总结，提到群友间的合作和技术交流。'''
         
         # 确保配置文件存在
-        if not os.path.exists(self.config_path):
+        if not self.store.exists():
             # 首次运行时，使用默认服务配置
             self.configs = {
                 name: {
@@ -207,44 +296,51 @@ class AIConfig:
         
     def load_configs(self):
         try:
-            if os.path.exists(self.config_path):
-                with open(self.config_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    if 'services' in data:
-                        self.configs = data['services']
-                        # 重置 SERVICES 并从配置文件加载
-                        AIServiceConfig.SERVICES.clear()
-                        for service_name, config in self.configs.items():
-                            AIServiceConfig.SERVICES[service_name] = {
-                                'base_url': config['base_url'],
-                                'models': [config['model']]
-                            }
-                    self.default_prompt = data.get('prompt', self.default_prompt)
-                    self.last_service = data.get('last_service', '')
-                    self.last_prompt = data.get('last_prompt', '默认提示词')
+            data = self.store.load()
+            if data is not None:
+                if 'services' in data:
+                    self.configs = data['services']
+                    # 重置 SERVICES 并从配置文件加载
+                    AIServiceConfig.SERVICES.clear()
+                    for service_name, config in self.configs.items():
+                        AIServiceConfig.SERVICES[service_name] = {
+                            'base_url': config['base_url'],
+                            'models': [config['model']]
+                        }
+                self.default_prompt = data.get('prompt', self.default_prompt)
+                self.last_service = data.get('last_service', '')
+                self.last_prompt = data.get('last_prompt', '默认提示词')
+                self.prefetch = data.get('prefetch', {})
         except Exception as e:
             logger.error(f"加载配置失败: {e}")
             # 如果加载失败，使用默认配置
             self.configs = {}
             AIServiceConfig.SERVICES.clear()
             
+    def reload_if_changed(self):
+        """配置文件被其他程序（如命令行工具）修改过时重新加载，返回是否重新加载"""
+        if not self.store.changed():
+            return False
+        self.load_configs()
+        return True
+            
     def save_configs(self):
+        """保存配置；短时间内的多次保存会合并为一次写入"""
         try:
             data = {
                 'services': self.configs,
                 'prompt': self.default_prompt,
                 'last_service': self.last_service,
-                'last_prompt': self.last_prompt  # 保存最后使用的提示词
+                'last_prompt': self.last_prompt,  # 保存最后使用的提示词
+                'prefetch': self.prefetch
             }
-            with open(self.config_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=4)
-            logger.info(f"配置已保存到: {self.config_path}")
+            self.store.save(data)
         except Exception as e:
             logger.error(f"保存配置失败: {e}")
             
     def add_config(self, name, config):
-        """添加或更新配置"""
-        self.configs[name] = config
+        """添加或更新配置；与已有配置合并，保留手动加入配置文件的其他字段（如 extract_budget）"""
+        self.configs[name] = {**self.configs.get(name, {}), **config}
         # 同时更新 AIServiceConfig.SERVICES
         if name not in AIServiceConfig.SERVICES:
             AIServiceConfig.SERVICES[name] = {
@@ -439,6 +535,25 @@ class ConfigCard(QFrame):
             if isinstance(main_window, MainWindow):
                 main_window.save_service_config(self.service_name, self.get_current_config())
 
+    def update_config(self, config):
+        """用最新配置更新卡片，只修改有变化的控件，不触发自动保存"""
+        models = AIServiceConfig.SERVICES[self.service_name]['models']
+        self.key_input.blockSignals(True)
+        self.model_combo.blockSignals(True)
+        try:
+            api_key = config.get('api_key', '')
+            if self.key_input.text() != api_key:
+                self.key_input.setText(api_key)
+            if [self.model_combo.itemText(i) for i in range(self.model_combo.count())] != models:
+                self.model_combo.clear()
+                self.model_combo.addItems(models)
+            current_model = config.get('model')
+            if current_model in models and self.model_combo.currentText() != current_model:
+                self.model_combo.setCurrentText(current_model)
+        finally:
+            self.key_input.blockSignals(False)
+            self.model_combo.blockSignals(False)
+
     def get_current_config(self):
         """获取当前配置"""
         return {
@@ -522,6 +637,7 @@ class PromptManager:
         self.config_dir = "config"
         self.config_file = "prompts.json"
         self.config_path = os.path.join(self.config_dir, self.config_file)
+        self.store = get_store(self.config_path)
         
         # 确保配置目录存在
         if not os.path.exists(self.config_dir):
@@ -533,9 +649,9 @@ class PromptManager:
     def load_prompts(self):
         """加载提示词配置"""
         try:
-            if os.path.exists(self.config_path):
-                with open(self.config_path, 'r', encoding='utf-8') as f:
-                    self.prompts = json.load(f)
+            prompts = self.store.load()
+            if prompts is not None:
+                self.prompts = prompts
             else:
                 # 默认提示词
                 self.prompts = {
@@ -557,8 +673,7 @@ class PromptManager:
     def save_prompts(self):
         """保存提示词配置"""
         try:
-            with open(self.config_path, 'w', encoding='utf-8') as f:
-                json.dump(self.prompts, f, ensure_ascii=False, indent=4)
+            self.store.save(self.prompts)
         except Exception as e:
             logger.error(f"保存提示词配置失败: {e}")
             
@@ -585,14 +700,24 @@ class PromptManager:
         return self.prompts
 
 class MainWindow(QMainWindow):
+    # 历史总结每页条数
+    HISTORY_PAGE_SIZE = 50
+    
     def __init__(self):
         super().__init__()
         self.ai_config = AIConfig()
         self.worker = None
+        # 发送到群聊时使用的 JobControl，等待微信期间可以取消
+        self.send_control = None
+        self.background_calls = set()
+        self.action_button = None
+        self.summary_meta = None
+        self.preview_text = None
+        self.profile_enabled = False
         self.prompt_manager = PromptManager()
         self.setup_ui()
         ModernStyle.setup_widget(self)
-        self.setWindowIcon(QIcon(":main.ico"))  # 设置任务栏图标
+        self.setWindowIcon(load_icon("main.ico"))  # 设置任务栏图标
         
     def setup_ui(self):
         self.setWindowTitle("微信群聊总结工具")
@@ -605,20 +730,40 @@ class MainWindow(QMainWindow):
         main_layout.setSpacing(0)
         
         # 创建选项卡
-        tab_widget = QTabWidget()
-        main_layout.addWidget(tab_widget)
+        self.tab_widget = QTabWidget()
+        main_layout.addWidget(self.tab_widget)
         
         # 主要功能选项卡
         main_tab = self.create_main_tab()
-        tab_widget.addTab(main_tab, "群聊总结")
-        
-        # AI配置选项卡
-        ai_config_tab = self.create_ai_config_tab()
-        tab_widget.addTab(ai_config_tab, "AI服务配置")
-        
-        # 提示词配置标签页
-        prompt_tab = self.create_prompt_tab()
-        tab_widget.addTab(prompt_tab, "提示词配置")
+        self.tab_widget.addTab(main_tab, "群聊总结")
+        
+        # 其余标签页先放入空白占位，首次切换到该页时才创建
+        self.scroll_layout = None
+        self.config_cards = {}
+        self.prompt_list = None
+        self.history_loaded = False
+        self.lazy_tabs = {
+            "AI服务配置": self.create_ai_config_tab,
+            "提示词配置": self.create_prompt_tab,
+            "历史总结": self.create_history_tab,
+        }
+        for title in self.lazy_tabs:
+            placeholder = QWidget()
+            QVBoxLayout(placeholder).setContentsMargins(0, 0, 0, 0)
+            self.tab_widget.addTab(placeholder, title)
+        self.tab_widget.currentChanged.connect(self.on_tab_changed)
+        
+        # 隐藏的性能剖析开关，用于排查“总结很慢”的问题
+        QShortcut(QKeySequence("Ctrl+Shift+P"), self, self.toggle_profile)
+        
+    def toggle_profile(self):
+        """开启后每次生成总结都会在 logs/ 下写出火焰图折叠栈；内存分配排行需另外设置 WECHAT_SUMMARY_PROFILE_MEMORY=1"""
+        self.profile_enabled = not self.profile_enabled
+        if self.profile_enabled:
+            self.setWindowTitle("微信群聊总结工具 [性能剖析]")
+            QMessageBox.information(self, "性能剖析", "已开启性能剖析，结果将保存在 logs 目录")
+        else:
+            self.setWindowTitle("微信群聊总结工具")
         
     def create_main_tab(self):
         tab = QWidget()
@@ -693,11 +838,25 @@ class MainWindow(QMainWindow):
         
         layout.addWidget(input_container)
         
-        # 获取消息按钮
-        get_msg_btn = QPushButton("获取群聊消息")
-        get_msg_btn.setObjectName("mainButton")
-        get_msg_btn.clicked.connect(self.get_messages)
-        layout.addWidget(get_msg_btn)
+        # 获取消息和取消按钮
+        action_container = QWidget()
+        action_layout = QHBoxLayout(action_container)
+        action_layout.setContentsMargins(0, 0, 0, 0)
+        action_layout.setSpacing(8)
+        
+        self.get_msg_btn = QPushButton("获取群聊消息")
+        self.get_msg_btn.setObjectName("mainButton")
+        self.get_msg_btn.clicked.connect(self.get_messages)
+        action_layout.addWidget(self.get_msg_btn)
+        
+        self.cancel_btn = QPushButton("取消")
+        self.cancel_btn.setProperty("type", "secondary")
+        self.cancel_btn.setFixedWidth(80)
+        self.cancel_btn.clicked.connect(self.cancel_summary)
+        self.cancel_btn.hide()
+        action_layout.addWidget(self.cancel_btn)
+        
+        layout.addWidget(action_container)
         
         # 消息预览和编辑区域
         preview_label = QLabel("消息总结预览")
@@ -718,17 +877,17 @@ class MainWindow(QMainWindow):
         bottom_layout.addWidget(self.status_label)
         
         # 按钮
-        save_btn = QPushButton("保存总结")
-        save_btn.setFixedWidth(80)
-        save_btn.clicked.connect(self.save_summary)
+        self.save_btn = QPushButton("保存总结")
+        self.save_btn.setFixedWidth(80)
+        self.save_btn.clicked.connect(self.save_summary)
         
-        send_btn = QPushButton("发送到群聊")
-        send_btn.setFixedWidth(80)
-        send_btn.clicked.connect(self.send_to_group)
+        self.send_btn = QPushButton("发送到群聊")
+        self.send_btn.setFixedWidth(80)
+        self.send_btn.clicked.connect(self.send_to_group)
         
         bottom_layout.addStretch()  # 添加弹性空间，使按钮靠右对齐
-        bottom_layout.addWidget(save_btn)
-        bottom_layout.addWidget(send_btn)
+        bottom_layout.addWidget(self.save_btn)
+        bottom_layout.addWidget(self.send_btn)
         
         layout.addWidget(bottom_container)
 
@@ -757,14 +916,10 @@ class MainWindow(QMainWindow):
         self.scroll_layout = QVBoxLayout(scroll_content)  # 保存为实例变量
         self.scroll_layout.setSpacing(12)
         self.scroll_layout.setContentsMargins(0, 0, 0, 0)
+        self.scroll_layout.addStretch()
         
         # 为每个AI服务创建配置卡片
-        for service_name in AIServiceConfig.SERVICES:
-            config = self.ai_config.get_config(service_name) or {}
-            card = ConfigCard(service_name, config)
-            self.scroll_layout.addWidget(card)
-            
-        self.scroll_layout.addStretch()
+        self.update_config_cards()
         scroll.setWidget(scroll_content)
         layout.addWidget(scroll)
         
@@ -954,20 +1109,31 @@ class MainWindow(QMainWindow):
                 QTimer.singleShot(2000, lambda: self.status_label.setText(""))
 
     def update_config_cards(self):
-        """更新配置卡片显示"""
-        # 清除现有卡片
-        for i in reversed(range(self.scroll_layout.count())):
-            widget = self.scroll_layout.itemAt(i).widget()
-            if widget:
-                widget.deleteLater()
-        
-        # 重新添加配置卡片
-        for service_name in AIServiceConfig.SERVICES:
-            config = self.ai_config.get_config(service_name) or {}
-            card = ConfigCard(service_name, config)
-            self.scroll_layout.addWidget(card)
+        """按 AIServiceConfig.SERVICES 增删配置卡片，已有的卡片只更新变化的内容"""
+        if self.scroll_layout is None:
+            # 配置标签页尚未创建，创建时按最新配置生成卡片
+            return
         
-        self.scroll_layout.addStretch()
+        # 删除已移除服务的卡片
+        for service_name in list(self.config_cards):
+            if service_name not in AIServiceConfig.SERVICES:
+                card = self.config_cards.pop(service_name)
+                self.scroll_layout.removeWidget(card)
+                card.deleteLater()
+        
+        # 新增服务插入对应位置，已有卡片保持不动
+        for index, service_name in enumerate(AIServiceConfig.SERVICES):
+            config = self.ai_config.get_config(service_name) or {}
+            card = self.config_cards.get(service_name)
+            if card is None:
+                card = ConfigCard(service_name, config)
+                self.config_cards[service_name] = card
+                self.scroll_layout.insertWidget(index, card)
+                continue
+            if self.scroll_layout.indexOf(card) != index:
+                self.scroll_layout.removeWidget(card)
+                self.scroll_layout.insertWidget(index, card)
+            card.update_config(config)
         
     def update_prompt_list(self):
         """更新提示词列表"""
@@ -1072,8 +1238,138 @@ class MainWindow(QMainWindow):
             self.prompt_desc_input.clear()
             self.prompt_content_edit.clear()
 
+    def create_history_tab(self):
+        """创建历史总结标签页：搜索存档，滚动到底部时加载下一页"""
+        tab = QWidget()
+        layout = QVBoxLayout(tab)
+        layout.setContentsMargins(16, 16, 16, 16)
+        layout.setSpacing(12)
+        
+        # 搜索条件
+        search_layout = QHBoxLayout()
+        self.history_query_input = QLineEdit()
+        self.history_query_input.setPlaceholderText("搜索总结内容，多个关键词用空格分隔")
+        self.history_group_input = QLineEdit()
+        self.history_group_input.setPlaceholderText("群聊名称（可选）")
+        search_layout.addWidget(self.history_query_input, 2)
+        search_layout.addWidget(self.history_group_input, 1)
+        layout.addLayout(search_layout)
+        
+        # 输入停止 300 毫秒后再搜索
+        self.history_search_timer = QTimer(self)
+        self.history_search_timer.setSingleShot(True)
+        self.history_search_timer.setInterval(300)
+        self.history_search_timer.timeout.connect(self.search_history)
+        self.history_query_input.textChanged.connect(self.history_search_timer.start)
+        self.history_group_input.textChanged.connect(self.history_search_timer.start)
+        
+        content_layout = QHBoxLayout()
+        self.history_list = QListWidget()
+        self.history_list.setStyleSheet("""
+            QListWidget {
+                border: 1px solid #e0e0e0;
+                border-radius: 4px;
+                background: white;
+            }
+            QListWidget::item {
+                padding: 8px;
+                border-bottom: 1px solid #f0f0f0;
+            }
+            QListWidget::item:selected {
+                background: #f5f5f7;
+                color: #0066cc;
+            }
+        """)
+        self.history_list.setWordWrap(True)
+        self.history_list.currentItemChanged.connect(self.on_history_selected)
+        self.history_list.verticalScrollBar().valueChanged.connect(self.on_history_scrolled)
+        
+        self.history_view = QTextEdit()
+        self.history_view.setReadOnly(True)
+        
+        content_layout.addWidget(self.history_list, 1)
+        content_layout.addWidget(self.history_view, 2)
+        layout.addLayout(content_layout)
+        
+        self.history_status = QLabel("")
+        self.history_status.setStyleSheet("color: #666666;")
+        layout.addWidget(self.history_status)
+        
+        self.history_last_id = None
+        self.history_exhausted = False
+        return tab
+        
+    def on_tab_changed(self, index):
+        title = self.tab_widget.tabText(index)
+        builder = self.lazy_tabs.pop(title, None)
+        if builder:
+            self.tab_widget.widget(index).layout().addWidget(builder())
+        if title == "历史总结" and not self.history_loaded:
+            self.history_loaded = True
+            self.search_history()
+            
+    def search_history(self):
+        """按当前条件重新搜索"""
+        self.history_list.clear()
+        self.history_view.clear()
+        self.history_last_id = None
+        self.history_exhausted = False
+        self.load_history_page()
+        
+    def load_history_page(self):
+        """加载下一页搜索结果"""
+        if self.history_exhausted:
+            return
+        try:
+            results = get_archive().search(
+                self.history_query_input.text().strip(),
+                self.history_group_input.text().strip() or None,
+                limit=self.HISTORY_PAGE_SIZE,
+                before_id=self.history_last_id
+            )
+        except Exception as e:
+            self.history_status.setText(f"搜索失败: {str(e)}")
+            return
+        for result in results:
+            item = QListWidgetItem(
+                f"{result['group_name']}  {result['created_at'].replace('T', ' ')}\n{result['snippet']}"
+            )
+            item.setData(Qt.UserRole, result['id'])
+            self.history_list.addItem(item)
+        if results:
+            self.history_last_id = results[-1]['id']
+        self.history_exhausted = len(results) < self.HISTORY_PAGE_SIZE
+        count = self.history_list.count()
+        self.history_status.setText(f"共 {count} 条" if self.history_exhausted else f"已加载 {count} 条，滚动加载更多")
+        
+    def on_history_scrolled(self, value):
+        if value >= self.history_list.verticalScrollBar().maximum() - 2:
+            self.load_history_page()
+            
+    def on_history_selected(self, current, previous):
+        if current is None:
+            return
+        record = get_archive().get(current.data(Qt.UserRole))
+        if record is None:
+            self.history_view.clear()
+            return
+        header = f"群聊：{record['group_name']}\n时间：{record['created_at'].replace('T', ' ')}\n"
+        if record['model']:
+            header += (f"模型：{record['model']}  输入 {record['prompt_tokens']} tokens，"
+                       f"输出 {record['completion_tokens']} tokens\n")
+        if sampling_note(record['meta']):
+            header += sampling_note(record['meta']) + "\n"
+        self.history_view.setPlainText(header + "=" * 50 + "\n" + record['content'])
+
     def get_messages(self):
         """异步获取消息总结"""
+        # 配置文件被命令行工具等修改过时重新加载
+        if self.ai_config.reload_if_changed():
+            current_service = self.service_combo.currentText()
+            self.update_service_combo()
+            self.service_combo.setCurrentText(current_service)
+            self.update_config_cards()
+            
         # 检查是否有配置的AI服务
         if not AIServiceConfig.SERVICES:
             QMessageBox.warning(self, "警告", "请先添加并配置AI服务")
@@ -1104,46 +1400,115 @@ class MainWindow(QMainWindow):
             
         # 保存最后使用的服务和提示词
         self.ai_config.last_service = service_name
-        current_item = self.prompt_list.currentItem()
-        if current_item:
-            self.ai_config.last_prompt = current_item.text()
+        prompt_name, prompt = self.current_prompt()
+        if prompt_name:
+            self.ai_config.last_prompt = prompt_name
         self.ai_config.save_configs()
         
+        # wxauto 需要在主线程中导入，启动后的预加载还没执行时在这里导入
+        preload_wxauto()
+        
         try:
             # 禁用按钮，显示状态
             if hasattr(self, 'status_label') and self.status_label:
                 self.status_label.setText("正在生成总结，请稍候...")
-            self.setEnabled(False)
+            self.set_busy(True)
             
             # 创建并启动工作线程
             total_minutes = hours * 60 + minutes
-            self.worker = SummaryWorker(
+            self.worker = SummaryJob(
                 group_name, 
                 total_minutes / 60,  # 转换为小时
                 service_config,
-                self.prompt_content_edit.toPlainText()
+                prompt,
+                profile=self.profile_enabled
             )
             self.worker.finished.connect(self.on_summary_finished)
             self.worker.error.connect(self.on_summary_error)
+            self.worker.cancelled.connect(self.on_summary_cancelled)
+            self.worker.progress.connect(self.on_summary_progress)
             self.worker.start()
         except Exception as e:
-            self.setEnabled(True)
+            self.set_busy(False)
             if hasattr(self, 'status_label') and self.status_label:
                 self.status_label.setText("")
             QMessageBox.critical(self, "错误", f"处理失败: {str(e)}")
         
+    def current_prompt(self):
+        """返回 (提示词名称, 提示词内容)；提示词标签页尚未创建时使用上次选中的提示词"""
+        if self.prompt_list is None:
+            name = self.ai_config.last_prompt
+            return name, self.prompt_manager.get_prompt(name)
+        current_item = self.prompt_list.currentItem()
+        # 使用编辑框中的内容，包括尚未保存的修改
+        return (current_item.text() if current_item else None), self.prompt_content_edit.toPlainText()
+        
+    def set_busy(self, busy):
+        """生成总结或发送期间禁用输入、操作按钮和其他选项卡，只保留取消按钮可用"""
+        for widget in (self.group_name_input, self.hours_spin, self.minutes_spin,
+                       self.service_combo, self.get_msg_btn, self.save_btn, self.send_btn):
+            widget.setEnabled(not busy)
+        for i in range(1, self.tab_widget.count()):
+            self.tab_widget.setTabEnabled(i, not busy)
+        self.cancel_btn.setVisible(busy)
+        self.cancel_btn.setEnabled(busy)
+        
+    def cancel_summary(self):
+        """取消正在进行的总结，或还在等待微信的发送"""
+        if self.worker and self.worker.isRunning():
+            self.worker.cancel()
+        elif self.send_control:
+            self.send_control.cancel()
+        else:
+            return
+        self.cancel_btn.setEnabled(False)
+        self.status_label.setText("正在取消...")
+        
+    def on_summary_progress(self, event):
+        """在状态栏显示任务进度；聊天统计和快速草稿先显示在总结框中，完整总结完成后替换"""
+        stage = event.get('stage')
+        if stage == 'stats' and not self.preview_text:
+            self.show_preview(event['text'])
+        elif stage == 'draft':
+            self.show_preview(f"【快速草稿，完整总结生成后自动替换】\n{event['text']}")
+        if self.cancel_btn.isEnabled():
+            self.status_label.setText(describe_progress(event))
+        
+    def show_preview(self, text):
+        # 用户已经修改过总结框时不再覆盖
+        if self.preview_text is None or self.summary_edit.toPlainText() == self.preview_text:
+            self.preview_text = text
+            self.summary_edit.setText(text)
+        
+    def clear_preview(self):
+        """任务没有生成总结时清除总结框中的聊天统计或草稿"""
+        if self.preview_text and self.summary_edit.toPlainText() == self.preview_text:
+            self.summary_edit.clear()
+        self.preview_text = None
+        
     def on_summary_finished(self, summary):
         """处理总结完成"""
+        self.preview_text = None
         self.summary_edit.setText(summary)
+        # 保存时将模型和 token 数一并写入存档
+        self.summary_meta = self.worker.control.usage if self.worker else None
         self.status_label.setText("")
-        self.setEnabled(True)
+        self.set_busy(False)
         
     def on_summary_error(self, error):
         """处理总结错误"""
+        self.clear_preview()
         self.status_label.setText("")
-        self.setEnabled(True)
+        self.set_busy(False)
         QMessageBox.critical(self, "错误", f"获取消息失败: {error}")
         
+    def on_summary_cancelled(self):
+        """处理总结取消"""
+        self.clear_preview()
+        self.set_busy(False)
+        self.status_label.setText("已取消")
+        QTimer.singleShot(2000, lambda: self.status_label.setText(""))
+        
     def send_to_group(self):
         """发送总结到群聊"""
         group_name = self.group_name_input.text()
@@ -1157,41 +1522,66 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "警告", "没有可发送的内容")
             return
         
-        try:
-            # 更新UI状态
-            sender = self.sender()
-            if isinstance(sender, QPushButton):
-                original_text = sender.text()
-                sender.setText("发送中...")
-                sender.setEnabled(False)
-            self.status_label.setText("正在发送到群聊，请稍候...")
-            self.setEnabled(False)
-            QApplication.processEvents()  # 确保UI更新
-            
-            # 发送消息
-            success = send_summary(group_name, summary)
-            
-            # 恢复UI状态
-            if isinstance(sender, QPushButton):
-                sender.setText(original_text)
-                sender.setEnabled(True)
-            self.status_label.setText("")
-            self.setEnabled(True)
-            
-            # 显示结果
-            if success:
-                QMessageBox.information(self, "成功", "总结已发送到群聊")
-            else:
-                QMessageBox.warning(self, "警告", "发送失败")
+        preload_wxauto()
+        # 更新UI状态；wxauto 操作在线程池中执行，界面不会卡住
+        self.begin_background_action("发送中...", "正在发送到群聊，请稍候...")
+        self.set_busy(True)
+        self.send_control = JobControl()
+        self.start_background_call(self.on_send_finished, self.on_send_failed, send_summary, group_name, summary,
+                                   control=self.send_control)
+        
+    def on_send_finished(self, success):
+        self.send_control = None
+        self.set_busy(False)
+        self.end_background_action()
+        if success:
+            QMessageBox.information(self, "成功", "总结已发送到群聊")
+        else:
+            QMessageBox.warning(self, "警告", "发送失败")
             
-        except Exception as e:
-            # 发生错误时恢复UI状态
-            if isinstance(sender, QPushButton):
-                sender.setText(original_text)
-                sender.setEnabled(True)
-            self.status_label.setText("")
-            self.setEnabled(True)
-            QMessageBox.critical(self, "错误", f"发送失败: {str(e)}")
+    def on_send_failed(self, error):
+        cancelled = self.send_control.cancelled
+        self.send_control = None
+        self.set_busy(False)
+        self.end_background_action()
+        if cancelled:
+            self.status_label.setText("已取消发送")
+        else:
+            QMessageBox.critical(self, "错误", f"发送失败: {error}")
+        
+    def begin_background_action(self, button_text, status_text):
+        """后台操作开始：禁用触发操作的按钮并显示状态"""
+        sender = self.sender()
+        if isinstance(sender, QPushButton):
+            self.action_button = (sender, sender.text())
+            sender.setText(button_text)
+            sender.setEnabled(False)
+        else:
+            self.action_button = None
+        self.status_label.setText(status_text)
+        
+    def end_background_action(self):
+        """后台操作结束：恢复按钮和状态"""
+        if self.action_button:
+            button, text = self.action_button
+            button.setText(text)
+            button.setEnabled(True)
+            self.action_button = None
+        self.status_label.setText("")
+        
+    def start_background_call(self, on_success, on_failure, fn, *args, **kwargs):
+        """在线程池中执行 fn，完成后在界面线程调用 on_success(结果) 或 on_failure(错误信息)"""
+        call = BackgroundCall(fn, *args, **kwargs)
+        call.succeeded.connect(on_success)
+        call.failed.connect(on_failure)
+        # 保留引用直到调用结束，否则信号对象可能被提前回收
+        self.background_calls.add(call)
+        call.succeeded.connect(self.on_background_call_done)
+        call.failed.connect(self.on_background_call_done)
+        call.start()
+        
+    def on_background_call_done(self, _):
+        self.background_calls.discard(self.sender())
 
     def save_summary(self):
         """保存总结到文件"""
@@ -1206,38 +1596,24 @@ class MainWindow(QMainWindow):
             QMessageBox.warning(self, "警告", "请输入群聊名称")
             return
         
-        try:
-            # 更新UI状态
-            sender = self.sender()
-            if isinstance(sender, QPushButton):
-                original_text = sender.text()
-                sender.setText("保存中...")
-                sender.setEnabled(False)
-            self.status_label.setText("正在保存文件，请稍候...")
-            QApplication.processEvents()
-            
-            # 保存文件
-            saved_file = save_summary(group_name, summary)
-            
-            # 恢复UI状态
-            if isinstance(sender, QPushButton):
-                sender.setText(original_text)
-                sender.setEnabled(True)
-            self.status_label.setText("")
-            
-            # 显示结果
-            if saved_file:
-                QMessageBox.information(self, "成功", f"总结已保存到: {saved_file}")
-            else:
-                QMessageBox.warning(self, "警告", "保存失败")
+        # 写入存档和文本文件在线程池中执行
+        self.begin_background_action("保存中...", "正在保存文件，请稍候...")
+        self.start_background_call(self.on_save_finished, self.on_save_failed,
+                                   save_summary, group_name, summary, meta=self.summary_meta)
+        
+    def on_save_finished(self, saved):
+        self.end_background_action()
+        saved_file, summary_id = saved
+        if saved_file or summary_id:
+            # 下次打开历史总结时重新加载
+            self.history_loaded = False
+            QMessageBox.information(self, "成功", f"总结已保存到: {saved_file or f'总结存档（编号 {summary_id}）'}")
+        else:
+            QMessageBox.warning(self, "警告", "保存失败")
             
-        except Exception as e:
-            # 发生错误时恢复UI状态
-            if isinstance(sender, QPushButton):
-                sender.setText(original_text)
-                sender.setEnabled(True)
-            self.status_label.setText("")
-            QMessageBox.critical(self, "错误", f"保存失败: {str(e)}")
+    def on_save_failed(self, error):
+        self.end_background_action()
+        QMessageBox.critical(self, "错误", f"保存失败: {error}")
 
     def delete_service_config(self, service_name):
         """删除服务配置"""
@@ -1246,7 +1622,7 @@ class MainWindow(QMainWindow):
             if service_name in self.ai_config.configs:
                 del self.ai_config.configs[service_name]
             if service_name in AIServiceConfig.SERVICES:
-                AIServiceConfig.SERVICES.clear()
+                del AIServiceConfig.SERVICES[service_name]
             
             # 保存配置
             self.ai_config.save_configs()
@@ -1301,9 +1677,27 @@ def main():
     # 设置应用程序级别的字体
     font = QFont(ModernStyle.FONT_FAMILY.split(',')[0].strip())
     app.setFont(font)
-    app.setWindowIcon(QIcon(":/wechat.ico"))
+    app.setWindowIcon(load_icon("wechat.ico"))
     window = MainWindow()
     window.show()
+    
+    # 启动耗时基准测试（benchmarks/bench_startup.py）：窗口显示后记录时间并退出
+    probe_path = os.environ.get("WECHAT_SUMMARY_STARTUP_PROBE")
+    if probe_path:
+        def report_startup():
+            with open(probe_path, 'w', encoding='utf-8') as f:
+                f.write(str(time.time()))
+            app.quit()
+        QTimer.singleShot(0, report_startup)
+        
+    # 窗口显示后预先导入总结时才用到的模块：openai 在后台线程导入，wxauto 在主线程空闲时导入
+    warm_up_imports()
+    QTimer.singleShot(500, preload_wxauto)
+    
+    # 在后台压缩和清理较早的日志、聊天记录存档
+    retention.start_background()
+    # 按配置在空闲时预取常用群聊的总结
+    start_prefetcher(window.ai_config.prefetch)
     sys.exit(app.exec())
 
 if __name__ == "__main__":